@@ -0,0 +1,109 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from eye_tracker.common.settings import RESOLUTIONS, DOWNSCALED_WIDTH
+from eye_tracker.view.drawing import DisplayBuffer
+
+FRAMES = 300
+SECOND_US = 1_000_000
+
+
+class CopyCounter:
+    # Байты, записанные каждым шагом пути отображения, считаются по размеру того, что шаг создал или заполнил
+    def __init__(self):
+        self.bytes = 0
+
+    def image(self, image: Image.Image):
+        # внутри PIL пиксель RGB, как и RGBA, занимает 4 байта
+        self.bytes += image.width * image.height * 4
+        return image
+
+    def array(self, array: np.ndarray):
+        self.bytes += array.nbytes
+        return array
+
+
+def paste_block(image: Image.Image, mode: str, counter: CopyCounter):
+    # то, что ImageTk.PhotoImage.paste делает до передачи блока в Tk: изображение не из одного блока памяти
+    # или другого режима копируется в новый блок, копия в сам Tk одинакова для обоих путей и не считается
+    block = Image.core.new_block(mode, image.size)
+    image.im.convert2(block, image.im)
+    counter.bytes += image.width * image.height * 4
+    return block
+
+
+def legacy_display(frame, previous, counter: CopyCounter):
+    # Processor.frame_to_image, сравнение с предыдущим изображением в View.check_show_image и paste
+    rgb = counter.array(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    image = counter.image(Image.fromarray(rgb))
+    if previous is not None:
+        # Image.__eq__ сравнивает результаты tobytes() обоих изображений
+        counter.bytes += 2 * rgb.nbytes
+        if image == previous:
+            return image
+    paste_block(image, 'RGB', counter)
+    return image
+
+
+def current_display(frame, display_buffer: DisplayBuffer, counter: CopyCounter):
+    # DisplayBuffer пишет в предвыделенный буфер, новый кадр View узнаёт по номеру
+    image = display_buffer.convert(frame)
+    counter.bytes += frame.shape[0] * frame.shape[1] * 4
+    paste_block(image, 'RGBA', counter)
+    return image
+
+
+def frames(count=FRAMES, width=DOWNSCALED_WIDTH):
+    random = np.random.default_rng(0)
+    base = random.integers(0, 255, (RESOLUTIONS[width], width, 3), dtype=np.uint8)
+    # кадры различаются, чтобы сравнение с предыдущим не заканчивалось на первом байте
+    return [np.roll(base, i, axis=1) for i in range(count)]
+
+
+def measure(display, state, samples):
+    counter = CopyCounter()
+    started = perf_counter()
+    for frame in samples:
+        result = display(frame, state, counter)
+        if display is legacy_display:
+            state = result
+    elapsed = perf_counter() - started
+    return {'bytes_per_frame': counter.bytes // len(samples),
+            'us_per_frame': round(elapsed / len(samples) * SECOND_US, 1)}
+
+
+def run(frame_count=FRAMES, width=DOWNSCALED_WIDTH):
+    samples = frames(frame_count, width)
+    legacy = measure(legacy_display, None, samples)
+    current = measure(current_display, DisplayBuffer(), samples)
+    return {'frames': frame_count, 'resolution': [width, RESOLUTIONS[width]], 'legacy': legacy, 'current': current,
+            'copied_ratio': round(legacy['bytes_per_frame'] / current['bytes_per_frame'], 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bytes copied and time per displayed frame, BGR frame to Tk block')
+    parser.add_argument('--frames', type=int, default=FRAMES, help='Displayed frames')
+    parser.add_argument('--width', type=int, default=DOWNSCALED_WIDTH, choices=sorted(RESOLUTIONS),
+                        help='Displayed frame width')
+    parser.add_argument('--output', type=str, default=None, help='Machine-readable results file')
+    args = parser.parse_args(argv)
+
+    results = run(args.frames, args.width)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    for name in ('legacy', 'current'):
+        result = results[name]
+        print(f"{name:<8} {result['bytes_per_frame']:>9} bytes/frame, {result['us_per_frame']:>8} us/frame")
+    print(f"{results['copied_ratio']}x fewer bytes copied")
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
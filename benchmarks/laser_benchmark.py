@@ -0,0 +1,86 @@
+import argparse
+import json
+import sys
+from math import cos, sin, pi
+from pathlib import Path
+from time import perf_counter, sleep
+
+from eye_tracker.common.coordinates import Point
+from eye_tracker.common.settings import settings
+from eye_tracker.model.laser_simulator import LaserControllerSimulator, DEFAULT_BAUD_RATE
+from eye_tracker.model.move_controller import MoveController
+
+# Режимы обмена с контроллером: (двоичный протокол, команд без подтверждения)
+MODES = {'text': (0, 1), 'binary': (1, 1), 'pipelined': (1, 4)}
+DURATION = 3.0  # sec
+TARGET_RATE = 76  # как часто трекер выдаёт новые координаты, в секунду
+TARGET_RADIUS = 2000
+TARGET_PERIOD = 2.0  # sec, цель движется по окружности
+WARMUP = 0.3  # sec, время на согласование протокола
+
+
+def _ignore(*args, **kwargs):
+    ...
+
+
+def run_mode(name, duration=DURATION, baud_rate=DEFAULT_BAUD_RATE, jitter=0.0, drop_rate=0.0):
+    binary_protocol, in_flight = MODES[name]
+    configured = settings.LASER_BINARY_PROTOCOL, settings.LASER_COMMANDS_IN_FLIGHT
+    settings._set_attr_force('LASER_BINARY_PROTOCOL', binary_protocol)
+    settings._set_attr_force('LASER_COMMANDS_IN_FLIGHT', in_flight)
+    simulator = LaserControllerSimulator(baud_rate=baud_rate, jitter=jitter, drop_rate=drop_rate)
+    errors = []
+    try:
+        with MoveController(_ignore, serial=simulator, run_immediately=False) as controller:
+            sleep(WARMUP)
+            received_before = simulator.commands_received
+            started = perf_counter()
+            while perf_counter() - started < duration:
+                phase = 2 * pi * (perf_counter() - started) / TARGET_PERIOD
+                target = Point(int(TARGET_RADIUS * cos(phase)), int(TARGET_RADIUS * sin(phase)))
+                controller.set_new_position(target, capture_time=perf_counter())
+                errors.append(target.calc_distance(simulator.position()))
+                sleep(1 / TARGET_RATE)
+            elapsed = perf_counter() - started
+    finally:
+        settings._set_attr_force('LASER_BINARY_PROTOCOL', configured[0])
+        settings._set_attr_force('LASER_COMMANDS_IN_FLIGHT', configured[1])
+    return {
+        'mode': name,
+        'binary': simulator.binary,
+        'updates_per_sec': round((simulator.commands_received - received_before) / elapsed, 2),
+        'mean_error': round(sum(errors) / len(errors), 1),
+        'max_error': round(max(errors), 1),
+        'bytes_dropped': simulator.bytes_dropped,
+        'malformed_commands': simulator.malformed_commands,
+    }
+
+
+def run(modes=tuple(MODES), duration=DURATION, baud_rate=DEFAULT_BAUD_RATE, jitter=0.0, drop_rate=0.0):
+    return {'duration': duration, 'baud_rate': baud_rate, 'jitter': jitter, 'drop_rate': drop_rate,
+            'stable_position_duration': settings.STABLE_POSITION_DURATION,
+            'modes': [run_mode(mode, duration, baud_rate, jitter, drop_rate) for mode in modes]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Laser update rate benchmark against the controller simulator')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES), help='Exchange modes')
+    parser.add_argument('--duration', type=float, default=DURATION, help='Seconds per mode')
+    parser.add_argument('--baud_rate', type=int, default=DEFAULT_BAUD_RATE, help='Simulated line speed')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Max extra reply delay in seconds')
+    parser.add_argument('--drop_rate', type=float, default=0.0, help='Probability to lose each byte')
+    parser.add_argument('--output', type=str, default=None, help='Machine-readable results file')
+    args = parser.parse_args(argv)
+
+    results = run(args.modes, args.duration, args.baud_rate, args.jitter, args.drop_rate)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    for mode in results['modes']:
+        print(f"{mode['mode']:<10} {mode['updates_per_sec']:>7} updates/s, "
+              f"error mean {mode['mean_error']} max {mode['max_error']}, "
+              f"{mode['bytes_dropped']} bytes dropped, {mode['malformed_commands']} malformed")
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
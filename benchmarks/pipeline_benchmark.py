@@ -0,0 +1,252 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from tempfile import mkdtemp
+from time import perf_counter, process_time
+
+import numpy as np
+
+from eye_tracker.common.coordinates import Point
+from eye_tracker.common.instrumentation import profiler
+from eye_tracker.common.settings import settings, private_settings, OBJECT, FLIP_SIDE_NONE
+from eye_tracker.model.camera_extractor import CameraService, NoneFrameException
+from eye_tracker.model.domain_services import Orchestrator
+from eye_tracker.model.frame_sources import open_frame_source, RawDumpWriter, RAW_DUMP_SUFFIX
+from eye_tracker.model.laser_simulator import LaserControllerSimulator
+from eye_tracker.model.move_controller import MoveController
+from eye_tracker.model.tracker_backends import TRACKER_BACKENDS
+from eye_tracker.view import view_output
+
+# Разрешения и длина синтетических роликов, которые используются, если ролики не заданы явно
+REFERENCE_CLIPS = {'reference_640': (640, 480), 'reference_1280': (1280, 720)}
+REFERENCE_FRAMES = 300
+REFERENCE_OBJECT_SIZE = 0.12  # доля от ширины кадра
+SIDECAR_SUFFIX = '.json'
+PERCENTILES = (50, 95, 99)
+SECOND_MS = 1000
+
+
+def _ignore(*args, **kwargs):
+    ...
+
+
+class HeadlessView:
+    def __init__(self):
+        self._visible_messageboxes = []
+
+    def queue_command(self, command):
+        ...
+
+
+class HeadlessViewModel:
+    # Заменяет ViewModel без tkinter: все обращения модели к представлению игнорируются
+    def __init__(self):
+        self.images_shown = 0
+
+    def on_image_ready(self, image):
+        self.images_shown += 1
+
+    def __getattr__(self, name):
+        return _ignore
+
+
+def make_reference_clip(path: Path, width: int, height: int, frames: int = REFERENCE_FRAMES, seed: int = 0):
+    # Текстурированный объект движется по фигуре Лиссажу поверх шумного фона, результат всегда одинаковый
+    random = np.random.default_rng(seed)
+    background = random.integers(0, 80, (height, width, 3), dtype=np.uint8)
+    size = int(width * REFERENCE_OBJECT_SIZE)
+    texture = random.integers(120, 255, (size, size, 3), dtype=np.uint8)
+    amplitude_x, amplitude_y = (width - size) // 3, (height - size) // 3
+    first_rect = None
+    with RawDumpWriter(path) as writer:
+        for i in range(frames):
+            phase = 2 * np.pi * i / frames
+            left = int(width / 2 - size / 2 + amplitude_x * np.sin(phase))
+            top = int(height / 2 - size / 2 + amplitude_y * np.sin(2 * phase))
+            frame = background.copy()
+            frame[top:top + size, left:left + size] = texture
+            writer.write(frame)
+            first_rect = first_rect or [left, top, left + size, top + size]
+    path.with_suffix(SIDECAR_SUFFIX).write_text(json.dumps({'object': first_rect}))
+    return path
+
+
+def reference_clips(folder: Path):
+    folder.mkdir(parents=True, exist_ok=True)
+    clips = []
+    for name, (width, height) in REFERENCE_CLIPS.items():
+        path = folder / f'{name}{RAW_DUMP_SUFFIX}'
+        if not path.exists():
+            make_reference_clip(path, width, height)
+        clips.append(path)
+    return clips
+
+
+def object_rect(clip: Path, frame_shape):
+    sidecar = clip.with_suffix(SIDECAR_SUFFIX)
+    if sidecar.exists():
+        return json.loads(sidecar.read_text())['object']
+    height, width = frame_shape[:2]
+    return [width * 3 // 8, height * 3 // 8, width * 5 // 8, height * 5 // 8]
+
+
+def distribution_ms(durations):
+    if not durations:
+        return {'count': 0}
+    values = np.array(durations) * SECOND_MS
+    result = {'count': len(values), 'mean': round(float(values.mean()), 4)}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        result[f'p{percentile}'] = round(float(value), 4)
+    return result
+
+
+def create_headless_orchestrator(clip: Path):
+    view_output._view = HeadlessView()
+    private_settings._set_attr_force('ROTATION_ANGLE', 0)
+    private_settings._set_attr_force('FLIP_SIDE', FLIP_SIDE_NONE)
+    camera = CameraService(open_frame_source(clip, realtime=False), threaded_capture=False)
+    # контроллер работает на симуляторе, чтобы замерялись отправка команд и задержка от кадра до лазера
+    laser = MoveController(_ignore, serial=LaserControllerSimulator())
+    return Orchestrator(HeadlessViewModel(), run_immediately=False, camera=camera, laser=laser)
+
+
+def start_tracking(orchestrator, clip: Path):
+    raw = orchestrator.raw_frame
+    screen = orchestrator.current_frame
+    height, width = screen.shape[:2]
+    area = (Point(0, 0), Point(width - 1, 0), Point(width - 1, height - 1), Point(0, height - 1))
+    orchestrator.selecting.load_selected_area(area)
+
+    scale = Point(width / raw.shape[1], height / raw.shape[0])
+    left, top, right, bottom = object_rect(clip, raw.shape)
+    left_top = (Point(left, top) * scale).to_int()
+    right_bottom = (Point(right, bottom) * scale).to_int()
+    orchestrator.tracker.start_tracking(raw, left_top, right_bottom, width, height)
+    orchestrator.screen.add_selector(orchestrator.tracker, OBJECT)
+
+
+def run_clip(clip: Path, backend: int = None):
+    configured_backend = settings.TRACKER_BACKEND
+    if backend is not None:
+        settings._set_attr_force('TRACKER_BACKEND', backend)
+    try:
+        orchestrator = create_headless_orchestrator(clip)
+    finally:
+        settings._set_attr_force('TRACKER_BACKEND', configured_backend)
+    start_tracking(orchestrator, clip)
+    profiler.reset()
+    processing_loop = Orchestrator._processing_loop.__get__(orchestrator)  # без ErrorHandler
+    renderer = orchestrator.renderer
+    # отрисовка идёт в своём потоке с частотой FPS_VIEWED, как в программе, и делит с трекингом GIL
+    renderer.start_thread(renderer.render, renderer.interval)
+    iterations = []
+    wall_started, cpu_started = perf_counter(), process_time()
+    try:
+        while True:
+            started = perf_counter()
+            try:
+                processing_loop()
+            except NoneFrameException:
+                if orchestrator.camera.source_exhausted:
+                    break
+                raise
+            iterations.append(perf_counter() - started)
+    finally:
+        renderer.stop_thread()
+        orchestrator.laser.stop_thread()
+    wall, cpu = perf_counter() - wall_started, process_time() - cpu_started
+    return {
+        'clip': clip.name,
+        'backend': orchestrator.tracker.tracker.name,
+        'resolution': list(orchestrator.raw_frame.shape[1::-1]),
+        'frames': len(iterations),
+        'fps': round(len(iterations) / wall, 2),
+        'cpu_percent': round(cpu / wall * 100, 1),
+        'latency_ms': distribution_ms(iterations),
+        'stages_ms': profiler.summary_ms(),
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(clips, backends=(None,)):
+    return {
+        'commit': current_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'downscale_factor': settings.DOWNSCALE_FACTOR,
+        'clips': [run_clip(Path(clip), backend) for backend in backends for clip in clips],
+    }
+
+
+def percent_change(new, old):
+    # прогоны без кадров или без нужного значения не сравниваются
+    if not new or not old:
+        return 'n/a'
+    return f'{(new / old - 1) * 100:+.1f}%'
+
+
+def compare(results, baseline):
+    previous = {(clip['clip'], clip.get('backend')): clip for clip in baseline['clips']}
+    lines = []
+    for clip in results['clips']:
+        old = previous.get((clip['clip'], clip.get('backend')))
+        if old is None:
+            continue
+        old_p95, new_p95 = old['latency_ms'].get('p95'), clip['latency_ms'].get('p95')
+        lines.append(f"{clip['clip']} [{clip['backend']}]: fps {old['fps']} -> {clip['fps']} "
+                     f"({percent_change(clip['fps'], old['fps'])}), "
+                     f"p95 {old_p95} -> {new_p95} ms ({percent_change(new_p95, old_p95)})")
+    return lines
+
+
+def print_report(results):
+    for clip in results['clips']:
+        latency = clip['latency_ms']
+        title = f"{clip['clip']} {clip['resolution']} [{clip['backend']}]"
+        if not latency['count']:
+            print(f'{title}: no frames processed')
+            continue
+        print(f"{title}: {clip['fps']} fps, cpu {clip['cpu_percent']}%, "
+              f"latency p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} ms")
+        for name, stage in clip['stages_ms'].items():
+            if not stage['count']:
+                print(f'    {name:<16} not called')
+                continue
+            print(f"    {name:<16} mean {stage['mean']:>8} ms  p95 {stage['p95']:>8} ms  ({stage['count']} calls)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Headless end-to-end pipeline benchmark')
+    parser.add_argument('clips', nargs='*', help='Video files, image directories or raw frame dumps. '
+                                                 'Synthetic reference clips are generated when omitted')
+    parser.add_argument('--clips_dir', type=str, default=None, help='Where to cache generated reference clips')
+    parser.add_argument('--output', type=str, default='bench_output.json', help='Machine-readable results file')
+    parser.add_argument('--compare', type=str, default=None, help='Previous results file to compare against')
+    parser.add_argument('--backends', type=int, nargs='+', default=[None], choices=sorted(TRACKER_BACKENDS),
+                        help='Tracker backends (TRACKER_BACKEND values) to run every clip with')
+    args = parser.parse_args(argv)
+
+    clips = args.clips or reference_clips(Path(args.clips_dir or mkdtemp(prefix='eye_tracker_clips_')))
+    results = run(clips, args.backends)
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print_report(results)
+    if args.compare:
+        for line in compare(results, json.loads(Path(args.compare).read_text())):
+            print(line)
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,155 @@
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+
+from eye_tracker.common.coordinates import Point
+from eye_tracker.view.drawing import ZERO_POINT
+
+FRAMES = 100_000
+NOISE_THRESHOLD = 1.5
+SECOND_US = 1_000_000
+
+
+@dataclass
+class LegacyPoint:
+    # Прежняя реализация Point (изменяемый dataclass) в объёме, нужном для сравнения
+    __slots__ = ['x', 'y']
+    x: float
+    y: float
+
+    def __iter__(self):
+        return iter((self.x, self.y))
+
+    def __sub__(self, other):
+        return LegacyPoint(self.x - other.x, self.y - other.y)
+
+    def __floordiv__(self, other):
+        if type(other) is LegacyPoint:
+            return LegacyPoint(self.x // other.x, self.y // other.y)
+        elif type(other) is int:
+            return LegacyPoint(self.x // other, self.y // other)
+        else:
+            raise ValueError('incorrect right operand')
+
+    def __add__(self, other):
+        if type(other) is LegacyPoint:
+            return LegacyPoint(self.x + other.x, self.y + other.y)
+        elif type(other) is float or type(other) is int:
+            return LegacyPoint(self.x + other, self.y + other)
+        else:
+            raise ValueError('incorrect right operand')
+
+    def __abs__(self):
+        return LegacyPoint(abs(self.x), abs(self.y))
+
+    def __ge__(self, other):
+        if type(other) is LegacyPoint:
+            return self.x >= other.x or self.y >= other.y
+        elif type(other) is float or type(other) is int:
+            return self.x >= other or self.y >= other
+        else:
+            raise ValueError('incorrect right operand')
+
+    def to_int(self):
+        return LegacyPoint(int(self.x), int(self.y))
+
+    def __eq__(self, other):
+        return self.x == other.x and self.y == other.y
+
+
+def legacy_frame(center, length, rect):
+    # Операции с точками, которые трекер и отрисовка рамки выполняли на каждом кадре до перехода на кортеж
+    left, top, right, bottom = rect
+    new_center = LegacyPoint((left + right) / 2, (top + bottom) / 2)
+    if abs(center - new_center) >= NOISE_THRESHOLD:
+        center = new_center
+    left_top = (center - length // 2).to_int()
+    right_bottom = (center + length // 2).to_int()
+    if left_top != right_bottom and left_top != LegacyPoint(0, 0):
+        return center, ((*left_top,), (*right_bottom,))
+    return center, None
+
+
+def current_frame(center, half_length, rect):
+    # То же для Point: update_center, Tracker.left_top и right_bottom, Processor.draw_rectangle
+    left, top, right, bottom = rect
+    new_center = Point((left + right) / 2, (top + bottom) / 2)
+    if new_center.moved_at_least(center, NOISE_THRESHOLD):
+        center = new_center
+    left_top = (center - half_length).to_int()
+    right_bottom = (center + half_length).to_int()
+    if left_top != right_bottom and left_top != ZERO_POINT:
+        return center, (left_top, right_bottom)
+    return center, None
+
+
+def rects(frames=FRAMES):
+    return [(100 + i % 7, 80 + i % 5, 160 + i % 7, 140 + i % 5) for i in range(frames)]
+
+
+def initial_points(frame, point_class):
+    length = point_class(60, 60)
+    return point_class(130, 110), length if frame is legacy_frame else length // 2
+
+
+def count_points_created(frame, point_class, rect):
+    # Точки считаются через профилировщик: прежние создаются вызовом __init__ на Python,
+    # новые - вызовом tuple.__new__ на C
+    created = 0
+
+    def profile(frame_info, event, arg):
+        nonlocal created
+        if event == 'call' and frame_info.f_code.co_name == '__init__' and \
+                type(frame_info.f_locals.get('self')) is point_class:
+            created += 1
+        elif event == 'c_call' and arg is tuple.__new__:
+            created += 1
+
+    center, length = initial_points(frame, point_class)
+    sys.setprofile(profile)
+    try:
+        frame(center, length, rect)
+    finally:
+        sys.setprofile(None)
+    return created
+
+
+def measure(frame, point_class, frames=FRAMES):
+    center, length = initial_points(frame, point_class)
+    samples = rects(frames)
+    started = perf_counter()
+    for rect in samples:
+        center, _ = frame(center, length, rect)
+    elapsed = perf_counter() - started
+    return {'us_per_frame': round(elapsed / frames * SECOND_US, 4),
+            'points_per_frame': count_points_created(frame, point_class, samples[-1])}
+
+
+def run(frames=FRAMES):
+    legacy = measure(legacy_frame, LegacyPoint, frames)
+    current = measure(current_frame, Point, frames)
+    return {'frames': frames, 'legacy': legacy, 'current': current,
+            'speedup': round(legacy['us_per_frame'] / current['us_per_frame'], 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Point arithmetic micro-benchmark of the per-frame tracker path')
+    parser.add_argument('--frames', type=int, default=FRAMES, help='Simulated frames')
+    parser.add_argument('--output', type=str, default=None, help='Machine-readable results file')
+    args = parser.parse_args(argv)
+
+    results = run(args.frames)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    for name in ('legacy', 'current'):
+        print(f"{name:<8} {results[name]['us_per_frame']:>8} us/frame, "
+              f"{results[name]['points_per_frame']} points/frame")
+    print(f"speedup {results['speedup']}x")
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
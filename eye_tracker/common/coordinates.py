@@ -1,69 +1,57 @@
-from dataclasses import dataclass
-from math import sqrt
+from collections import namedtuple
+from math import hypot
 from typing import List
 
 import cv2
 import numpy as np
 
 
-@dataclass
-class Point:
-    __slots__ = ['x', 'y']
-    x: float
-    y: float
-
-    def __iter__(self):
-        return iter((self.x, self.y))
+class Point(namedtuple('Point', ['x', 'y'])):
+    # Неизменяемая пара координат: кортеж создаётся без словаря атрибутов, а x и y читаются по индексу.
+    # Изменить точку нельзя, вместо этого присваивается новая
+    __slots__ = []
 
     def __sub__(self, other):
-        return Point(self.x - other.x, self.y - other.y)
-
-    def __imul__(self, other):
-        if type(other) is Point:
-            self.x *= other.x
-            self.y *= other.y
-        elif type(other) is float or type(other) is int:
-            self.x *= other
-            self.y *= other
-        else:
-            raise ValueError('incorrect right operand')
-        return self
+        return _new_point(Point, (self.x - other.x, self.y - other.y))
 
     def __mul__(self, other):
         if type(other) is Point:
-            return Point(self.x * other.x, self.y * other.y)
+            return _new_point(Point, (self.x * other.x, self.y * other.y))
         elif type(other) is float or type(other) is int:
-            return Point(self.x * other, self.y * other)
+            return _new_point(Point, (self.x * other, self.y * other))
         else:
             raise ValueError('incorrect right operand')
 
+    __rmul__ = __mul__
+
     def __truediv__(self, other):
         if type(other) is Point:
-            return Point(self.x / other.x, self.y / other.y)
+            return _new_point(Point, (self.x / other.x, self.y / other.y))
         elif type(other) is float or type(other) is int:
-            return Point(self.x / other, self.y / other)
+            return _new_point(Point, (self.x / other, self.y / other))
         else:
             raise ValueError('incorrect right operand')
 
     def __floordiv__(self, other):
         if type(other) is Point:
-            return Point(self.x // other.x, self.y // other.y)
+            return _new_point(Point, (self.x // other.x, self.y // other.y))
         elif type(other) is int:
-            return Point(self.x // other, self.y // other)
+            return _new_point(Point, (self.x // other, self.y // other))
         else:
             raise ValueError('incorrect right operand')
 
     def __add__(self, other):
         if type(other) is Point:
-            return Point(self.x + other.x, self.y + other.y)
+            return _new_point(Point, (self.x + other.x, self.y + other.y))
         elif type(other) is float or type(other) is int:
-            return Point(self.x + other, self.y + other)
+            return _new_point(Point, (self.x + other, self.y + other))
         else:
             raise ValueError('incorrect right operand')
 
     def __abs__(self):
-        return Point(abs(self.x), abs(self.y))
+        return _new_point(Point, (abs(self.x), abs(self.y)))
 
+    # сравнения не лексикографические, как у кортежа, а по любой из осей
     def __ge__(self, other):
         if type(other) is Point:
             return self.x >= other.x or self.y >= other.y
@@ -81,27 +69,59 @@ class Point:
         else:
             raise ValueError('incorrect right operand')
 
+    def __gt__(self, other):
+        if type(other) is Point:
+            return self.x > other.x or self.y > other.y
+        elif type(other) is float or type(other) is int:
+            return self.x > other or self.y > other
+        else:
+            raise ValueError('incorrect right operand')
+
+    def __le__(self, other):
+        if type(other) is Point:
+            return self.x <= other.x or self.y <= other.y
+        elif type(other) is float or type(other) is int:
+            return self.x <= other or self.y <= other
+        else:
+            raise ValueError('incorrect right operand')
+
+    def moved_at_least(self, other, distance):
+        # то же, что abs(self - other) >= distance, но без промежуточных точек, для горячего пути трекера
+        return abs(self.x - other.x) >= distance or abs(self.y - other.y) >= distance
+
     def to_int(self):
-        return Point(int(self.x), int(self.y))
+        return _new_point(Point, (int(self.x), int(self.y)))
 
     def __str__(self):
         return f'({self.x}, {self.y})'
 
-    def __hash__(self):
-        return hash((self.x, self.y))
+    def calc_distance(self, other):
+        return hypot(other.x - self.x, other.y - self.y)
 
-    def __eq__(self, other):
-        return self.x == other.x and self.y == other.y
 
-    def calc_distance(self, other):
-        return sqrt((other.x - self.x) ** 2 + (other.y - self.y) ** 2)
+_new_point = tuple.__new__
 
 
 def calc_center(left_top: Point, right_bottom: Point) -> Point:
     return Point(int((left_top.x + right_bottom.x) / 2), int((left_top.y + right_bottom.y) / 2))
 
 
+class PointSet(np.ndarray):
+    # Набор точек в виде массива N x 2, преобразуется целиком без цикла по отдельным Point
+    def __new__(cls, points=()):
+        if isinstance(points, np.ndarray):
+            array = np.asarray(points, dtype=np.float64)
+        else:
+            array = np.array([(*p,) for p in points], dtype=np.float64)
+        return array.reshape(-1, 2).view(cls)
+
+    def to_points(self) -> List[Point]:
+        return [Point(x, y) for x, y in self.tolist()]
+
+
 def transform_points_array(array: List[Point]):
+    if isinstance(array, np.ndarray):
+        return np.asarray(array, dtype="float32").reshape(-1, 2)
     return np.array([(*p,) for p in array], dtype="float32")
     # TODO: вынести в отдельные функции и встроить автокоррекцию координат в CropZoomer
 
@@ -125,3 +145,10 @@ def translate_coordinates(translation_matrix, point: Point):
     X = (m[0, 0] * x + m[0, 1] * y + m[0, 2]) / common_denominator
     Y = (m[1, 0] * x + m[1, 1] * y + m[1, 2]) / common_denominator
     return Point(int(X), int(Y))
+
+
+def translate_points(translation_matrix, points) -> PointSet:
+    # то же, что translate_coordinates, но сразу для всех точек и без округления
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    homogeneous = points @ translation_matrix[:, :2].T + translation_matrix[:, 2]
+    return (homogeneous[:, :2] / homogeneous[:, 2:]).view(PointSet)
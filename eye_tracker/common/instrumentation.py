@@ -0,0 +1,205 @@
+from bisect import bisect_right
+from threading import Lock
+from time import perf_counter
+
+from eye_tracker.common.logger import logger
+from eye_tracker.common.settings import settings
+
+CAMERA_READ = 'camera read'
+CHANGE_DETECTION = 'change detection'
+TRACKER_UPDATE = 'tracker update'
+AREA_MATH = 'area math'
+LASER_DISPATCH = 'laser dispatch'
+DRAWING = 'drawing'
+IMAGE_CONVERSION = 'image conversion'
+ITERATION = 'iteration'
+GLASS_TO_LASER = 'glass to laser'
+PIPELINE_STAGES = (CAMERA_READ, CHANGE_DETECTION, TRACKER_UPDATE, AREA_MATH, LASER_DISPATCH, DRAWING,
+                   IMAGE_CONVERSION, ITERATION, GLASS_TO_LASER)
+
+MIN_BUCKET_SEC = 0.00001
+MAX_BUCKET_SEC = 10.0
+BUCKETS_PER_DOUBLING = 8  # шаг между границами ~9%, этого хватает для перцентилей
+SECOND_MS = 1000
+NOT_STARTED = 0.0
+LATENCY_WARNING_INTERVAL_SEC = 10
+
+
+def _log_spaced_bounds(lowest=MIN_BUCKET_SEC, highest=MAX_BUCKET_SEC, per_doubling=BUCKETS_PER_DOUBLING):
+    bounds = []
+    bound = lowest
+    while bound < highest:
+        bounds.append(bound)
+        bound *= 2 ** (1 / per_doubling)
+    return tuple(bounds)
+
+
+BUCKET_BOUNDS = _log_spaced_bounds()
+
+
+class Histogram:
+    # Корзины выделяются один раз, добавление значения не создаёт новых объектов кроме float.
+    # Значения добавляют потоки обработки, отрисовки и лазера, а сбрасывает окно поток обработки
+    __slots__ = ['_bounds', '_counts', 'count', 'total', 'max', '_lock']
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self._bounds = bounds
+        self._lock = Lock()
+        self._counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        with self._lock:
+            self._counts[bisect_right(self._bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        threshold = self.count * percent / 100
+        accumulated = 0
+        for index, bucket_count in enumerate(self._counts):
+            accumulated += bucket_count
+            if accumulated >= threshold:
+                # верхняя граница корзины, но не больше реального максимума
+                return min(self._bounds[index], self.max) if index < len(self._bounds) else self.max
+        return self.max
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        for index in range(len(self._counts)):
+            self._counts[index] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def summary_ms(self, reset=False):
+        # сводка и сброс под одной блокировкой, чтобы значения, добавленные между ними, не терялись
+        with self._lock:
+            summary = {'count': self.count,
+                       'mean': round(self.mean * SECOND_MS, 4),
+                       'p50': round(self.percentile(50) * SECOND_MS, 4),
+                       'p95': round(self.percentile(95) * SECOND_MS, 4),
+                       'p99': round(self.percentile(99) * SECOND_MS, 4),
+                       'max': round(self.max * SECOND_MS, 4)}
+            if reset:
+                self._reset()
+        return summary
+
+
+class Stage:
+    # Переиспользуемый контекстный менеджер замера, один объект на этап на всё время работы программы
+    __slots__ = ['name', 'total', 'window', '_started']
+
+    def __init__(self, name):
+        self.name = name
+        self.total = Histogram()
+        self.window = Histogram()
+        self._started = NOT_STARTED
+
+    def __enter__(self):
+        if settings.INSTRUMENTATION:
+            self._started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if not self._started:
+            return
+        elapsed = perf_counter() - self._started
+        self._started = NOT_STARTED
+        self.add(elapsed)
+
+    def add(self, elapsed):
+        self.total.add(elapsed)
+        self.window.add(elapsed)
+
+    def reset(self):
+        self.total.reset()
+        self.window.reset()
+
+
+class Profiler:
+    def __init__(self, stage_names=PIPELINE_STAGES):
+        self._stages = {name: Stage(name) for name in stage_names}
+        self._last_dump = perf_counter()
+
+    def stage(self, name) -> Stage:
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = Stage(name)
+        return stage
+
+    def stages(self):
+        return self._stages.values()
+
+    def summary_ms(self):
+        return {stage.name: stage.total.summary_ms() for stage in self._stages.values()}
+
+    def overlay_lines(self):
+        return [f'{stage.name}: {stage.total.mean * SECOND_MS:.1f} / {stage.total.percentile(95) * SECOND_MS:.1f} ms'
+                for stage in self._stages.values() if stage.total.count]
+
+    def dump_if_due(self):
+        now = perf_counter()
+        if not settings.INSTRUMENTATION or now - self._last_dump < settings.INSTRUMENTATION_DUMP_INTERVAL:
+            return
+        self._last_dump = now
+        for stage in self._stages.values():
+            window = stage.window
+            if not window.count:
+                continue
+            summary = window.summary_ms(reset=True)
+            logger.debug(f'{stage.name}: {summary["count"]} calls, mean {summary["mean"]} ms, '
+                         f'p50 {summary["p50"]} ms, p95 {summary["p95"]} ms, p99 {summary["p99"]} ms, '
+                         f'max {summary["max"]} ms')
+
+    def reset(self):
+        for stage in self._stages.values():
+            stage.reset()
+        self._last_dump = perf_counter()
+
+
+class LatencyMonitor:
+    # Время от захвата кадра (метка CapturedFrame.timestamp) до отправки команды в последовательный порт
+    def __init__(self, stage: Stage):
+        self._stage = stage
+        self.exceeded_count = 0
+        self._last_warning = 0.0
+
+    def record(self, capture_time: float):
+        if not settings.INSTRUMENTATION or capture_time is None:
+            return
+        latency = perf_counter() - capture_time
+        self._stage.add(latency)
+        budget = settings.LATENCY_BUDGET_MS / SECOND_MS
+        if budget and latency > budget:
+            self._on_budget_exceeded(latency)
+
+    def _on_budget_exceeded(self, latency):
+        self.exceeded_count += 1
+        now = perf_counter()
+        if now - self._last_warning < LATENCY_WARNING_INTERVAL_SEC:
+            return
+        self._last_warning = now
+        logger.warning(f'glass to laser latency {latency * SECOND_MS:.1f} ms exceeds the budget of '
+                       f'{settings.LATENCY_BUDGET_MS} ms ({self.exceeded_count} times in total)')
+
+    @property
+    def expected_latency(self):
+        return self._stage.total.percentile(50)
+
+
+profiler = Profiler()
+glass_to_laser = LatencyMonitor(profiler.stage(GLASS_TO_LASER))
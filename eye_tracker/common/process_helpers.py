@@ -0,0 +1,148 @@
+import struct
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+
+import numpy as np
+
+from eye_tracker.common.logger import logger, turn_logging_on
+from eye_tracker.common.settings import settings, private_settings
+from eye_tracker.view import view_output
+
+# spawn одинаково работает на Windows и Linux: дочерний процесс не наследует потоки, Tk и открытые устройства
+SPAWN = get_context('spawn')
+SHARED_RING_SLOTS = 3
+COUNTER = struct.Struct('<Q')
+
+
+def settings_snapshot():
+    # настройки могли быть изменены и не сохранены, поэтому передаются значениями, а не читаются из файла
+    return ({key: value for key, value in vars(settings).items() if key.isupper()},
+            {key: value for key, value in vars(private_settings).items() if key.isupper()})
+
+
+def prepare_child_process(snapshot, view):
+    public, private = snapshot
+    for key, value in public.items():
+        settings._set_attr_force(key, value)
+    for key, value in private.items():
+        private_settings._set_attr_force(key, value)
+    view_output._view = view
+    turn_logging_on(logger, console=True)
+
+
+class ForwardingView:
+    # Подменяет окно в дочернем процессе: сообщения для пользователя уходят в очередь и показываются родителем
+    def __init__(self, messages):
+        self._messages = messages
+        self._visible_messageboxes = []
+
+    def queue_command(self, command):
+        self._messages.put(command)
+
+
+class SeqlockStruct:
+    # Структура в общей памяти с одним писателем и любым числом читателей без блокировок.
+    # На время записи писатель делает счётчик нечётным, читатель повторяет чтение,
+    # если счётчик был нечётным или изменился, пока читались поля
+    def __init__(self, fields: str, name: str = None):
+        self._fields = struct.Struct(f'<{fields}')
+        self._owner = name is None
+        self._memory = SharedMemory(name, create=self._owner, size=COUNTER.size + self._fields.size)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def _counter(self):
+        return COUNTER.unpack_from(self._memory.buf)[0]
+
+    def write(self, *values):
+        counter = self._counter()
+        COUNTER.pack_into(self._memory.buf, 0, counter + 1)
+        self._fields.pack_into(self._memory.buf, COUNTER.size, *values)
+        COUNTER.pack_into(self._memory.buf, 0, counter + 2)
+
+    def read(self):
+        # номер записи и значения полей; 0 - ещё ничего не записано
+        while True:
+            before = self._counter()
+            if before % 2:
+                continue
+            values = self._fields.unpack_from(self._memory.buf, COUNTER.size)
+            if self._counter() == before:
+                return before // 2, values
+
+    def close(self):
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+class SharedFrameRing:
+    # Кольцо кадров в общей памяти: номер последнего кадра, по слоту счётчик seqlock и время захвата, затем кадры.
+    # Пишет один процесс захвата, читатель копирует самый свежий кадр и повторяет копирование,
+    # если писатель успел пройти кольцо и начать перезапись этого слота
+    def __init__(self, shape, slots: int = SHARED_RING_SLOTS, name: str = None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self._owner = name is None
+        header_size = COUNTER.size * (1 + 2 * slots)
+        frame_size = int(np.prod(self.shape))
+        self._memory = SharedMemory(name, create=self._owner, size=header_size + frame_size * slots)
+        self._published = np.ndarray((1,), np.uint64, self._memory.buf)
+        self._counters = np.ndarray((slots,), np.uint64, self._memory.buf, COUNTER.size)
+        self._timestamps = np.ndarray((slots,), np.float64, self._memory.buf, COUNTER.size * (1 + slots))
+        self._frames = np.ndarray((slots,) + self.shape, np.uint8, self._memory.buf, header_size)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    @property
+    def sequence(self):
+        return int(self._published[0])
+
+    def write(self, frame, timestamp: float):
+        published = int(self._published[0])
+        slot = published % self.slots
+        self._counters[slot] += 1
+        np.copyto(self._frames[slot], frame)
+        self._timestamps[slot] = timestamp
+        self._counters[slot] += 1
+        self._published[0] = published + 1
+
+    def read_latest(self, out):
+        # (номер кадра, время захвата) скопированного в out кадра, None - кадров ещё не было
+        while True:
+            published = int(self._published[0])
+            if not published:
+                return None
+            slot = (published - 1) % self.slots
+            before = int(self._counters[slot])
+            if before % 2:
+                continue
+            np.copyto(out, self._frames[slot])
+            timestamp = float(self._timestamps[slot])
+            if int(self._counters[slot]) == before:
+                return published, timestamp
+
+    def close(self):
+        # массивы держат ссылки на буфер общей памяти, без их удаления close() выбрасывает BufferError
+        self._published = self._counters = self._timestamps = self._frames = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+def wait_for(predicate, event, timeout: float):
+    # ожидание события из другого процесса: флаг сбрасывается до проверки, чтобы не пропустить установку
+    deadline = perf_counter() + timeout
+    while True:
+        event.clear()
+        if predicate():
+            return True
+        remaining = deadline - perf_counter()
+        if remaining <= 0:
+            return False
+        event.wait(remaining)
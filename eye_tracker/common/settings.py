@@ -7,6 +7,7 @@ from os.path import exists
 from pathlib import Path
 from sys import maxsize
 
+from eye_tracker.common.coordinates import Point
 from eye_tracker.view import view_output
 
 RESOLUTIONS = {1280: 720, 800: 600, 640: 480}
@@ -96,6 +97,28 @@ LIMITATIONS = {
     'STABLE_POSITION_DURATION': Range(0.5, 1.0),
     'DOWNSCALE_FACTOR': Range(0.05, 0.5),
     'SAME_FRAMES_THRESHOLD': Range(0.01, 0.99),
+    'THREADED_CAPTURE': OptionList(0, 1),
+    'INSTRUMENTATION': OptionList(0, 1),
+    'INSTRUMENTATION_DUMP_INTERVAL': Range(1, INFINITE),
+    'STATS_OVERLAY': OptionList(0, 1),
+    'LATENCY_BUDGET_MS': Range(0, INFINITE),
+    'ROI_TRACKING': OptionList(0, 1),
+    'ROI_SEARCH_FACTOR': Range(2.0, 8.0),
+    'TRACKER_BACKEND': OptionList(0, 1, 2, 3, 4),
+    'TRACKING_LOST_CONFIDENCE': Range(0.0, 0.9),
+    'REACQUIRE_THRESHOLD': Range(0.3, 0.99),
+    'MOTION_FILTER': OptionList(0, 1),
+    'KALMAN_PROCESS_NOISE': Range(1, INFINITE),
+    'KALMAN_MEASUREMENT_NOISE': Range(0.01, INFINITE),
+    'LASER_PREDICTION': OptionList(0, 1),
+    'CHANGE_DETECTION_ROI': OptionList(0, 1),
+    'SENSOR_SPACE_TRACKING': OptionList(0, 1),
+    'LASER_BINARY_PROTOCOL': OptionList(0, 1),
+    'LASER_COMMANDS_IN_FLIGHT': Range(1, 16),
+    'MAX_TRACKED_OBJECTS': Range(1, 8),
+    'TRACKING_THREADS': Range(1, 8),
+    'LASER_TARGET_POLICY': OptionList(0, 1, 2),
+    'PROCESS_PIPELINE': OptionList(0, 1),
 
     'ROTATION_ANGLE': OptionList(0, 90, 180, 270),
     'FLIP_SIDE': OptionList(FLIP_SIDE_NONE, FLIP_SIDE_HORIZONTAL, FLIP_SIDE_VERTICAL),
@@ -119,6 +142,39 @@ class Settings:
         self.STABLE_POSITION_DURATION = 0.67
         self.DOWNSCALE_FACTOR = 0.25  # чем ниже значение, тем выше производительность, но ниже точность трекинга
         self.SAME_FRAMES_THRESHOLD = 0.53  # в полной темноте начиная с такого значения обновляется картинка
+        self.THREADED_CAPTURE = 1  # захват кадров с камеры в отдельном потоке
+        self.INSTRUMENTATION = 1  # замеры времени этапов обработки кадра
+        self.INSTRUMENTATION_DUMP_INTERVAL = 60  # в секундах, как часто сбрасывать замеры в журнал
+        self.STATS_OVERLAY = 0  # вывод замеров поверх изображения
+        self.LATENCY_BUDGET_MS = 100  # допустимая задержка от захвата кадра до команды лазеру, 0 - не проверять
+        self.ROI_TRACKING = 1  # слежение только в окне вокруг объекта, а не по всему кадру
+        self.ROI_SEARCH_FACTOR = 3.0  # во сколько раз окно поиска больше объекта
+        # алгоритм слежения: 0 - dlib, 1 - OpenCV KCF, 2 - OpenCV MOSSE, 3 - OpenCV CSRT, 4 - фазовая корреляция
+        # алгоритмы OpenCV требуют пакет opencv-contrib-python
+        self.TRACKER_BACKEND = 0
+        self.TRACKING_LOST_CONFIDENCE = 0.25  # ниже этой уверенности объект считается потерянным и лазер замирает
+        self.REACQUIRE_THRESHOLD = 0.6  # насколько найденная область должна совпадать с образцом объекта
+        self.MOTION_FILTER = 1  # сглаживание координат: 0 - скользящее среднее, 1 - фильтр Калмана
+        # чем больше, тем быстрее фильтр Калмана реагирует на смену скорости, но тем хуже сглаживает дрожание
+        self.KALMAN_PROCESS_NOISE = 100000
+        self.KALMAN_MEASUREMENT_NOISE = 4.0  # квадрат ожидаемой погрешности трекера в пикселях
+        self.CHANGE_DETECTION_ROI = 0  # 1 - при слежении кадр обрабатывается, только если изменилась область объекта
+        # слежение по кадру камеры без поворота и отражения,
+        # они применяются только к координатам и к изображению на экране
+        self.SENSOR_SPACE_TRACKING = 0
+        self.LASER_PREDICTION = 1  # наводить лазер туда, где объект будет с учётом задержки, а не где он был
+        # предлагать контроллеру лазера двоичный протокол, без его поддержки в прошивке остаётся текстовый
+        self.LASER_BINARY_PROTOCOL = 0
+        # сколько неподтверждённых команд может быть отправлено контроллеру лазера без ожидания ready,
+        # больше одной - только с двоичным протоколом, 1 - прежний режим с ожиданием ready
+        self.LASER_COMMANDS_IN_FLIGHT = 4
+        self.MAX_TRACKED_OBJECTS = 1  # сколько объектов можно отслеживать одновременно, 1 - только основной
+        self.TRACKING_THREADS = 2  # сколько трекеров обновляется параллельно, если объектов несколько
+        # по какому объекту наводится лазер: 0 - по первому выделенному, при его потере по следующему,
+        # 1 - по тому, в котором трекер уверен больше всего, 2 - в середину между всеми найденными объектами
+        self.LASER_TARGET_POLICY = 0
+        # захват кадров и обмен с контроллером лазера в отдельных процессах, чтобы они не делили GIL со слежением
+        self.PROCESS_PIPELINE = 0
 
     def __setattr__(self, key, value):
         try:
@@ -190,6 +246,23 @@ settings = Settings()
 private_settings = PrivateSettings()
 
 
+class _LegacyPoint:
+    # До перехода Point на кортеж точки сохранялись как объекты со слотами x и y, созданные без аргументов
+    __slots__ = ['x', 'y']
+
+    def __new__(cls, *args):
+        if args:
+            return Point(*args)
+        return super().__new__(cls)
+
+
+class _AreaUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) == (Point.__module__, Point.__name__):
+            return _LegacyPoint
+        return super().find_class(module, name)
+
+
 class SelectedArea:
     @staticmethod
     def load(folder: str = FOLDER, file: str = AREA_FILE):
@@ -197,7 +270,9 @@ class SelectedArea:
 
         path = base_path / folder / file
         if Path.exists(path):
-            left_top, right_top, right_bottom, left_bottom = pickle.loads(Path.read_bytes(path))
+            with open(path, 'rb') as file:
+                points = _AreaUnpickler(file).load()
+            left_top, right_top, right_bottom, left_bottom = (Point(point.x, point.y) for point in points)
             return left_top, right_top, right_bottom, left_bottom
 
     @staticmethod
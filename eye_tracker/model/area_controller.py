@@ -1,6 +1,10 @@
 from threading import Thread
 
-from winsound import PlaySound, SND_PURGE, SND_FILENAME
+try:
+    from winsound import PlaySound, SND_PURGE, SND_FILENAME
+except ImportError:
+    # звуковое предупреждение есть только под Windows, на остальных системах (например, на стенде замеров) его нет
+    PlaySound = None
 
 from eye_tracker.common.settings import ASSETS_FOLDER
 from eye_tracker.common.coordinates import Point, get_translation_maxtix, translate_coordinates
@@ -20,33 +24,52 @@ class AreaController:
         self._max_xy = Point(max_xy, max_xy)
         self._min_xy = Point(min_xy, min_xy)
         self._translation_matrix = None
+        self._composed_source = None
+        self._composed_matrix = None
         self._beeped = False
 
     def set_area(self, area: AreaSelector, laser_borders=None):
         self._translation_matrix = get_translation_maxtix(area.points, laser_borders)
+        self._composed_source = None
 
         Processor.load_color()
         logger.debug(f'set area {area.points}')
 
-    def point_is_out_of_area(self, point: Point, beep_sound_allowed=False) -> bool:
+    def _laser_matrix(self, source_matrix=None):
+        if source_matrix is None:
+            return self._translation_matrix
+        # матрица перевода в координаты экрана меняется только с началом слежения, а область - только при выделении,
+        # поэтому их произведение пересчитывается лишь при смене одной из них
+        if self._composed_source is not source_matrix:
+            self._composed_matrix = self._translation_matrix @ source_matrix
+            self._composed_source = source_matrix
+        return self._composed_matrix
+
+    def to_laser(self, point: Point, source_matrix=None, beep_sound_allowed=False):
+        # source_matrix переводит point в координаты экрана, если point задана в координатах кадра трекера
         # https://docs.opencv.org/4.x/da/d54/group__imgproc__transform.html#gaf73673a7e8e18ec6963e3774e6a94b87
-        translated = translate_coordinates(self._translation_matrix, point)
+        translated = translate_coordinates(self._laser_matrix(source_matrix), point)
         out_of_area = translated.x < self._min_xy.x or translated.x > self._max_xy.x \
             or translated.y < self._min_xy.y or translated.y > self._max_xy.y
         if beep_sound_allowed:
             self.beep(out_of_area)
+        return translated, out_of_area
+
+    def point_is_out_of_area(self, point: Point, beep_sound_allowed=False) -> bool:
+        _, out_of_area = self.to_laser(point, beep_sound_allowed=beep_sound_allowed)
         return out_of_area
 
     def beep(self, out_of_area):
         if out_of_area and not self._beeped:
-            sound_path = str(get_repo_path(bundled=True) / ASSETS_FOLDER / SOUND_NAME)
-            Thread(target=PlaySound, args=(sound_path, SND_FILENAME | SND_PURGE)).start()
+            if PlaySound is not None:
+                sound_path = str(get_repo_path(bundled=True) / ASSETS_FOLDER / SOUND_NAME)
+                Thread(target=PlaySound, args=(sound_path, SND_FILENAME | SND_PURGE)).start()
             self._beeped = True
-            Processor.CURRENT_COLOR = Processor.COLOR_CAUTION
+            Processor.set_color(Processor.COLOR_CAUTION)
         if not out_of_area:
             Processor.load_color()
             self._beeped = False
 
     def calc_laser_coords(self, object_center: Point) -> Point:
-        translated_center = translate_coordinates(self._translation_matrix, object_center)
+        translated_center, _ = self.to_laser(object_center)
         return translated_center
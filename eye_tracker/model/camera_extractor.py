@@ -1,28 +1,227 @@
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Condition
+from time import perf_counter, sleep
+
 import cv2
 import numpy as np
 
 from eye_tracker.common.abstractions import Initializable
-from eye_tracker.common.settings import settings, private_settings, FLIP_SIDE_NONE
+from eye_tracker.common.logger import logger
+from eye_tracker.common.settings import settings, private_settings, FLIP_SIDE_NONE, FLIP_SIDE_HORIZONTAL, \
+    FLIP_SIDE_VERTICAL
+from eye_tracker.common.thread_helpers import ThreadLoopable, MutableValue
+from eye_tracker.model.frame_sources import FrameSource, open_frame_source
 from eye_tracker.view import view_output
 
 DEGREE_TO_CV2_MAP = {90: cv2.ROTATE_90_CLOCKWISE,
                      180: cv2.ROTATE_180,
                      270: cv2.ROTATE_90_COUNTERCLOCKWISE}
 
+# линейная часть преобразования координат пикселя (x, y) при повороте по часовой стрелке и отражении
+ROTATION_MATRICES = {0: np.array([[1, 0], [0, 1]]),
+                     90: np.array([[0, -1], [1, 0]]),
+                     180: np.array([[-1, 0], [0, -1]]),
+                     270: np.array([[0, 1], [-1, 0]])}
+FLIP_MATRICES = {FLIP_SIDE_NONE: np.array([[1, 0], [0, 1]]),
+                 FLIP_SIDE_HORIZONTAL: np.array([[-1, 0], [0, 1]]),
+                 FLIP_SIDE_VERTICAL: np.array([[1, 0], [0, -1]])}
+FLIP_BOTH = -1
+
 DEFAULT_CAMERA_ID = 0
+CAPTURE_RING_SIZE = 3  # меньше 3-х нельзя: один слот читает потребитель, один самый свежий, в третий пишет камера
+CAPTURE_TIMEOUT_SEC = 1.0
+EMPTY_READ_BACKOFF_SEC = 0.001  # первая пауза после пустого чтения, дальше она удваивается
+NO_FRAME = -1
 
 
 class NoneFrameException(Exception):
     ...
 
 
+class EmptyReadBackoff:
+    # Отключённая камера возвращает пустой кадр сразу, и цикл захвата без паузы занял бы ядро и GIL.
+    # Пауза растёт до периода кадра FPS_PROCESSED и сбрасывается первым же полученным кадром
+    __slots__ = ['delay']
+
+    def __init__(self):
+        self.delay = 0.0
+
+    def wait(self):
+        self.delay = min(max(self.delay * 2, EMPTY_READ_BACKOFF_SEC), 1 / settings.FPS_PROCESSED)
+        sleep(self.delay)
+
+    def reset(self):
+        self.delay = 0.0
+
+
+@dataclass
+class CapturedFrame:
+    __slots__ = ['image', 'sequence', 'timestamp']
+    image: object
+    sequence: int
+    timestamp: float
+
+
+class FrameOrientation:
+    # Поворот с последующим отражением - всегда один из 8 элементов группы симметрий прямоугольника,
+    # поэтому выполняется одной операцией OpenCV в переиспользуемый буфер, а не двумя копиями кадра
+    def __init__(self, degree: int = 0, flip_side: int = FLIP_SIDE_NONE):
+        self.degree = degree
+        self.flip_side = flip_side
+        self._linear = FLIP_MATRICES[flip_side] @ ROTATION_MATRICES[degree]
+        self._operation = self._choose_operation(tuple(self._linear.flatten()))
+        # как и слот FrameRing, буфер действителен до получения следующего кадра
+        self._buffer = None
+
+    @property
+    def identity(self):
+        return self._operation is None
+
+    def _choose_operation(self, linear):
+        return {
+            (1, 0, 0, 1): None,
+            (-1, 0, 0, 1): lambda frame, out: cv2.flip(frame, FLIP_SIDE_HORIZONTAL, out),
+            (1, 0, 0, -1): lambda frame, out: cv2.flip(frame, FLIP_SIDE_VERTICAL, out),
+            (-1, 0, 0, -1): lambda frame, out: cv2.flip(frame, FLIP_BOTH, out),
+            (0, -1, 1, 0): lambda frame, out: cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE, out),
+            (0, 1, -1, 0): lambda frame, out: cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE, out),
+            (0, 1, 1, 0): lambda frame, out: cv2.transpose(frame, out),
+            (0, -1, -1, 0): self._anti_transpose,
+        }[linear]
+
+    def output_size(self, width: int, height: int):
+        return (height, width) if self._linear[0, 0] == 0 else (width, height)
+
+    def matrix(self, width: int, height: int):
+        # матрица 3x3 перевода координат исходного кадра в координаты повёрнутого и отражённого
+        corners = np.array([[0, width - 1, 0, width - 1], [0, 0, height - 1, height - 1]])
+        offset = -(self._linear @ corners).min(axis=1)
+        matrix = np.eye(3)
+        matrix[:2, :2] = self._linear
+        matrix[:2, 2] = offset
+        return matrix
+
+    @staticmethod
+    def _anti_transpose(frame, out):
+        # отдельной операции в OpenCV нет, отражение на месте в буфере дешевле warpAffine в 3-4 раза
+        cv2.transpose(frame, out)
+        return cv2.flip(out, FLIP_BOTH, out)
+
+    def _output_buffer(self, frame):
+        height, width = frame.shape[:2]
+        out_width, out_height = self.output_size(width, height)
+        shape = (out_height, out_width) + frame.shape[2:]
+        if self._buffer is None or self._buffer.shape != shape or self._buffer.dtype != frame.dtype:
+            self._buffer = np.empty(shape, dtype=frame.dtype)
+        return self._buffer
+
+    def apply(self, frame):
+        if self._operation is None:
+            return frame
+        return self._operation(frame, self._output_buffer(frame))
+
+
+class FrameRing:
+    # Кольцо предвыделенных буферов кадров. Один производитель пишет в свободный слот,
+    # потребитель всегда забирает самый свежий кадр, устаревшие кадры просто перезаписываются
+    def __init__(self, size: int = CAPTURE_RING_SIZE):
+        if size < CAPTURE_RING_SIZE:
+            raise ValueError(f'ring size should be at least {CAPTURE_RING_SIZE}')
+        self._buffers = [None] * size
+        self._sequences = [0] * size
+        self._timestamps = [0.0] * size
+        self._latest = NO_FRAME
+        self._reading = NO_FRAME
+        self._writing = NO_FRAME
+        self._sequence = 0
+        self._new_frame = Condition()
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def writable_buffer(self):
+        with self._new_frame:
+            size = len(self._buffers)
+            index = (self._writing + 1) % size
+            while index in (self._latest, self._reading):
+                index = (index + 1) % size
+            self._writing = index
+            return index, self._buffers[index]
+
+    def publish(self, index, image, timestamp):
+        with self._new_frame:
+            self._sequence += 1
+            self._buffers[index] = image
+            self._sequences[index] = self._sequence
+            self._timestamps[index] = timestamp
+            self._latest = index
+            self._new_frame.notify_all()
+
+    def take_latest(self, last_sequence: int, timeout: float = CAPTURE_TIMEOUT_SEC):
+        with self._new_frame:
+            if not self._new_frame.wait_for(lambda: self._sequence > last_sequence, timeout):
+                return None
+            latest = self._latest
+            # слот остаётся занятым потребителем до следующего вызова, поэтому камера в него не пишет
+            self._reading = latest
+            return CapturedFrame(self._buffers[latest], self._sequences[latest], self._timestamps[latest])
+
+
+class FrameGrabber(ThreadLoopable):
+    def __init__(self, camera, ring_size: int = CAPTURE_RING_SIZE, run_immediately: bool = True):
+        self._camera = camera
+        self.ring = FrameRing(ring_size)
+        self.dropped_count = 0
+        self._last_taken = 0
+        self._backoff = EmptyReadBackoff()
+        super().__init__(self._grab, MutableValue(0), run_immediately)
+
+    def _grab(self):
+        index, buffer = self.ring.writable_buffer()
+        _, frame = self._camera.read() if buffer is None else self._camera.read(buffer)
+        timestamp = perf_counter()
+        if frame is None:
+            if getattr(self._camera, 'exhausted', False):
+                self.stop_thread()
+                return
+            self._backoff.wait()
+            return
+        self._backoff.reset()
+        self.ring.publish(index, frame, timestamp)
+
+    def latest_frame(self, last_sequence: int):
+        captured = self.ring.take_latest(last_sequence)
+        if captured is None:
+            raise NoneFrameException('Не удалось получить кадр с камеры')
+        if self._last_taken:
+            self.dropped_count += captured.sequence - self._last_taken - 1
+        self._last_taken = captured.sequence
+        return captured
+
+
 class CameraService(Initializable):
-    def __init__(self, camera_id: int = settings.CAMERA_ID, auto_set=True):
+    def __init__(self, camera_id: int = settings.CAMERA_ID, auto_set=True, threaded_capture: bool = None,
+                 sensor_space: bool = None, realtime: bool = True, loop: bool = False):
         super().__init__(initialized=True)
+        if sensor_space is None:
+            sensor_space = bool(settings.SENSOR_SPACE_TRACKING)
+        # кадры отдаются как есть, поворот и отражение применяет потребитель через orientation
+        self.sensor_space = sensor_space
         self._frame_rotate_degree = private_settings.ROTATION_ANGLE
         self._frame_flip_side = private_settings.FLIP_SIDE
+        self._orientation = None
+        self._camera = None
+        self._grabber = None
+        self._sequence = 0
+        if threaded_capture is None:
+            threaded_capture = bool(settings.THREADED_CAPTURE)
         if auto_set:
-            self.set_source(camera_id)
+            # realtime и loop применяются, только если camera_id - путь к записанному источнику кадров
+            self.set_source(camera_id, realtime, loop)
+            if threaded_capture and self.initialized:
+                self.start_capture()
 
     def try_set_camera(self, camera_id):
         self._camera = cv2.VideoCapture(camera_id)
@@ -32,7 +231,24 @@ class CameraService(Initializable):
         self._camera.set(cv2.CAP_PROP_BUFFERSIZE, 0)
         return self._camera.isOpened()
 
-    def set_source(self, source):
+    def try_set_frame_source(self, source, realtime: bool = True, loop: bool = False):
+        try:
+            if not isinstance(source, FrameSource):
+                source = open_frame_source(source, realtime=realtime, loop=loop)
+        except Exception as e:
+            logger.exception(e)
+            return False
+        self._camera = source
+        return source.isOpened()
+
+    def set_source(self, source, realtime: bool = True, loop: bool = False):
+        if isinstance(source, (str, Path, FrameSource)):
+            if not self.try_set_frame_source(source, realtime, loop):
+                self.init_error()
+                view_output.show_error(f'Не удалось открыть источник кадров {source}. '
+                                       f'Программа продолжит работать без камеры.')
+                self._camera = CameraStub()
+            return
         if not self.try_set_camera(source):
             if not self.try_set_camera(DEFAULT_CAMERA_ID):
                 self.init_error()
@@ -43,11 +259,46 @@ class CameraService(Initializable):
                 )
                 self._camera = CameraStub()
 
+    def start_capture(self, ring_size: int = CAPTURE_RING_SIZE):
+        if self._grabber is not None:
+            return
+        logger.debug('threaded capture started')
+        self._grabber = FrameGrabber(self._camera, ring_size)
+
+    def use_grabber(self, grabber):
+        # например, CaptureProcess, который захватывает кадры в отдельном процессе
+        self.stop_capture()
+        self._grabber = grabber
+
+    def stop_capture(self):
+        if self._grabber is None:
+            return
+        self._grabber.stop_thread()
+        logger.debug(f'threaded capture stopped, {self._grabber.dropped_count} stale frames dropped')
+        self._grabber = None
+
+    @property
+    def source_exhausted(self):
+        return getattr(self._camera, 'exhausted', False)
+
+    @property
+    def threaded(self):
+        return self._grabber is not None
+
     def set_frame_rotate(self, degree):
         self._frame_rotate_degree = degree
+        self._orientation = None
 
     def set_frame_flip(self, side):
         self._frame_flip_side = side
+        self._orientation = None
+
+    @property
+    def orientation(self) -> FrameOrientation:
+        # пересоздаётся только после смены поворота или отражения
+        if self._orientation is None:
+            self._orientation = FrameOrientation(self._frame_rotate_degree, self._frame_flip_side)
+        return self._orientation
 
     def rotate_frame(self, frame):
         degree = self._frame_rotate_degree
@@ -63,16 +314,31 @@ class CameraService(Initializable):
         else:
             return cv2.flip(frame, side)
 
-    def extract_frame(self):
+    def _read_frame(self):
         _, frame = self._camera.read()
+        timestamp = perf_counter()
         if frame is None:
             raise NoneFrameException('Не удалось получить кадр с камеры')
-        rotated = self.rotate_frame(frame)
-        flipped = self.flip_frame(rotated)
+        self._sequence += 1
+        return CapturedFrame(frame, self._sequence, timestamp)
+
+    def extract_captured_frame(self) -> CapturedFrame:
+        if self._grabber is not None:
+            captured = self._grabber.latest_frame(self._sequence)
+            self._sequence = captured.sequence
+        else:
+            captured = self._read_frame()
+        if self.sensor_space:
+            return captured
+        oriented = self.orientation.apply(captured.image)
         # TODO: код ниже возможно мёртвый
-        if flipped is None:
+        if oriented is None:
             raise NoneFrameException('extracted frame is None after transformations')
-        return flipped
+        captured.image = oriented
+        return captured
+
+    def extract_frame(self):
+        return self.extract_captured_frame().image
 
 
 class CameraStub:
@@ -83,5 +349,5 @@ class CameraStub:
     def set(self, param1, param2):
         pass
 
-    def read(self):
+    def read(self, image=None):
         return None, self._image
@@ -1,25 +1,38 @@
 import sys
+from threading import Lock
 from time import time, sleep
 
+import numpy as np
+
 from eye_tracker.common.coordinates import Point
+from eye_tracker.common.instrumentation import (
+    profiler, ITERATION, CAMERA_READ, CHANGE_DETECTION, TRACKER_UPDATE, AREA_MATH, DRAWING, IMAGE_CONVERSION
+)
 from eye_tracker.common.logger import logger
 from eye_tracker.common.program import exit_program
 from eye_tracker.common.settings import settings, OBJECT, AREA, private_settings, MAX_LASER_RANGE
 from eye_tracker.common.thread_helpers import ThreadLoopable, MutableValue
 from eye_tracker.model.area_controller import AreaController
 from eye_tracker.model.camera_extractor import CameraService
-from eye_tracker.model.frame_processing import Tracker, CropZoomer
+from eye_tracker.model.frame_processing import Tracker, TrackerPool, CropZoomer, ChangeDetector, FrameContext
 from eye_tracker.model.move_controller import MoveController
+from eye_tracker.model.process_pipeline import create_process_camera, LaserProcess
 from eye_tracker.model.other_services import SelectingService, StateMachine, OnScreenService, \
     NoiseThresholdCalibrator, CoordinateSystemCalibrator
 from eye_tracker.view import view_output
 from eye_tracker.view.drawing import Processor
-from eye_tracker.view.view_model import ViewModel
+from eye_tracker.view.view_model import ViewModel, ADD_OBJECT_MENU_NAME
 
 
 # WARNING: Пробовал увеличивать количество потоков в программе до 4-х (+ экстрактор + трекер в своих потоках)
 #  Итог: это только ухудшило производительность, так что больше 2-х потоков смысла иметь нет
 #  И запускать из цикла отрисовки вьюхи тоже смысла нет, т.к. это асинхронный цикл и будет всё тормозить
+#  Потоки делят один GIL, поэтому захват кадров и обмен с лазером можно вынести в процессы настройкой PROCESS_PIPELINE
+#  Отрисовка всё же идёт в своём потоке DisplayRenderer: он работает с частотой FPS_VIEWED, а не на каждом кадре
+
+STATS_LINE_HEIGHT = 16
+STATS_FONT_SCALE = 0.4
+VELOCITY_PROBE_SEC = 0.05  # по какому отрезку траектории фильтра оценивается скорость объекта для лазера
 
 
 class ErrorHandler:
@@ -64,6 +77,87 @@ class ErrorHandler:
         return wrapper
 
 
+class DisplayRenderer(ThreadLoopable):
+    # С частотой FPS_VIEWED рисует обработанный кадр с рамками трекеров на момент этого кадра,
+    # поэтому итерация трекинга не тратит время на рисование и преобразование изображения для окна.
+    # Буферы камеры переиспользуются следующим захватом, поэтому кадр копируется в буфер отрисовки, но только
+    # когда отрисовщик забрал предыдущий, так что копий не больше, чем отрисовок. Показанный кадр отстаёт
+    # от последнего обработанного не больше чем на интервал отрисовки.
+    # Буфера два: кадр, который сейчас рисуется, и следующий.
+    # Нарисованный кадр остаётся в своём буфере и перерисовывается, если без нового кадра изменилась разметка
+    SLOTS = 2
+    NO_FRAME = -1
+
+    def __init__(self, model, view_model: ViewModel, error_handler: ErrorHandler, run_immediately: bool = True):
+        self._model = model
+        self._view_model = view_model
+        self.render = error_handler.handle_exceptions(self.render)  # manual decoration
+        self.interval = MutableValue(1 / settings.FPS_VIEWED)
+        self._buffers = [None] * DisplayRenderer.SLOTS
+        self._frames = [None] * DisplayRenderer.SLOTS  # (FrameContext, рамки трекеров) по буферам
+        self._latest = DisplayRenderer.NO_FRAME
+        self._rendering = DisplayRenderer.NO_FRAME
+        self._lock = Lock()
+        self._thread_loop = None
+        super().__init__(self.render, self.interval, run_immediately)
+
+    def publish(self, context: FrameContext, overlays: dict):
+        with self._lock:
+            if self._latest != DisplayRenderer.NO_FRAME:
+                return
+            index = next(i for i in range(DisplayRenderer.SLOTS) if i != self._rendering)
+        raw = context.raw
+        buffer = self._buffers[index]
+        if buffer is None or buffer.shape != raw.shape:
+            buffer = self._buffers[index] = np.empty_like(raw)
+        np.copyto(buffer, raw)
+        self._frames[index] = (FrameContext(buffer, context.timestamp, context.orientation), overlays)
+        with self._lock:
+            self._latest = index
+
+    def _take_latest(self):
+        with self._lock:
+            if self._latest == DisplayRenderer.NO_FRAME:
+                return False
+            self._rendering, self._latest = self._latest, DisplayRenderer.NO_FRAME
+            return True
+
+    def render(self):
+        dirty = Processor.take_display_dirty()
+        if not self._take_latest() and not dirty:
+            return
+        if self._rendering == DisplayRenderer.NO_FRAME:
+            return
+        self._render(*self._frames[self._rendering])
+
+    def _render(self, context: FrameContext, overlays: dict):
+        model = self._model
+        with profiler.stage(DRAWING):
+            # на копии, т.к. тот же кадр перерисовывается при изменении разметки
+            frame = context.display.copy()
+            if model.trackers.in_progress:
+                frame = Processor.draw_text(frame, f'fps: {round(model.fps, 1)}', Point(8, 16), 0.5)
+            frame = model.screen.common_processing(frame, overlays)
+            if model.crop_zoomer.can_crop():
+                frame = model.crop_zoomer.crop_zoom_frame(frame)
+            if settings.STATS_OVERLAY:
+                frame = self._draw_stats_overlay(frame)
+        with profiler.stage(IMAGE_CONVERSION):
+            processed_image = model.screen.prepare_image(frame)
+        self._view_model.on_image_ready(processed_image)
+        model.current_frame = frame
+
+    @staticmethod
+    def _draw_stats_overlay(frame):
+        for line_number, line in enumerate(profiler.overlay_lines(), start=2):
+            frame = Processor.draw_text(frame, line, Point(8, STATS_LINE_HEIGHT * line_number), STATS_FONT_SCALE)
+        return frame
+
+    def stop_thread(self):
+        if self._thread_loop is not None:
+            super().stop_thread()
+
+
 class Orchestrator(ThreadLoopable):
 
     def __init__(self, view_model: ViewModel, run_immediately: bool = True, area: tuple = None, debug_on=False,
@@ -72,25 +166,33 @@ class Orchestrator(ThreadLoopable):
         self._error_handler = ErrorHandler(view_model, self)
         self._processing_loop = self._error_handler.handle_exceptions(self._processing_loop)  # manual decoration
 
+        if settings.PROCESS_PIPELINE:
+            camera = camera or create_process_camera(settings.CAMERA_ID)
+            laser = laser or LaserProcess(self._on_laser_error, debug_on=debug_on)
         self.camera = camera or CameraService(settings.CAMERA_ID)
         self.area_controller = AreaController(min_xy=-MAX_LASER_RANGE,
                                               max_xy=MAX_LASER_RANGE)
         self.tracker = Tracker(settings.MEAN_COORDINATES_FRAME_COUNT)
+        self.trackers = TrackerPool(self.tracker)
         self.state_control = StateMachine(self._view_model)
         self.screen = OnScreenService(self)
         self.selecting = SelectingService(self._on_area_selected, self._on_object_selected, self, self.screen,
                                           self._view_model)
         self.laser = laser or MoveController(self._on_laser_error, debug_on=debug_on)
         self.crop_zoomer = CropZoomer(self)
+        self.change_detector = ChangeDetector()
+        self.renderer = DisplayRenderer(self, self._view_model, ErrorHandler(view_model, self), run_immediately=False)
 
         self.current_frame = None
+        self.captured_frame = None
+        self.raw_frame = None
 
         self.calibrators = {'noise threshold': NoiseThresholdCalibrator(self, self._view_model),
                             'coordinate system': CoordinateSystemCalibrator(self, self._view_model)}
 
         self.previous_area = None
-        self._throttle_to_fps_viewed = time()
         self.frames_count = 0
+        self.fps = 30
         self._frame_interval = MutableValue(1 / settings.FPS_VIEWED)
 
         self.rotate_image(private_settings.ROTATION_ANGLE, user_action=False)
@@ -101,54 +203,78 @@ class Orchestrator(ThreadLoopable):
         if self.laser.initialized:
             self.state_control.change_state('laser connected')
         self._processing_loop()
+        self.renderer.render()
         if area is not None:
             self.selecting.load_selected_area(area)
 
         self.calibrate_laser()
         self.second_timer = time()
-        self.fps = 30
 
         super().__init__(self._processing_loop, self._frame_interval, run_immediately)
 
     def _processing_loop(self):
-        frame = self.camera.extract_frame()
-        self.raw_frame = frame
-        if self.selecting.selecting_in_progress(OBJECT)\
-                or not Processor.frames_are_same(frame, self.current_frame):
-            if self.tracker.in_progress:
-                self._tracking(frame)
-                self.frames_count += 1
-
-                if time() - self._throttle_to_fps_viewed < 1 / settings.FPS_VIEWED:
-                    return
-
-                passed = time() - self.second_timer
-                if passed > 1:
-                    self.fps = self.frames_count / passed
-                    self.second_timer = time()
-                    self.fps_time = time()
-
-                    self.frames_count = 0
-
-                frame = Processor.draw_text(frame, f'fps: {round(self.fps, 1)}',
-                                            Point(8, 16), 0.5)
-
-            frame = self.screen.common_processing(frame)
-            if self.crop_zoomer.can_crop():
-               frame = self.crop_zoomer.crop_zoom_frame(frame)
-            processed_image = self.screen.prepare_image(frame)
-            self._view_model.on_image_ready(processed_image)
-        self.current_frame = frame
+        with profiler.stage(ITERATION):
+            self._process_frame()
+        profiler.dump_if_due()
+
+    def start_thread(self, loop_func, interval):
+        super().start_thread(loop_func, interval)
+        self.renderer.start_thread(self.renderer.render, self.renderer.interval)
+
+    def _process_frame(self):
+        with profiler.stage(CAMERA_READ):
+            self.captured_frame = self.camera.extract_captured_frame()
+        orientation = self.camera.orientation if self.camera.sensor_space else None
+        context = FrameContext(self.captured_frame.image, self.captured_frame.timestamp, orientation)
+        if self.raw_frame is None or self.selecting.any_selecting_in_progress():
+            # кадр камеры перезаписывается следующими, а выделенный объект берётся из него в потоке Tk
+            self.raw_frame = context.raw.copy()
+        with profiler.stage(CHANGE_DETECTION):
+            frame_changed = self._frame_changed(context)
+        if not frame_changed:
+            return
+        if self.trackers.in_progress:
+            self._tracking(context)
+            self._count_fps()
+        self.renderer.publish(context, self.trackers.overlays())
+
+    def _count_fps(self):
+        self.frames_count += 1
+        passed = time() - self.second_timer
+        if passed > 1:
+            self.fps = self.frames_count / passed
+            self.second_timer = time()
+            self.frames_count = 0
+
+    def _frame_changed(self, context: FrameContext):
+        tracking = self.trackers.in_progress
+        if self.trackers.lost or self.selecting.any_selecting_in_progress():
+            # выделение мышью и повторный поиск потерянного объекта требуют каждого кадра
+            return True
+        region = None
+        if tracking and settings.CHANGE_DETECTION_ROI:
+            region = self.trackers.tracked_region(context.tracking_scale)
+        elif tracking:
+            return True
+        return self.change_detector.changed(context, region)
 
     def _calibrating_in_progress(self):
         return any([i.in_progress for i in self.calibrators.values()])
 
-    def _tracking(self, frame):
-        center = self.tracker.get_tracked_position(frame)
+    def _tracking(self, context: FrameContext):
+        with profiler.stage(TRACKER_UPDATE):
+            self.trackers.update(context)
+        drivers = self.trackers.laser_drivers()
+        if not drivers:
+            # лазер остаётся на последней надёжной позиции, пока объект не найдётся снова
+            self._view_model.set_tip('Объект потерян из виду, выполняется повторный поиск')
+            return
         if self._calibrating_in_progress():
             return
-        object_relative_coords = self._move_to_relative_cords(center)
-        if self.tracker.in_progress:
+        object_relative_coords = self._move_to_relative_cords(self._mean_point(i.laser_target() for i in drivers),
+                                                              drivers[0].original_to_cropped_matrix,
+                                                              self._laser_velocity(drivers))
+        if self.trackers.in_progress:
         # проверка нужна из-за многопоточности, чтобы лучше была синхронизация и меньше шанс,
         # что координаты выведутся после прерывания процесса и собьют вывод подсказки
             if object_relative_coords is not None:
@@ -164,13 +290,29 @@ class Orchestrator(ThreadLoopable):
             self.crop_zoomer.set_zoom_area(self.previous_area)
         self._view_model.progress_bar_set_visibility(False)
 
-    def _move_to_relative_cords(self, center):
-        out_of_area = self.area_controller.point_is_out_of_area(center, beep_sound_allowed=True)
-        if out_of_area:
-            return
-
-        relative_coords = self.area_controller.calc_laser_coords(center)
-        self.laser.set_new_position(relative_coords)
+    @staticmethod
+    def _mean_point(points) -> Point:
+        points = list(points)
+        return sum(points[1:], points[0]) / len(points)
+
+    def _laser_velocity(self, drivers):
+        # упреждение считает MoveController в момент отправки команды, когда известно, сколько прошло с захвата кадра
+        if not settings.LASER_PREDICTION:
+            return None
+        with profiler.stage(AREA_MATH):
+            matrix = drivers[0].original_to_cropped_matrix
+            probes = [tracker.motion_probe(VELOCITY_PROBE_SEC) for tracker in drivers]
+            now, ahead = (self.area_controller.to_laser(self._mean_point(points), matrix)[0]
+                          for points in zip(*probes))
+            return (ahead - now) / VELOCITY_PROBE_SEC
+
+    def _move_to_relative_cords(self, center, source_matrix=None, velocity: Point = None):
+        with profiler.stage(AREA_MATH):
+            relative_coords, out_of_area = self.area_controller.to_laser(center, source_matrix,
+                                                                         beep_sound_allowed=True)
+            if out_of_area:
+                return
+        self.laser.set_new_position(relative_coords, capture_time=self.tracker.position_timestamp, velocity=velocity)
         return relative_coords
 
     def _on_laser_error(self):
@@ -190,27 +332,35 @@ class Orchestrator(ThreadLoopable):
         self.crop_zoomer.set_zoom_area(area)
         self.state_control.change_state('coordinate system calibrated')
 
-    def _on_object_selected(self, run_thread_after=None):
-        selected, object = self.selecting.check_selected_correctly(OBJECT)
+    def _on_object_selected(self, run_thread_after=None, name=OBJECT):
+        selected, object = self.selecting.check_selected_correctly(name)
         out_of_area = False
         if selected and not (self._calibrating_in_progress()):
             out_of_area = self.area_controller.point_is_out_of_area(object.center)
             if out_of_area:
                 view_output.show_error('Невозможно выделить объект за границами области слежения.')
-                self.screen.remove_selector(OBJECT)
+                self.screen.remove_selector(name)
 
         if not selected or out_of_area:
-            self._view_model.new_selection(OBJECT, reselect_while_calibrating=True,
+            self._view_model.new_selection(name, reselect_while_calibrating=True,
                                            additional_callback=run_thread_after)
             return
 
         cropped_width = int(self.current_frame.shape[1])
         cropped_height = int(self.current_frame.shape[0])
 
-        self.tracker.start_tracking(self.raw_frame, object.left_top, object.right_bottom, cropped_width, cropped_height)
-        self.screen.add_selector(self.tracker, OBJECT)
+        orientation = self.camera.orientation if self.camera.sensor_space else None
+        if name == OBJECT:
+            tracker = self.tracker
+        else:
+            tracker = Tracker(settings.MEAN_COORDINATES_FRAME_COUNT, label=name.replace(OBJECT, '').strip())
+            self.trackers.add(name, tracker)
+        tracker.start_tracking(self.raw_frame, object.left_top, object.right_bottom, cropped_width, cropped_height,
+                               orientation)
+        self.screen.add_selector(tracker, name)
         self._frame_interval.value = 1 / settings.FPS_PROCESSED
         self._view_model.set_menu_state('all', 'disabled')
+        self._view_model.set_menu_state(ADD_OBJECT_MENU_NAME, 'normal' if self.trackers.has_room else 'disabled')
         self.state_control.change_state('object selected')
         if run_thread_after is not None:
             run_thread_after().start()
@@ -249,14 +399,14 @@ class Orchestrator(ThreadLoopable):
         is_calibrating = self._calibrating_in_progress()
         is_selecting_in_progress = self.selecting.selecting_in_progress(AREA) or \
                                    self.selecting.selecting_in_progress(OBJECT)
-        is_active_process = is_selecting_in_progress or self.tracker.in_progress or is_calibrating
+        is_active_process = is_selecting_in_progress or self.trackers.in_progress or is_calibrating
         return is_active_process
 
     def cancel_active_process(self, need_confirm=True):
         is_calibrating = self._calibrating_in_progress()
         is_selecting_in_progress = self.selecting.selecting_in_progress(AREA) or \
                                    self.selecting.selecting_in_progress(OBJECT)
-        is_active_process = is_selecting_in_progress or self.tracker.in_progress or is_calibrating
+        is_active_process = is_selecting_in_progress or self.trackers.in_progress or is_calibrating
         if not is_active_process:
             return
         if need_confirm:
@@ -264,8 +414,7 @@ class Orchestrator(ThreadLoopable):
                 need_confirm = view_output.ask_confirmation('Прервать активный процесс?')
                 if not need_confirm:
                     return
-        if self.tracker.in_progress:
-            self.screen.remove_selector(OBJECT)
+        self.screen.remove_objects()
         self.selecting.cancel()
         cancel_all_calibrators = [i.cancel() for i in self.calibrators.values()]
         self._frame_interval.value = 1 / settings.FPS_VIEWED
@@ -316,4 +465,7 @@ class Orchestrator(ThreadLoopable):
         cancel_all_calibrators = [i.cancel() for i in self.calibrators.values()]
         self.laser.center_laser()
         self.laser.stop_thread()
+        self.renderer.stop_thread()
+        self.trackers.shutdown()
+        self.camera.stop_capture()
         super(Orchestrator, self).stop_thread()
@@ -1,110 +1,510 @@
 from collections import deque
-from itertools import chain, repeat
-
-import dlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from math import ceil, log
 
+import cv2
+import numpy as np
 from eye_tracker.common.abstractions import ProcessBased, RectBased, Drawable
 from eye_tracker.common.coordinates import Point, calc_center, get_translation_maxtix, translate_coordinates, \
-    get_translation_maxtix_between_resolutions
+    get_translation_maxtix_between_resolutions, translate_points, PointSet
 from eye_tracker.common.logger import logger
-from eye_tracker.common.settings import settings
+from eye_tracker.common.settings import settings, OBJECT
+from eye_tracker.model.camera_extractor import FrameOrientation
 from eye_tracker.model.selector import AreaSelector
+from eye_tracker.model.tracker_backends import TrackerBackend, create_tracker_backend
 from eye_tracker.view.drawing import Processor
 
+ROI_FALLBACK_CONFIDENCE = 0.35  # ниже этой уверенности объект считается потерянным в окне поиска
+REACQUIRE_GROWTH = 2  # во сколько раз расширяется окно повторного поиска после каждой неудачной попытки
+MOVING_AVERAGE_FILTER = 0
+KALMAN_FILTER = 1
+INITIAL_VELOCITY_VARIANCE = 1e6  # скорость объекта в момент выделения неизвестна
+MIN_FILTER_INTERVAL_SEC = 1e-4
+CHANGE_THUMBNAIL_WIDTH = 64
+CHANGE_PIXEL_TOLERANCE = 3  # такая разница яркости считается шумом камеры
+CHANGE_GRID = 2  # кадр делится на 2x2 части, изменение хотя бы в одной из них считается изменением кадра
+ROI_SAME_FRAMES_THRESHOLD = 0.97  # для области объекта порог строже, чем для всего кадра, иначе трекер отстаёт
+FIRST_SELECTED_POLICY = 0
+MOST_CONFIDENT_POLICY = 1
+CENTROID_POLICY = 2
+
+
+class FrameContext:
+    # Кадр и его уменьшенные копии для всех потребителей одной итерации обработки.
+    # Каждая копия строится только по первому запросу и не больше одного раза за кадр
+    # orientation задаётся, если raw - кадр камеры без поворота и отражения, тогда они применяются только к display
+    __slots__ = ['raw', 'timestamp', 'orientation', '_tracking', '_display', '_thumbnail']
+
+    def __init__(self, raw, timestamp: float = None, orientation: FrameOrientation = None):
+        self.raw = raw
+        self.timestamp = timestamp
+        self.orientation = orientation
+        self._tracking = None
+        self._display = None
+        self._thumbnail = None
+
+    @property
+    def tracking(self):
+        if self._tracking is None:
+            self._tracking = Processor.resize_frame_relative(self.raw, settings.DOWNSCALE_FACTOR)
+        return self._tracking
+
+    @property
+    def tracking_scale(self):
+        return self.tracking.shape[1] / self.raw.shape[1], self.tracking.shape[0] / self.raw.shape[0]
+
+    @property
+    def display(self):
+        if self._display is None:
+            display = Processor.resize_to_minimum(self.raw)
+            if self.orientation is not None:
+                # поворачивается уже уменьшенный кадр, это дешевле, чем поворот кадра в полном разрешении
+                display = self.orientation.apply(display)
+            self._display = display
+        return self._display
+
+    @property
+    def thumbnail(self):
+        if self._thumbnail is None:
+            # строится из уменьшенного для трекера кадра, а не из исходного
+            tracking = self.tracking
+            height, width = tracking.shape[:2]
+            size = (CHANGE_THUMBNAIL_WIDTH, max(int(height * CHANGE_THUMBNAIL_WIDTH / width), 1))
+            thumbnail = cv2.resize(tracking, size, interpolation=cv2.INTER_AREA)
+            self._thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY) if thumbnail.ndim == 3 else thumbnail
+        return self._thumbnail
+
 
 class Tracker(RectBased, Drawable, ProcessBased):
-    def __init__(self, mean_count=settings.MEAN_COORDINATES_FRAME_COUNT):
+    def __init__(self, mean_count=settings.MEAN_COORDINATES_FRAME_COUNT, backend: TrackerBackend = None,
+                 label: str = None):
         ProcessBased.__init__(self)
+        self.label = label  # подпись рамки, чтобы различать объекты на экране
         self._mean_count = mean_count
-        self.tracker = dlib.correlation_tracker()
-        self._denoisers: list[Denoiser] = []
-        self._object_length_xy = None
+        self.tracker = backend or create_tracker_backend(settings.TRACKER_BACKEND)
+        self.confidence = 0.0
+        self._filter = None
+        self._half_length_xy = None
         self._center = None
+        self._source_center = None
+        self.position_timestamp = None  # время захвата кадра, по которому получена текущая позиция
+        self._tracked_rect = None  # (left, top, right, bottom) в координатах исходного кадра
+        self._search_size = None
+        self._full_frame_search = True
+        self.lost = False
+        self._reference = None  # уменьшенный образец объекта из первого кадра для повторного захвата
+        self._reacquire_attempt = 0
 
     @property
     def left_top(self):
-        return self._center - self._object_length_xy // 2
+        return self._center - self._half_length_xy
 
     @property
     def right_bottom(self):
-        return self._center + self._object_length_xy // 2
+        return self._center + self._half_length_xy
 
     @property
     def center(self):
         return self._center
 
+    @staticmethod
+    def _rect_center(rect) -> Point:
+        left, top, right, bottom = rect
+        return Point((left + right) / 2, (top + bottom) / 2)
+
     def update_center(self):
-        left_cur_pos = Point(int(self._denoisers[0].get()), int(self._denoisers[1].get()))
-        left_cur_pos = translate_coordinates(self.original_to_cropped_matrix, left_cur_pos)
-        right_cur_pos = Point(int(self._denoisers[2].get()), int(self._denoisers[3].get()))
-        right_cur_pos = translate_coordinates(self.original_to_cropped_matrix, right_cur_pos)
-        center = calc_center(left_cur_pos, right_cur_pos)
-        if abs(self.center - center) >= settings.NOISE_THRESHOLD_RANGE:
+        # центр переводится в координаты экрана один раз, а не каждым углом рамки по отдельности
+        source_center = self._rect_center(self._filter.get())
+        center = translate_coordinates(self.original_to_cropped_matrix, source_center)
+        if center.moved_at_least(self.center, settings.NOISE_THRESHOLD_RANGE):
             self._center = center
+            self._source_center = source_center
+
+    def laser_target(self) -> Point:
+        return self._source_center
+
+    def motion_probe(self, probe: float):
+        # центр объекта по фильтру сейчас и через probe секунд, чтобы оценить скорость уже в координатах лазера
+        return self._rect_center(self._filter.predict(0)), self._rect_center(self._filter.predict(probe))
+
+    def _create_filter(self, rect, timestamp: float = None):
+        if settings.MOTION_FILTER == KALMAN_FILTER:
+            return MotionFilter(rect, timestamp)
+        return Denoiser(rect, mean_count=self._mean_count)
 
     def start_tracking(self, frame, left_top: Point, right_bottom: Point,
-                       cropped_width: int, cropped_heigth: int):
+                       cropped_width: int, cropped_heigth: int, orientation: FrameOrientation = None):
         logger.debug('tracking started')
         original_width = int(frame.shape[1])
         original_height = int(frame.shape[0])
 
-        self.cropped_to_original_matrix = get_translation_maxtix_between_resolutions(cropped_width, cropped_heigth,
-                                                                                     original_width, original_height)
-        self.original_to_cropped_matrix = get_translation_maxtix_between_resolutions(original_width, original_height,
-                                                                                     cropped_width, cropped_heigth)
+        if orientation is None:
+            self.cropped_to_original_matrix = get_translation_maxtix_between_resolutions(
+                cropped_width, cropped_heigth, original_width, original_height)
+            self.original_to_cropped_matrix = get_translation_maxtix_between_resolutions(
+                original_width, original_height, cropped_width, cropped_heigth)
+        else:
+            # кадр камеры не повёрнут, поворот с отражением и масштаб экрана переводят в одну матрицу только точки
+            oriented_width, oriented_height = orientation.output_size(original_width, original_height)
+            self.original_to_cropped_matrix = get_translation_maxtix_between_resolutions(
+                oriented_width, oriented_height, cropped_width, cropped_heigth) \
+                @ orientation.matrix(original_width, original_height)
+            self.cropped_to_original_matrix = np.linalg.inv(self.original_to_cropped_matrix)
         # needs to be executed before translating coordinates
-        self._object_length_xy = Point(abs(left_top.x - right_bottom.x),
-                                       abs(left_top.y - right_bottom.y))
+        # половина размера считается один раз, углы рамки на каждом кадре получаются одной операцией
+        self._half_length_xy = Point(abs(left_top.x - right_bottom.x) // 2, abs(left_top.y - right_bottom.y) // 2)
+        self._center = calc_center(left_top, right_bottom)
 
-        left_top = translate_coordinates(self.cropped_to_original_matrix, left_top)
-        right_bottom = translate_coordinates(self.cropped_to_original_matrix, right_bottom)
+        corners = translate_points(self.cropped_to_original_matrix, PointSet((left_top, right_bottom))).astype(int)
+        # после отражения углы рамки могут поменяться местами
+        left, top = corners.min(axis=0).tolist()
+        right, bottom = corners.max(axis=0).tolist()
 
-        frame = Processor.resize_frame_relative(frame, settings.DOWNSCALE_FACTOR)
+        self._tracked_rect = (left, top, right, bottom)
+        self._source_center = self._rect_center(self._tracked_rect)
+        self._filter = self._create_filter(self._tracked_rect)
+        search_factor = settings.ROI_SEARCH_FACTOR
+        self._search_size = (int((right - left) * search_factor), int((bottom - top) * search_factor))
+        self.lost = False
 
+        self._reference = None
+        if min(right - left, bottom - top) * settings.DOWNSCALE_FACTOR >= 1:
+            self._reference = Processor.resize_frame_relative(frame[top:bottom, left:right],
+                                                              settings.DOWNSCALE_FACTOR)
+        self._restart_backend(frame)
+        self.start()
 
+    def _restart_backend(self, frame, downscaled=None):
+        self._full_frame_search = not (settings.ROI_TRACKING and self.tracker.supports_guess)
+        self.confidence = 1.0
+        window, offset, scale = self._tracking_window(frame, downscaled)
+        self.tracker.start(window, self._to_window(self._tracked_rect, offset, scale))
 
-        scaled_left_top, scaled_right_bottom = \
-            (left_top * settings.DOWNSCALE_FACTOR).to_int(), \
-            (right_bottom * settings.DOWNSCALE_FACTOR).to_int()
+    def _search_rect(self, frame_shape, size=None):
+        # окно поиска вокруг последней позиции, у края кадра окно сдвигается внутрь, а не обрезается
+        height, width = frame_shape[:2]
+        size = size or self._search_size
+        window_width, window_height = min(width, int(size[0])), min(height, int(size[1]))
+        left, top, right, bottom = self._tracked_rect
+        window_left = int(min(max((left + right - window_width) / 2, 0), width - window_width))
+        window_top = int(min(max((top + bottom - window_height) / 2, 0), height - window_height))
+        return window_left, window_top, window_width, window_height
 
-        for coord in chain(left_top, right_bottom):
-            self._denoisers.append(Denoiser(coord, mean_count=self._mean_count))
+    def _search_window(self, frame, size=None, downscaled=None):
+        left, top, width, height = self._search_rect(frame.shape, size)
+        if downscaled is None:
+            window = frame[top:top + height, left:left + width]
+            scaled = Processor.resize_frame_relative(window, settings.DOWNSCALE_FACTOR)
+            # реальный масштаб после округления размеров, чтобы координаты окна и кадра точно совпадали
+            scale = (scaled.shape[1] / window.shape[1], scaled.shape[0] / window.shape[0])
+            return scaled, (left, top), scale
+        # окно вырезается из общего уменьшенного кадра без повторного resize
+        scale = (downscaled.shape[1] / frame.shape[1], downscaled.shape[0] / frame.shape[0])
+        left, top = int(left * scale[0]), int(top * scale[1])
+        width, height = int(width * scale[0]), int(height * scale[1])
+        return downscaled[top:top + height, left:left + width], (left / scale[0], top / scale[1]), scale
 
-        self._center = calc_center(scaled_left_top, scaled_right_bottom)
-        self.tracker.start_track(frame, dlib.rectangle(*scaled_left_top, *scaled_right_bottom))
-        self.start()
+    def _tracking_window(self, frame, downscaled=None):
+        if not self._full_frame_search:
+            return self._search_window(frame, downscaled=downscaled)
+        if downscaled is None:
+            downscaled = Processor.resize_frame_relative(frame, settings.DOWNSCALE_FACTOR)
+        return downscaled, (0, 0), (downscaled.shape[1] / frame.shape[1], downscaled.shape[0] / frame.shape[0])
 
-    def get_tracked_position(self, frame) -> Point:
-        frame = Processor.resize_frame_relative(frame, settings.DOWNSCALE_FACTOR)
-        self.tracker.update(frame)
-        rect = self.tracker.get_position()
-        for i, coord in enumerate(map(int, (rect.left() / settings.DOWNSCALE_FACTOR,
-                                            rect.top() / settings.DOWNSCALE_FACTOR,
-                                            rect.right() / settings.DOWNSCALE_FACTOR,
-                                            rect.bottom() / settings.DOWNSCALE_FACTOR
-                                            ))):
-            self._denoisers[i].add(coord)
+    def tracked_region(self, scale):
+        left, top, right, bottom = self._tracked_rect
+        return (max(int(left * scale[0]), 0), max(int(top * scale[1]), 0),
+                int(right * scale[0]) + 1, int(bottom * scale[1]) + 1)
+
+    @staticmethod
+    def _to_window(rect, offset, scale):
+        left, top, right, bottom = rect
+        return (int((left - offset[0]) * scale[0]), int((top - offset[1]) * scale[1]),
+                int((right - offset[0]) * scale[0]), int((bottom - offset[1]) * scale[1]))
+
+    @staticmethod
+    def _from_window(rect, offset, scale):
+        left, top, right, bottom = rect
+        return (left / scale[0] + offset[0], top / scale[1] + offset[1],
+                right / scale[0] + offset[0], bottom / scale[1] + offset[1])
+
+    def _reacquire(self, frame, downscaled=None) -> bool:
+        # поиск исходного образца объекта в расширяющемся окне вокруг места потери, в итоге по всему кадру
+        if self._reference is None:
+            return False
+        growth = REACQUIRE_GROWTH ** min(self._reacquire_attempt, self._covering_attempt(frame.shape))
+        self._reacquire_attempt += 1
+        size = (self._search_size[0] * growth, self._search_size[1] * growth)
+        scaled, offset, scale = self._search_window(frame, size, downscaled)
+        reference_height, reference_width = self._reference.shape[:2]
+        if scaled.shape[0] < reference_height or scaled.shape[1] < reference_width:
+            return False
+        _, score, _, (left, top) = cv2.minMaxLoc(cv2.matchTemplate(scaled, self._reference, cv2.TM_CCOEFF_NORMED))
+        if score < settings.REACQUIRE_THRESHOLD:
+            return False
+        self._tracked_rect = self._from_window((left, top, left + reference_width, top + reference_height),
+                                               offset, scale)
+        logger.debug(f'object reacquired after {self._reacquire_attempt} attempts with score {score:.2f}')
+        self.lost = False
+        # объект мог заметно сместиться, сглаживать переход от старой позиции к новой незачем
+        self._filter = self._create_filter(self._tracked_rect, self.position_timestamp)
+        self._restart_backend(frame, downscaled)
+        return True
+
+    def _covering_attempt(self, frame_shape):
+        # с этой попытки окно покрывает весь кадр, расширять его дальше незачем
+        height, width = frame_shape[:2]
+        ratio = max(width / max(self._search_size[0], 1), height / max(self._search_size[1], 1))
+        return max(ceil(log(ratio, REACQUIRE_GROWTH)), 0)
+
+    def _lose(self):
+        logger.debug(f'object lost, tracking confidence {self.confidence:.2f}')
+        self.lost = True
+        self._reacquire_attempt = 0
+
+    def get_tracked_position(self, frame, capture_time: float = None, downscaled=None) -> Point:
+        self.position_timestamp = capture_time
+        if self.lost and not self._reacquire(frame, downscaled):
+            return self.center
+        window, offset, scale = self._tracking_window(frame, downscaled)
+        guess = None
+        if self.tracker.supports_guess:
+            # позиция передаётся явно, т.к. окно поиска между кадрами смещается вместе с объектом
+            guess = self._to_window(self._tracked_rect, offset, scale)
+        self.confidence = self.tracker.update(window, guess)
+        if self.confidence < settings.TRACKING_LOST_CONFIDENCE:
+            # позиция замораживается, иначе трекер уводит лазер вслед за тем, что заслонило объект
+            self._lose()
+            return self.center
+        self._tracked_rect = self._from_window(self.tracker.get_position(), offset, scale)
+        if settings.ROI_TRACKING and self.tracker.supports_guess:
+            # при потере объекта в окне следующий кадр обрабатывается целиком, пока объект не найдётся
+            self._full_frame_search = self.confidence < ROI_FALLBACK_CONFIDENCE
+        self._filter.add(self._tracked_rect, capture_time)
         self.update_center()
         return self.center
 
+    def overlay(self):
+        return TrackerOverlay(self._center, self._half_length_xy, self.label)
+
+    def draw_on_frame(self, frame):
+        return self.overlay().draw_on_frame(frame)
+
+
+class TrackerOverlay(RectBased, Drawable):
+    # Неизменяемая рамка трекера на момент кадра: отрисовка в своём потоке рисует её на том же кадре
+    def __init__(self, center: Point, half_length_xy: Point, label: str = None):
+        self._center = center
+        self._half_length_xy = half_length_xy
+        self.label = label
+
+    @property
+    def left_top(self):
+        return self._center - self._half_length_xy
+
+    @property
+    def right_bottom(self):
+        return self._center + self._half_length_xy
+
+    @property
+    def center(self):
+        return self._center
+
     def draw_on_frame(self, frame):
         frame = Processor.draw_rectangle(frame, self.left_top, self.right_bottom)
+        if self.label is not None:
+            frame = Processor.draw_text(frame, self.label, self.left_top)
         return Processor.draw_circle(frame, self.center)
 
 
+class TrackerPool:
+    # Все объекты слежения по именам выделений в порядке выделения. Основной объект (OBJECT) есть всегда.
+    # Трекеры обновляются по одному общему уменьшенному кадру параллельно: OpenCV и dlib
+    # отпускают GIL на время сопоставления окна поиска, поэтому потоки действительно работают одновременно
+    def __init__(self, primary: Tracker):
+        self._trackers = {OBJECT: primary}
+        self._executor = None
+
+    def __getitem__(self, name) -> Tracker:
+        return self._trackers[name]
+
+    def __contains__(self, name):
+        return name in self._trackers
+
+    def add(self, name, tracker: Tracker):
+        self._trackers[name] = tracker
+
+    def remove(self, name):
+        tracker = self._trackers.get(name)
+        if tracker is None:
+            return
+        tracker.cancel()
+        if name != OBJECT:
+            del self._trackers[name]
+
+    def next_name(self):
+        number = 2
+        while f'{OBJECT} {number}' in self._trackers:
+            number += 1
+        return f'{OBJECT} {number}'
+
+    @property
+    def names(self):
+        return [name for name, tracker in self._trackers.items() if tracker.in_progress]
+
+    @property
+    def active(self):
+        return [tracker for tracker in self._trackers.values() if tracker.in_progress]
+
+    def overlays(self):
+        # рамки по именам выделений на момент текущего кадра
+        return {name: tracker.overlay() for name, tracker in self._trackers.items() if tracker.in_progress}
+
+    @property
+    def in_progress(self):
+        return any(tracker.in_progress for tracker in self._trackers.values())
+
+    @property
+    def lost(self):
+        return any(tracker.lost for tracker in self.active)
+
+    @property
+    def has_room(self):
+        return len(self.active) < settings.MAX_TRACKED_OBJECTS
+
+    def tracked_region(self, scale):
+        # общая рамка всех объектов, изменение в ней значит, что хотя бы одному трекеру нужен новый кадр
+        regions = [tracker.tracked_region(scale) for tracker in self.active]
+        lefts, tops, rights, bottoms = zip(*regions)
+        return min(lefts), min(tops), max(rights), max(bottoms)
+
+    def update(self, context: FrameContext):
+        trackers = self.active
+        # уменьшенный кадр строится до раздачи потокам, иначе каждый поток построит свою копию
+        downscaled = context.tracking
+        if len(trackers) == 1 or settings.TRACKING_THREADS == 1:
+            for tracker in trackers:
+                tracker.get_tracked_position(context.raw, context.timestamp, downscaled)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(settings.TRACKING_THREADS, thread_name_prefix='tracker')
+        futures = [self._executor.submit(tracker.get_tracked_position, context.raw, context.timestamp, downscaled)
+                   for tracker in trackers]
+        for future in futures:
+            future.result()
+
+    def laser_drivers(self) -> list:
+        # объекты, по которым наводится лазер; пустой список - все потеряны и лазер остаётся на месте
+        found = [tracker for tracker in self.active if not tracker.lost]
+        if not found:
+            return []
+        if settings.LASER_TARGET_POLICY == MOST_CONFIDENT_POLICY:
+            return [max(found, key=lambda tracker: tracker.confidence)]
+        if settings.LASER_TARGET_POLICY == CENTROID_POLICY:
+            return found
+        # при потере первого объекта лазер переходит к следующему по порядку выделения
+        return found[:1]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class ChangeDetector:
+    # Сравнивает уменьшенные необработанные кадры, а не кадр с уже нарисованной поверх разметкой.
+    # Эталоном служит последний кадр, признанный изменившимся, поэтому медленные изменения тоже накапливаются
+    def __init__(self):
+        self._reference: FrameContext = None
+
+    @staticmethod
+    def _parts_are_same(one, another, threshold):
+        unchanged = cv2.absdiff(one, another) <= CHANGE_PIXEL_TOLERANCE
+        for rows in np.array_split(unchanged, CHANGE_GRID):
+            for part in np.array_split(rows, CHANGE_GRID, axis=1):
+                if part.size and part.mean() <= threshold:
+                    return False
+        return True
+
+    def _accept(self, context):
+        # уменьшенная копия строится сразу, т.к. буфер исходного кадра позже перезапишет поток захвата
+        context.tracking
+        self._reference = context
+        return True
+
+    def changed(self, context: FrameContext, region=None) -> bool:
+        reference = self._reference
+        if reference is None or reference.tracking.shape != context.tracking.shape:
+            return self._accept(context)
+        if region is not None:
+            left, top, right, bottom = region
+            same = self._parts_are_same(reference.tracking[top:bottom, left:right],
+                                        context.tracking[top:bottom, left:right], ROI_SAME_FRAMES_THRESHOLD)
+        else:
+            same = self._parts_are_same(reference.thumbnail, context.thumbnail, settings.SAME_FRAMES_THRESHOLD)
+        return False if same else self._accept(context)
+
+
 class Denoiser:
-    def __init__(self, init_value: float, mean_count: int):
+    # Скользящее среднее, значения могут быть как числами, так и массивами координат
+    def __init__(self, init_value, mean_count: int):
+        init_value = np.array(init_value, dtype=np.float64)
         self._count = mean_count
         self._buffer = deque(repeat(init_value, mean_count))
-        self._sum = sum(self._buffer)
+        self._sum = init_value * mean_count
 
-    def add(self, elem):
+    def add(self, elem, timestamp: float = None):
+        elem = np.array(elem, dtype=np.float64)
         self._sum += elem - self._buffer.popleft()
         self._buffer.append(elem)
 
     def get(self):
         return self._sum / self._count
 
+    def predict(self, lead: float):
+        return self.get()
+
+
+class MotionFilter:
+    # Фильтр Калмана с моделью постоянной скорости сразу для всех координат рамки объекта.
+    # Координаты измеряются одновременно и с одинаковым шумом, поэтому матрица ковариации 2x2 у них общая
+    def __init__(self, init_value, timestamp: float = None,
+                 process_noise: float = None, measurement_noise: float = None):
+        self._process_noise = process_noise or settings.KALMAN_PROCESS_NOISE
+        self._measurement_noise = measurement_noise or settings.KALMAN_MEASUREMENT_NOISE
+        self._position = np.array(init_value, dtype=np.float64)
+        self._velocity = np.zeros_like(self._position)
+        self._covariance = np.diag([self._measurement_noise, INITIAL_VELOCITY_VARIANCE])
+        self._timestamp = timestamp
+
+    def _interval(self, timestamp):
+        if timestamp is None or self._timestamp is None:
+            interval = 1 / settings.FPS_PROCESSED
+        else:
+            interval = max(timestamp - self._timestamp, MIN_FILTER_INTERVAL_SEC)
+        self._timestamp = timestamp
+        return interval
+
+    def add(self, elem, timestamp: float = None):
+        dt = self._interval(timestamp)
+        transition = np.array([[1.0, dt], [0.0, 1.0]])
+        noise = self._process_noise * np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+        covariance = transition @ self._covariance @ transition.T + noise
+        self._position += self._velocity * dt
+
+        gain = covariance[:, 0] / (covariance[0, 0] + self._measurement_noise)
+        innovation = np.asarray(elem, dtype=np.float64) - self._position
+        self._position += gain[0] * innovation
+        self._velocity += gain[1] * innovation
+        self._covariance = covariance - np.outer(gain, covariance[0])
+
+    def get(self):
+        return self._position
+
+    def predict(self, lead: float):
+        return self._position + self._velocity * lead
+
 class CropZoomer:
     def __init__(self, model):
         self.zoom_area = None
@@ -117,11 +517,11 @@ class CropZoomer:
 
     def set_zoom_area(self, area: AreaSelector):
         self.zoom_area = area.calculate_correct_square_points()
-        pts = self.zoom_area
-        zoom_points = [pts[0], Point(pts[1].x, pts[0].y), pts[1], Point(pts[0].x, pts[1].y)]
+        (left, top), (right, bottom) = self.zoom_area
+        zoom_points = PointSet(((left, top), (right, top), (right, bottom), (left, bottom)))
         height = self._model.current_frame.shape[0]
         width = self._model.current_frame.shape[1]
-        screen_points = [Point(0, 0), Point(width, 0), Point(width, height), Point(0, height)]
+        screen_points = PointSet(((0, 0), (width, 0), (width, height), (0, height)))
         self.translation_matrix = get_translation_maxtix(screen_points, zoom_points)
 
     def to_zoom_area_coordinates(self, point: Point):
@@ -0,0 +1,187 @@
+import struct
+from abc import ABC, abstractmethod
+from pathlib import Path
+from time import perf_counter, sleep
+
+import cv2
+import numpy as np
+
+from eye_tracker.common.logger import logger
+
+DEFAULT_SOURCE_FPS = 30.0
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+RAW_DUMP_SUFFIX = '.etraw'
+RAW_DUMP_MAGIC = b'ETRAW001'
+RAW_DUMP_HEADER = struct.Struct('<8sIIIf')  # magic, height, width, channels, fps
+
+
+class FrameSource(ABC):
+    # Источник кадров с интерфейсом cv2.VideoCapture, чтобы CameraService не отличал его от камеры.
+    # realtime=True выдаёт кадры с частотой записи, иначе так быстро, как их забирают
+    def __init__(self, fps: float = None, realtime: bool = True, loop: bool = False):
+        self.fps = fps or DEFAULT_SOURCE_FPS
+        self.realtime = realtime
+        self.loop = loop
+        self.exhausted = False
+        self.frames_read = 0
+        self._started = None
+
+    @abstractmethod
+    def _next_frame(self, image=None):
+        ...
+
+    @abstractmethod
+    def _rewind(self):
+        ...
+
+    def isOpened(self):
+        return True
+
+    def set(self, param1, param2):
+        pass
+
+    def get(self, param):
+        if param == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0
+
+    def release(self):
+        pass
+
+    def _pace(self):
+        now = perf_counter()
+        if self._started is None:
+            self._started = now
+        if not self.realtime:
+            return
+        due = self._started + self.frames_read / self.fps
+        if due > now:
+            sleep(due - now)
+
+    def read(self, image=None):
+        if self.exhausted:
+            return False, None
+        self._pace()
+        frame = self._next_frame(image)
+        if frame is None and self.loop and self.frames_read:
+            self._rewind()
+            frame = self._next_frame(image)
+        if frame is None:
+            self.exhausted = True
+            logger.debug(f'frame source exhausted after {self.frames_read} frames')
+            return False, None
+        self.frames_read += 1
+        return True, frame
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, fps: float = None, realtime: bool = True, loop: bool = False):
+        self._path = str(path)
+        self._video = cv2.VideoCapture(self._path)
+        super().__init__(fps or self._video.get(cv2.CAP_PROP_FPS), realtime, loop)
+
+    def isOpened(self):
+        return self._video.isOpened()
+
+    def _next_frame(self, image=None):
+        _, frame = self._video.read() if image is None else self._video.read(image)
+        return frame
+
+    def _rewind(self):
+        self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        self._video.release()
+
+
+class ImageSequenceSource(FrameSource):
+    def __init__(self, folder, fps: float = None, realtime: bool = True, loop: bool = False, preload: bool = False):
+        super().__init__(fps, realtime, loop)
+        self._files = sorted(p for p in Path(folder).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        self._position = 0
+        # предзагрузка убирает декодирование из замеров производительности
+        self._preloaded = [cv2.imread(str(p)) for p in self._files] if preload else None
+
+    def isOpened(self):
+        return len(self._files) > 0
+
+    def _next_frame(self, image=None):
+        if self._position >= len(self._files):
+            return None
+        if self._preloaded is not None:
+            frame = self._preloaded[self._position]
+            if image is not None and image.shape == frame.shape:
+                np.copyto(image, frame)
+                frame = image
+            else:
+                frame = frame.copy()
+        else:
+            frame = cv2.imread(str(self._files[self._position]))
+        self._position += 1
+        return frame
+
+    def _rewind(self):
+        self._position = 0
+
+
+class RawDumpSource(FrameSource):
+    # Несжатые кадры подряд после заголовка; файл отображается в память, поэтому кадры не декодируются
+    def __init__(self, path, fps: float = None, realtime: bool = True, loop: bool = False):
+        with open(path, 'rb') as file:
+            magic, height, width, channels, dump_fps = RAW_DUMP_HEADER.unpack(file.read(RAW_DUMP_HEADER.size))
+        if magic != RAW_DUMP_MAGIC:
+            raise ValueError(f'{path} is not a raw frame dump')
+        super().__init__(fps or dump_fps, realtime, loop)
+        self._frames = np.memmap(path, dtype=np.uint8, mode='r', offset=RAW_DUMP_HEADER.size)
+        self._frames = self._frames.reshape((-1, height, width, channels))
+        self._position = 0
+
+    def _next_frame(self, image=None):
+        if self._position >= len(self._frames):
+            return None
+        frame = self._frames[self._position]
+        self._position += 1
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return image
+        return np.array(frame)
+
+    def _rewind(self):
+        self._position = 0
+
+
+class RawDumpWriter:
+    def __init__(self, path, fps: float = DEFAULT_SOURCE_FPS):
+        self._path = path
+        self._fps = fps
+        self._file = None
+        self._shape = None
+
+    def write(self, frame):
+        if self._file is None:
+            self._shape = frame.shape
+            height, width, channels = frame.shape
+            self._file = open(self._path, 'wb')
+            self._file.write(RAW_DUMP_HEADER.pack(RAW_DUMP_MAGIC, height, width, channels, self._fps))
+        if frame.shape != self._shape:
+            raise ValueError(f'frame shape {frame.shape} differs from dump shape {self._shape}')
+        self._file.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+def open_frame_source(path, fps: float = None, realtime: bool = True, loop: bool = False) -> FrameSource:
+    path = Path(path)
+    if path.is_dir():
+        return ImageSequenceSource(path, fps, realtime, loop)
+    if path.suffix.lower() == RAW_DUMP_SUFFIX:
+        return RawDumpSource(path, fps, realtime, loop)
+    return VideoFileSource(path, fps, realtime, loop)
@@ -0,0 +1,110 @@
+import struct
+from binascii import crc_hqx
+
+from eye_tracker.common.coordinates import Point
+from eye_tracker.common.logger import logger
+
+# Команды от компьютера к контроллеру, одинаковые для текстового и двоичного протоколов.
+# 2 - калибровка, CALIBRATE_LASER_COMMAND в настройках
+COMMAND_MOVE = 1
+COMMAND_NEGOTIATE_BINARY = 3
+
+# Ответы контроллера
+READY = 1
+ERRORED = 2
+BINARY_ACCEPTED = 3
+ACKNOWLEDGED = 4  # только в двоичном протоколе, с номером принятой команды
+
+# Текстовый протокол: команда "x;y;command\n", ответы строками
+ASCII_REPLIES = ((b'ready', READY), (b'error', ERRORED), (b'binary', BINARY_ACCEPTED))
+LINE_END = b'\n'
+MAX_LINE_LENGTH = 64
+
+# Двоичный протокол: синхробайт, команда или ответ, номер команды, x, y (int16) и CRC-16/CCITT предыдущих байт.
+# 9 байт на команду вместо 8-14 символов текстом, а приём не зависит от разбиения на строки
+SYNC = 0xA5
+FRAME = struct.Struct('<BBBhhH')
+FRAME_BODY_SIZE = FRAME.size - struct.calcsize('<H')
+CRC_INITIAL = 0xFFFF
+SEQUENCE_MODULO = 256
+
+
+def frame_crc(data) -> int:
+    return crc_hqx(data, CRC_INITIAL)
+
+
+def encode_ascii(position: Point, command: int) -> bytes:
+    return f'{position.x};{position.y};{command}\n'.encode('ascii', 'ignore')
+
+
+def encode_binary(position: Point, command: int, sequence: int = 0) -> bytes:
+    frame = bytearray(FRAME.size)
+    FRAME.pack_into(frame, 0, SYNC, command, sequence % SEQUENCE_MODULO, int(position.x), int(position.y), 0)
+    struct.pack_into('<H', frame, FRAME_BODY_SIZE, frame_crc(memoryview(frame)[:FRAME_BODY_SIZE]))
+    return bytes(frame)
+
+
+class LaserProtocol:
+    # Кодирует команды и разбирает ответы контроллера по мере прихода байт: неполная строка или кадр
+    # остаются в буфере до следующего чтения, строки не создаются, ответы сравниваются прямо в буфере
+    def __init__(self):
+        self.binary = False
+        self.crc_errors = 0
+        self._buffer = bytearray()
+        self._sequence = 0
+
+    def negotiation(self) -> bytes:
+        # старые прошивки не отвечают на эту команду, и обмен остаётся текстовым
+        return encode_ascii(Point(0, 0), COMMAND_NEGOTIATE_BINARY)
+
+    def encode(self, position: Point, command: int = COMMAND_MOVE):
+        # возвращает байты команды и её номер, по которому контроллер подтверждает получение
+        self._sequence = (self._sequence + 1) % SEQUENCE_MODULO
+        if self.binary:
+            return encode_binary(position, command, self._sequence), self._sequence
+        return encode_ascii(position, command), self._sequence
+
+    def feed(self, data) -> list:
+        # список пар (ответ, номер команды); у текстовых ответов номера нет
+        self._buffer += data
+        replies = []
+        position = 0
+        while position < len(self._buffer):
+            if self.binary:
+                reply, position = self._parse_frame(position)
+            else:
+                reply, position = self._parse_line(position)
+            if reply is None:
+                break
+            if reply[0] is not None:
+                replies.append(reply)
+        del self._buffer[:position]
+        return replies
+
+    def _parse_line(self, position):
+        end = self._buffer.find(LINE_END, position)
+        if end < 0:
+            if len(self._buffer) - position > MAX_LINE_LENGTH:
+                # мусор без перевода строки не должен копиться в буфере
+                return (None, None), len(self._buffer)
+            return None, position
+        for text, reply in ASCII_REPLIES:
+            if self._buffer.find(text, position, end) >= 0:
+                if reply == BINARY_ACCEPTED:
+                    self.binary = True
+                    logger.debug('laser controller switched to the binary protocol')
+                return (reply, None), end + 1
+        return (None, None), end + 1
+
+    def _parse_frame(self, position):
+        start = self._buffer.find(SYNC, position)
+        if start < 0:
+            return (None, None), len(self._buffer)
+        if len(self._buffer) - start < FRAME.size:
+            return None, start
+        sync, reply, sequence, x, y, crc = FRAME.unpack_from(self._buffer, start)
+        if frame_crc(memoryview(self._buffer)[start:start + FRAME_BODY_SIZE]) != crc:
+            # синхробайт мог оказаться внутри данных, поиск кадра продолжается со следующего байта
+            self.crc_errors += 1
+            return (None, None), start + 1
+        return (reply, sequence), start + FRAME.size
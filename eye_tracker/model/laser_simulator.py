@@ -0,0 +1,220 @@
+from collections import deque
+from random import Random
+from threading import Condition
+from time import perf_counter
+
+from serial import Serial
+
+from eye_tracker.common.coordinates import Point
+from eye_tracker.common.settings import CALIBRATE_LASER_COMMAND, MAX_LASER_RANGE
+from eye_tracker.model.laser_protocol import COMMAND_MOVE, COMMAND_NEGOTIATE_BINARY, READY, ERRORED, \
+    ACKNOWLEDGED, SYNC, FRAME, FRAME_BODY_SIZE, LINE_END, MAX_LINE_LENGTH, encode_binary, frame_crc
+
+BITS_PER_BYTE = 10  # стартовый бит, 8 бит данных и стоповый бит
+DEFAULT_BAUD_RATE = 19200
+DEFAULT_SPEED = 20000  # единиц координат лазера в секунду по каждой оси
+SIMULATOR_TIMEOUT = 0.1
+ASCII_REPLIES = {READY: b'ready\n', ERRORED: b'error\n'}
+
+
+class LaserControllerSimulator(Serial):
+    # Контроллер лазера в памяти процесса с интерфейсом последовательного порта.
+    # Байты идут по линии со скоростью baud_rate, могут теряться и приходить с задержкой jitter,
+    # шаговые двигатели едут к цели со скоростью speed независимо по осям, новая цель заменяет текущую.
+    # Выход за limit заканчивается ошибкой, после которой принимается только калибровка.
+    # Все события вычисляются по времени при обращении к порту, отдельного потока нет
+    def __init__(self, baud_rate=DEFAULT_BAUD_RATE, speed=DEFAULT_SPEED, limit=MAX_LASER_RANGE,
+                 jitter=0.0, drop_rate=0.0, binary_protocol=True, read_timeout=SIMULATOR_TIMEOUT, seed=0):
+        self._byte_time = BITS_PER_BYTE / baud_rate
+        self._speed = speed
+        self._limit = limit
+        self._jitter = jitter
+        self._drop_rate = drop_rate
+        self._binary_supported = binary_protocol
+        self._read_timeout = read_timeout
+        self._random = Random(seed)
+        self._changed = Condition()
+
+        self._inbound = deque()  # (время прихода на контроллер, байты)
+        self._outbound = deque()  # (время прихода на компьютер, байты)
+        self._inbound_free_at = 0.0
+        self._outbound_free_at = 0.0
+        self._readable = bytearray()
+        self._received = bytearray()
+
+        self.binary = False
+        self.errored = False
+        self._origin = Point(0, 0)
+        self._target = Point(0, 0)
+        self._motion_started = 0.0
+        self._motion_finished = 0.0
+        self._motion_reported = True
+        self._hits_limit = False
+
+        self.commands_received = 0
+        self.moves_completed = 0
+        self.malformed_commands = 0
+        self.bytes_dropped = 0
+        # после включения контроллер сообщает о готовности, как и после каждого перемещения
+        self._reply(perf_counter(), READY)
+
+    # сторона компьютера
+
+    @property
+    def in_waiting(self):
+        with self._changed:
+            self._advance(perf_counter())
+            return len(self._readable)
+
+    def read(self, size=1):
+        deadline = perf_counter() + self._read_timeout
+        with self._changed:
+            while True:
+                now = perf_counter()
+                self._advance(now)
+                if self._readable or now >= deadline:
+                    data = bytes(self._readable[:size])
+                    del self._readable[:size]
+                    return data
+                self._changed.wait(min(self._next_event_time(), deadline) - now)
+
+    def write(self, data):
+        with self._changed:
+            now = perf_counter()
+            self._advance(now)
+            self._inbound_free_at = max(now, self._inbound_free_at) + len(data) * self._byte_time
+            self._inbound.append((self._inbound_free_at, self._lossy(data)))
+            self._changed.notify_all()
+        return len(data)
+
+    def position(self, now=None) -> Point:
+        with self._changed:
+            return self._position_at(perf_counter() if now is None else now)
+
+    # линия связи
+
+    def _lossy(self, data):
+        if not self._drop_rate:
+            return bytes(data)
+        kept = bytes(byte for byte in data if self._random.random() >= self._drop_rate)
+        self.bytes_dropped += len(data) - len(kept)
+        return kept
+
+    def _reply(self, time, reply, sequence=0):
+        data = encode_binary(Point(0, 0), reply, sequence) if self.binary else ASCII_REPLIES[reply]
+        self._send(time, data)
+
+    def _send(self, time, data):
+        delay = self._random.uniform(0, self._jitter) if self._jitter else 0.0
+        # порядок байт на линии сохраняется, задержка только сдвигает их вместе с последующими
+        self._outbound_free_at = max(time + delay, self._outbound_free_at) + len(data) * self._byte_time
+        self._outbound.append((self._outbound_free_at, self._lossy(data)))
+
+    def _next_event_time(self):
+        times = [self._inbound[0][0] if self._inbound else float('inf'),
+                 self._outbound[0][0] if self._outbound else float('inf')]
+        if not self._motion_reported:
+            times.append(self._motion_finished)
+        return min(times)
+
+    def _advance(self, now):
+        # события обрабатываются по порядку времени, как если бы контроллер работал всё это время
+        while True:
+            motion_due = self._motion_finished if not self._motion_reported else float('inf')
+            inbound_due = self._inbound[0][0] if self._inbound else float('inf')
+            if min(motion_due, inbound_due) > now:
+                break
+            if motion_due <= inbound_due:
+                self._finish_motion()
+            else:
+                time, data = self._inbound.popleft()
+                self._receive(time, data)
+        while self._outbound and self._outbound[0][0] <= now:
+            self._readable += self._outbound.popleft()[1]
+
+    # сторона контроллера
+
+    def _position_at(self, time) -> Point:
+        if time >= self._motion_finished:
+            return self._target
+        progress = (time - self._motion_started) / (self._motion_finished - self._motion_started)
+        return self._origin + (self._target - self._origin) * progress
+
+    def _move(self, time, target: Point):
+        self._origin = self._position_at(time)
+        self._hits_limit = abs(target.x) > self._limit or abs(target.y) > self._limit
+        if self._hits_limit:
+            target = Point(max(-self._limit, min(target.x, self._limit)), max(-self._limit, min(target.y, self._limit)))
+        distance = max(abs(target.x - self._origin.x), abs(target.y - self._origin.y))
+        self._target = target
+        self._motion_started = time
+        self._motion_finished = time + distance / self._speed
+        self._motion_reported = False
+
+    def _finish_motion(self):
+        self._motion_reported = True
+        if self._hits_limit:
+            self.errored = True
+            self._reply(self._motion_finished, ERRORED)
+            # лазер остановился на пределе и, как и SerialStub, сообщает о готовности принять калибровку
+            self._reply(self._motion_finished, READY)
+            return
+        self.moves_completed += 1
+        self._reply(self._motion_finished, READY)
+
+    def _receive(self, time, data):
+        self._received += data
+        if self.binary:
+            self._receive_frames(time)
+        else:
+            self._receive_lines(time)
+
+    def _receive_lines(self, time):
+        while True:
+            end = self._received.find(LINE_END)
+            if end < 0:
+                if len(self._received) > MAX_LINE_LENGTH:
+                    self._received.clear()
+                return
+            line = bytes(self._received[:end])
+            del self._received[:end + 1]
+            try:
+                x, y, command = map(int, line.split(b';'))
+            except ValueError:
+                self.malformed_commands += 1
+                continue
+            self._execute(time, command, Point(x, y))
+            if self.binary:
+                # после согласования остаток буфера уже двоичный
+                self._receive_frames(time)
+                return
+
+    def _receive_frames(self, time):
+        while True:
+            start = self._received.find(SYNC)
+            if start < 0:
+                self._received.clear()
+                return
+            if len(self._received) - start < FRAME.size:
+                del self._received[:start]
+                return
+            _, command, sequence, x, y, crc = FRAME.unpack_from(self._received, start)
+            if frame_crc(bytes(self._received[start:start + FRAME_BODY_SIZE])) != crc:
+                self.malformed_commands += 1
+                del self._received[:start + 1]
+                continue
+            del self._received[:start + FRAME.size]
+            self._reply(time, ACKNOWLEDGED, sequence)
+            self._execute(time, command, Point(x, y))
+
+    def _execute(self, time, command, position: Point):
+        self.commands_received += 1
+        if command == COMMAND_NEGOTIATE_BINARY:
+            if self._binary_supported:
+                self._send(time, b'binary\n')
+                self.binary = True
+        elif command == CALIBRATE_LASER_COMMAND:
+            self.errored = False
+            self._move(time, Point(0, 0))
+        elif command == COMMAND_MOVE and not self.errored:
+            self._move(time, position)
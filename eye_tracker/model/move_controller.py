@@ -1,26 +1,42 @@
-from time import time
+from collections import OrderedDict
+from threading import Condition, Event, Lock
+from time import time, perf_counter
 
 from serial import Serial, SerialException
 from serial.tools import list_ports
 
 from eye_tracker.common.abstractions import Initializable
 from eye_tracker.common.coordinates import Point
+from eye_tracker.common.instrumentation import profiler, glass_to_laser, LASER_DISPATCH
 from eye_tracker.common.logger import logger
 from eye_tracker.common.settings import settings, CALIBRATE_LASER_COMMAND, MAX_LASER_RANGE
-from eye_tracker.common.thread_helpers import ThreadLoopable, MutableValue
+from eye_tracker.common.thread_helpers import StoppableThread
+from eye_tracker.model.laser_protocol import LaserProtocol, COMMAND_MOVE, READY, ERRORED, ACKNOWLEDGED, \
+    encode_binary, FRAME, SYNC
 from eye_tracker.view import view_output
 
-READY = 'ready'
-ERRORED = 'error'
 LASER_DEVICE_NAME = 'usb-serial ch340'
-COMMAND_MOVE = 1
 DEFAULT_BAUD_RATE = 19200
 SERIAL_TIMEOUT = 0.1
+NEGOTIATION_TIMEOUT = 0.5
+MAX_PREDICTION_LEAD_SEC = 0.2  # дальше модель постоянной скорости уже сильно ошибается
+ACK_TIMEOUT = 0.5  # неподтверждённая за это время команда считается потерянной и освобождает место в окне
 
 
-class MoveController(Initializable, ThreadLoopable):
+def laser_borders():
+    left_top = Point(-MAX_LASER_RANGE, -MAX_LASER_RANGE)
+    right_top = Point(MAX_LASER_RANGE, -MAX_LASER_RANGE)
+    right_bottom = Point(MAX_LASER_RANGE, MAX_LASER_RANGE)
+    left_bottom = Point(-MAX_LASER_RANGE, MAX_LASER_RANGE)
+    return [left_top, right_top, right_bottom, left_bottom]
 
-    def __init__(self, on_laser_error, manual_port=None, baud_rate=None, debug_on=False, run_immediately=True):
+
+class MoveController(Initializable):
+    # Чтение ответов контроллера и отправка команд идут в двух потоках без опроса с фиксированным интервалом:
+    # читающий поток просыпается на пришедшие байты, пишущий - на ready или новую команду
+
+    def __init__(self, on_laser_error, manual_port=None, baud_rate=None, debug_on=False, run_immediately=True,
+                 serial=None):
         Initializable.__init__(self, initialized=True)
 
         manual_port = manual_port or f'COM{settings.SERIAL_PORT}'
@@ -29,21 +45,28 @@ class MoveController(Initializable, ThreadLoopable):
         self._current_position = Point(0, 0)
         self._ready = False
         self._errored = False
-        self._current_line = ''
         self._serial = SerialStub()
+        self._protocol = LaserProtocol()
+        self._in_flight = OrderedDict()  # номер отправленной команды -> время отправки
         self._on_laser_error = on_laser_error
-        self._pool_interval = MutableValue(1 / int(settings.FPS_PROCESSED * 0.5))
+        # последняя цель (позиция, команда, время захвата кадра, скорость), трекер перезаписывает её на каждом кадре,
+        # а пишущий поток забирает в момент отправки
         self._next_command_point = None
+        self._state_changed = Condition()
+        self._reader = None
+        self._writer = None
 
-        left_top = Point(-MAX_LASER_RANGE, -MAX_LASER_RANGE)
-        right_top = Point(MAX_LASER_RANGE, -MAX_LASER_RANGE)
-        right_bottom = Point(MAX_LASER_RANGE, MAX_LASER_RANGE)
-        left_bottom = Point(-MAX_LASER_RANGE, MAX_LASER_RANGE)
-        self.laser_borders = [left_top, right_top, right_bottom, left_bottom]
+        self.laser_borders = laser_borders()
+
+        if serial is not None:
+            # например, LaserControllerSimulator вместо настоящего контроллера
+            self._serial = serial
+            self._start_if(run_immediately)
+            return
 
         if debug_on:
             view_output.show_warning('Последовательный порт используется в режиме отладки')
-            ThreadLoopable.__init__(self, self._processing_loop, self._pool_interval, run_immediately=run_immediately)
+            self._start_if(run_immediately)
             return
 
         try:
@@ -57,8 +80,7 @@ class MoveController(Initializable, ThreadLoopable):
                         f' {manual_port}, а так же не удалось определить подходящий порт автоматически.'
                         f' Программа продолжит работать без контроллера лазера.')
                     self.init_error()
-                    ThreadLoopable.__init__(self, self._processing_loop, self._pool_interval,
-                                            run_immediately=run_immediately)
+                    self._start_if(run_immediately)
                     return
 
                 for description in ports_descriptions:
@@ -70,37 +92,127 @@ class MoveController(Initializable, ThreadLoopable):
         else:
             self._serial = serial
 
-        ThreadLoopable.__init__(self, self._processing_loop, self._pool_interval, run_immediately=run_immediately)
+        self._start_if(run_immediately)
+
+    def _start_if(self, run_immediately):
+        if run_immediately:
+            self.start_thread()
 
-    def _processing_loop(self):
-        serial_data = self._serial.readline()
-        new_errored = self._errored or ERRORED in str(serial_data)
-        self._ready = self._ready or READY in str(serial_data)
+    def start_thread(self):
+        self._reader = StoppableThread(target=self._reading_loop)
+        self._writer = StoppableThread(target=self._writing_loop)
+        self._reader.start()
+        self._writer.start()
+
+    def stop_thread(self):
+        if self._reader is None:
+            return
+        self._reader.stop()
+        self._writer.stop()
+        with self._state_changed:
+            self._state_changed.notify_all()
+
+    def __enter__(self):
+        self.start_thread()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stop_thread()
+        if exc_value:
+            raise exc_value
+
+    def _reading_loop(self):
+        # read возвращается сразу по приходу байт, таймаут нужен только чтобы заметить остановку потока
+        while not self._reader.is_stopped:
+            serial_data = self._serial.read(self._serial.in_waiting or 1)
+            for reply, sequence in self._protocol.feed(serial_data):
+                self._on_reply(reply, sequence)
+
+    def _on_reply(self, reply: int, sequence: int = None):
+        with self._state_changed:
+            if reply == ACKNOWLEDGED:
+                self._acknowledge(sequence)
+            new_errored = self._errored or reply == ERRORED
+            self._ready = self._ready or reply == READY
+            errored_now = new_errored and self._errored != new_errored
+            self._errored = new_errored
+            # ответ на согласование протокола тоже будит пишущий поток
+            self._state_changed.notify_all()
 
-        if new_errored and self._errored != new_errored:
+        if errored_now:
             view_output.show_error('Контроллер лазера внезапно дошёл до предельных координат. \n'
                                    'Необходимо откалибровать контроллер лазера повторно. '
                                    'До этого момента слежение за объектом невозможно')
-            self._errored = new_errored
             self._on_laser_error()
-            return
 
-        if self._next_command_point is None:
-            return
+    @property
+    def _pipelined(self):
+        # несколько команд без ожидания ready можно слать, только если контроллер подтверждает их номера
+        return self._protocol.binary and settings.LASER_COMMANDS_IN_FLIGHT > 1
 
-        if self.is_errored and self._next_command_point[1] != CALIBRATE_LASER_COMMAND:
+    def _acknowledge(self, sequence):
+        # подтверждение накопительное: команды, отправленные раньше подтверждённой, тоже считаются принятыми
+        if sequence not in self._in_flight:
             return
+        while self._in_flight.popitem(last=False)[0] != sequence:
+            pass
+
+    def _expire_in_flight(self):
+        now = time()
+        while self._in_flight and now - next(iter(self._in_flight.values())) > ACK_TIMEOUT:
+            sequence, _ = self._in_flight.popitem(last=False)
+            logger.debug(f'laser command {sequence} was not acknowledged in time')
 
+    def _command_delay(self):
+        # None - команду отправлять нечего, иначе через сколько секунд её можно будет отправить
+        if self._next_command_point is None:
+            return None
+        if self.is_errored and self._next_command_point[1] != CALIBRATE_LASER_COMMAND:
+            return None
+        if self._pipelined:
+            self._expire_in_flight()
+            if len(self._in_flight) < settings.LASER_COMMANDS_IN_FLIGHT:
+                return 0
+            return next(iter(self._in_flight.values())) + ACK_TIMEOUT - time()
         if not self.is_ready:
-            return
+            return None
+        return max(self._stable_position_timer + settings.STABLE_POSITION_DURATION - time(), 0)
 
-        if not self.is_stable_position:
+    def _negotiate_protocol(self):
+        if not settings.LASER_BINARY_PROTOCOL:
             return
-        
-        self._move_laser(*self._next_command_point)
-        self._stable_position_timer = time()
-        self._ready = False
-        self._next_command_point = None
+        self._serial.write(self._protocol.negotiation())
+        with self._state_changed:
+            self._state_changed.wait_for(lambda: self._protocol.binary or self._writer.is_stopped, NEGOTIATION_TIMEOUT)
+        if not self._protocol.binary:
+            logger.debug('laser controller does not support the binary protocol, falling back to text')
+
+    def _writing_loop(self):
+        self._negotiate_protocol()
+        while True:
+            with self._state_changed:
+                delay = self._command_delay()
+                while delay != 0 and not self._writer.is_stopped:
+                    self._state_changed.wait(delay)
+                    delay = self._command_delay()
+                if self._writer.is_stopped:
+                    return
+                position, command, capture_time, velocity = self._next_command_point
+                self._stable_position_timer = time()
+                self._ready = False
+                self._next_command_point = None
+            self._move_laser(self._extrapolate(position, capture_time, velocity), command, capture_time)
+
+    @staticmethod
+    def _extrapolate(position: Point, capture_time: float, velocity: Point):
+        # цель сдвигается на путь, пройденный объектом с момента захвата кадра до отправки команды
+        if velocity is None or capture_time is None:
+            return position
+        lead = min(perf_counter() - capture_time, MAX_PREDICTION_LEAD_SEC)
+        predicted = (position + velocity * lead).to_int()
+        if abs(predicted.x) > MAX_LASER_RANGE or abs(predicted.y) > MAX_LASER_RANGE:
+            return position
+        return predicted
 
     @property
     def is_stable_position(self):
@@ -116,32 +228,36 @@ class MoveController(Initializable, ThreadLoopable):
     def is_errored(self):
         return self._errored
 
-    def _move_laser(self, position: Point, command=COMMAND_MOVE):
-        message = (f'{position.x};{position.y};{command}\n').encode('ascii', 'ignore')
-        self._serial.write(message)
+    def _move_laser(self, position: Point, command=COMMAND_MOVE, capture_time: float = None):
+        with profiler.stage(LASER_DISPATCH):
+            with self._state_changed:
+                message, sequence = self._protocol.encode(position, command)
+                if self._pipelined:
+                    self._in_flight[sequence] = time()
+            self._serial.write(message)
+        glass_to_laser.record(capture_time)
 
-    def set_new_position(self, position: Point):
+    def set_new_position(self, position: Point, capture_time: float = None, velocity: Point = None):
         if position == self._current_position:
             return
 
         if self.is_errored:
             return
 
-        if not self.is_stable_position:
-            return
-
         if abs(position.x) > MAX_LASER_RANGE or \
                 abs(position.y) > MAX_LASER_RANGE:
             logger.debug('can\'t set out of laser range position')
             return
 
-        self._stable_position_timer = time()
-        self._current_position = position
-        self._next_command_point = (position, COMMAND_MOVE)
+        with self._state_changed:
+            self._current_position = position
+            self._next_command_point = (position, COMMAND_MOVE, capture_time, velocity)
+            self._state_changed.notify_all()
 
     def calibrate_laser(self):
         logger.debug('laser calibrated')
-        self._errored = False
+        with self._state_changed:
+            self._errored = False
         self.move_laser(0, 0, command=CALIBRATE_LASER_COMMAND)
 
     def center_laser(self):
@@ -154,33 +270,78 @@ class MoveController(Initializable, ThreadLoopable):
         if self.is_errored:
             return
 
-        self._next_command_point = (Point(x, y), command)
+        with self._state_changed:
+            self._next_command_point = (Point(x, y), command, None, None)
+            self._state_changed.notify_all()
 
     def controller_is_ready(self):
-        return self.is_stable_position and self.is_ready and self._next_command_point is None
+        return self.is_stable_position and self.is_ready and self._next_command_point is None and not self._in_flight
 
 
 class SerialStub(Serial):
+    # Как настоящий контроллер отвечает ready один раз после каждой команды, когда лазер "доехал",
+    # а read так же блокируется до прихода байт или таймаута
     READY_INTERVAL = 3  # sec
+    ASCII_REPLIES = {READY: b'ready\n', ERRORED: b'error\n'}
 
-    def __init__(self):
+    def __init__(self, read_timeout=SERIAL_TIMEOUT, binary_protocol=True):
         self._ready_timer = time()
+        self._ready_pending = True
         self._errored = False
+        self._read_timeout = read_timeout
+        self._binary_supported = binary_protocol
+        self._protocol = LaserProtocol()
+        self._output = bytearray()
+        self._output_lock = Lock()
+        self._wake = Event()
 
     def generate_error(self):
         self._errored = True
+        self._wake.set()
 
-    @property
-    def _is_ready(self):
-        return time() - self._ready_timer >= SerialStub.READY_INTERVAL
+    def _reply(self, reply):
+        if self._protocol.binary:
+            self._output += encode_binary(Point(0, 0), reply)
+        else:
+            self._output += SerialStub.ASCII_REPLIES[reply]
 
-    def readline(self, **kwargs):
-        if self._errored:
-            self._errored = False
-            return 'error'
-        if self._is_ready:
-            return 'ready'
-        return ''
+    def _update_output(self):
+        with self._output_lock:
+            if self._errored:
+                self._errored = False
+                self._reply(ERRORED)
+            if self._ready_pending and time() >= self._ready_timer + SerialStub.READY_INTERVAL:
+                self._ready_pending = False
+                self._reply(READY)
+
+    @property
+    def in_waiting(self):
+        self._update_output()
+        return len(self._output)
+
+    def read(self, size=1):
+        deadline = time() + self._read_timeout
+        while True:
+            self._wake.clear()
+            self._update_output()
+            now = time()
+            if self._output or now >= deadline:
+                with self._output_lock:
+                    data = bytes(self._output[:size])
+                    del self._output[:size]
+                return data
+            ready_at = self._ready_timer + SerialStub.READY_INTERVAL if self._ready_pending else deadline
+            self._wake.wait(max(min(deadline, ready_at) - now, 0))
 
     def write(self, data):
-        self._ready_timer = time()
+        with self._output_lock:
+            if data == self._protocol.negotiation():
+                if self._binary_supported:
+                    self._output += b'binary\n'
+                    self._protocol.binary = True
+            else:
+                if self._protocol.binary and data[0] == SYNC:
+                    self._output += encode_binary(Point(0, 0), ACKNOWLEDGED, FRAME.unpack(data)[2])
+                self._ready_timer = time()
+                self._ready_pending = True
+        self._wake.set()
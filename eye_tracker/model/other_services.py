@@ -7,10 +7,10 @@ from eye_tracker.common.abstractions import ProcessBased, Calibrator
 from eye_tracker.common.logger import logger
 from eye_tracker.common.settings import AREA, OBJECT, settings, MIN_THROTTLE_DIFFERENCE
 from eye_tracker.common.thread_helpers import threaded
-from eye_tracker.model.selector import AreaSelector, ObjectSelector
+from eye_tracker.model.selector import AreaSelector, ObjectSelector, Selector
 from eye_tracker.view import view_output
 from eye_tracker.view.view_model import SELECTION_MENU_NAME
-from eye_tracker.view.drawing import Processor
+from eye_tracker.view.drawing import DisplayBuffer, Processor
 
 PERCENT_FROM_DECIMAL = 100
 
@@ -19,17 +19,28 @@ class OnScreenService:
     def __init__(self, model):
         self.on_screen_selectors = dict()  # {name: Selector}
         self._model = model
+        self._display_buffer = DisplayBuffer()
 
     def add_selector(self, selector, name):
         self.on_screen_selectors[name] = selector
+        Processor.mark_display_dirty()
 
     def remove_selector(self, name):
         if name not in self.on_screen_selectors:
             return
         del self.on_screen_selectors[name]
+        Processor.mark_display_dirty()
         self._model.state_control.change_state(f'{name} selected', happened=False)
         if OBJECT in name:
-            self._model.tracker.cancel()
+            self._model.trackers.remove(name)
+
+    def remove_objects(self):
+        # все отслеживаемые объекты, выделения в процессе остаются для отмены через SelectingService
+        for name in self._model.trackers.names:
+            self.remove_selector(name)
+
+    def object_names(self):
+        return [name for name in self.on_screen_selectors if OBJECT in name]
 
     def get_selector(self, name):
         return self.on_screen_selectors.get(name)
@@ -37,17 +48,21 @@ class OnScreenService:
     def selector_exists(self, name):
         return name in self.on_screen_selectors
 
-    def common_processing(self, frame):
-        frame = Processor.resize_to_minimum(frame)
-        processed = self._draw_active_objects(frame)
+    def common_processing(self, frame, overlays: dict = None):
+        # кадр приходит уже уменьшенным до размера отображения из FrameContext,
+        # overlays - рамки трекеров на момент этого кадра, остальные выделения рисуются как есть сейчас
+        processed = self._draw_active_objects(frame, overlays or {})
         return processed
 
     def prepare_image(self, frame):
-        return Processor.frame_to_image(frame)
+        return self._display_buffer.convert(frame)
 
-    def _draw_active_objects(self, frame):
-        for obj in self.on_screen_selectors.values():
-            frame = obj.draw_on_frame(frame)
+    def take_image(self, image) -> bool:
+        return self._display_buffer.take(image)
+
+    def _draw_active_objects(self, frame, overlays: dict):
+        for name, obj in list(self.on_screen_selectors.items()):
+            frame = overlays.get(name, obj).draw_on_frame(frame)
         return frame
 
 
@@ -77,7 +92,7 @@ class SelectingService(ProcessBased):
     def create_selector(self, name, call_func_after_selection=None):
         logger.debug(f'creating new selector {name}')
 
-        on_selected = self._on_object_selected if OBJECT in name else self._on_area_selected
+        on_selected = partial(self._on_object_selected, name=name) if OBJECT in name else self._on_area_selected
 
         if call_func_after_selection is not None:
             on_selected = partial(on_selected, call_func_after_selection)
@@ -93,9 +108,14 @@ class SelectingService(ProcessBased):
     def selecting_in_progress(self, name):
         return self._screen.selector_exists(name) and self._screen.get_selector(name).in_progress
 
+    def any_selecting_in_progress(self):
+        # трекеры тоже хранятся среди выделений на экране, но их in_progress означает слежение
+        return any(isinstance(selector, Selector) and selector.in_progress
+                   for selector in list(self._screen.on_screen_selectors.values()))
+
     def cancel(self):
         self._model.state_control.change_state('enter pressed')
-        for name in (AREA, OBJECT):
+        for name in (AREA, *self._screen.object_names()):
             if not self._screen.selector_exists(name):
                 continue
             if not self.selecting_is_done(name):
@@ -120,6 +140,10 @@ class SelectingService(ProcessBased):
 
         return self.selecting_is_done(AREA)
 
+    def is_additional_object_allowed(self):
+        # дополнительные объекты выделяются, пока идёт слежение за основным
+        return self._model.trackers.in_progress and self._model.trackers.has_room
+
     def is_area_selection_allowed(self, dont_reselect_area):
         # TODO: поправить логику и сделать без костылей вроде этого
         if dont_reselect_area:
@@ -133,15 +157,21 @@ class SelectingService(ProcessBased):
                                                    f'Выделенная область будет стёрта. Продолжить?')
             if not confirm:
                 return False
+        self._screen.remove_objects()
         self._screen.remove_selector(OBJECT)
         self._model.state_control.change_state('coordinate system calibrated', happened=False)
         return True
 
     def try_create_selector(self, name, reselect_while_calibrating=False, additional_callback=None):
 
-        if OBJECT in name:
+        if name == OBJECT:
             if not self.is_object_selection_allowed(reselect_while_calibrating):
                 return
+            # новый основной объект заменяет все отслеживаемые, а не только прежний основной
+            self._screen.remove_objects()
+        elif OBJECT in name:
+            if not self.is_additional_object_allowed():
+                return
 
         if AREA in name:
             if not self.is_area_selection_allowed(dont_reselect_area=reselect_while_calibrating):
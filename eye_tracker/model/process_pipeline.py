@@ -0,0 +1,253 @@
+from math import isnan
+from queue import Empty
+from threading import Lock
+
+import numpy as np
+
+from eye_tracker.common.abstractions import Initializable
+from eye_tracker.common.coordinates import Point
+from eye_tracker.common.logger import logger
+from eye_tracker.common.process_helpers import SPAWN, SHARED_RING_SLOTS, SeqlockStruct, SharedFrameRing, \
+    ForwardingView, settings_snapshot, prepare_child_process, wait_for
+from eye_tracker.common.settings import settings, CALIBRATE_LASER_COMMAND
+from eye_tracker.model.camera_extractor import CameraService, CapturedFrame, NoneFrameException, \
+    EmptyReadBackoff, CAPTURE_TIMEOUT_SEC
+from eye_tracker.model.laser_protocol import COMMAND_MOVE
+from eye_tracker.model.move_controller import MoveController, laser_borders
+from eye_tracker.view import view_output
+
+STARTUP_TIMEOUT_SEC = 5.0
+STOP_TIMEOUT_SEC = 1.0
+STATUS_INTERVAL_SEC = 0.05  # как часто процесс лазера обновляет состояние без новых команд
+# запрос, x, y, время захвата кадра, скорость по x и y; отсутствующие время и скорость - NaN
+TARGET_FIELDS = 'Qddddd'
+# последний выполненный запрос, порт открыт, готов к команде, ошибка, сколько всего было ошибок
+STATUS_FIELDS = 'Q???Q'
+NO_VALUE = float('nan')
+
+
+def capture_process_loop(source, snapshot, layout, stop, new_frame):
+    prepare_child_process(snapshot, ForwardingView(SPAWN.Queue()))
+    camera = CameraService(source, threaded_capture=False, sensor_space=True)
+    if not camera.initialized:
+        layout.put(None)
+        return
+    captured = camera.extract_captured_frame()
+    ring = SharedFrameRing(captured.image.shape)
+    ring.write(captured.image, captured.timestamp)
+    layout.put((ring.name, ring.shape))
+    backoff = EmptyReadBackoff()
+    try:
+        while not stop.is_set():
+            try:
+                captured = camera.extract_captured_frame()
+            except NoneFrameException:
+                if camera.source_exhausted:
+                    break
+                backoff.wait()
+                continue
+            backoff.reset()
+            ring.write(captured.image, captured.timestamp)
+            new_frame.set()
+    finally:
+        ring.close()
+        logger.debug('capture process stopped')
+
+
+class CaptureProcess:
+    # Захват кадров в отдельном процессе со своим GIL, кадры приходят через кольцо в общей памяти.
+    # Интерфейс FrameGrabber, поэтому CameraService поворачивает и отражает их так же, как кадры из потока
+    def __init__(self, source=None):
+        self.dropped_count = 0
+        self.ring = None
+        self._last_taken = 0
+        self._stop = SPAWN.Event()
+        self._new_frame = SPAWN.Event()
+        layout = SPAWN.Queue()
+        self._process = SPAWN.Process(target=capture_process_loop, name='capture', daemon=True,
+                                      args=(settings.CAMERA_ID if source is None else source, settings_snapshot(),
+                                            layout, self._stop, self._new_frame))
+        self._process.start()
+        try:
+            layout = layout.get(timeout=STARTUP_TIMEOUT_SEC)
+        except Empty:
+            layout = None
+        self.initialized = layout is not None
+        if not self.initialized:
+            self.stop_thread()
+            return
+        name, shape = layout
+        self.ring = SharedFrameRing(shape, SHARED_RING_SLOTS, name)
+        # два буфера по очереди: кадр предыдущей итерации остаётся целым, пока обрабатывается следующий
+        self._buffers = [np.empty(shape, np.uint8), np.empty(shape, np.uint8)]
+        logger.debug(f'capture process started with frames {shape}')
+
+    def latest_frame(self, last_sequence: int):
+        if not wait_for(lambda: self.ring.sequence > last_sequence, self._new_frame, CAPTURE_TIMEOUT_SEC):
+            raise NoneFrameException('Не удалось получить кадр с камеры')
+        self._buffers.reverse()
+        sequence, timestamp = self.ring.read_latest(self._buffers[0])
+        if self._last_taken:
+            self.dropped_count += sequence - self._last_taken - 1
+        self._last_taken = sequence
+        return CapturedFrame(self._buffers[0], sequence, timestamp)
+
+    def stop_thread(self):
+        self._stop.set()
+        self._process.join(STOP_TIMEOUT_SEC)
+        if self._process.is_alive():
+            self._process.terminate()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+def create_process_camera(source=None) -> CameraService:
+    camera = CameraService(auto_set=False, threaded_capture=False)
+    capture = CaptureProcess(source)
+    if not capture.initialized:
+        logger.warning('capture process failed to start, capturing in the main process')
+        return CameraService(settings.CAMERA_ID if source is None else source)
+    camera.use_grabber(capture)
+    return camera
+
+
+def laser_process_loop(snapshot, messages, target_name, status_name, commands, wake, started, stop, debug_on):
+    prepare_child_process(snapshot, ForwardingView(messages))
+    target = SeqlockStruct(TARGET_FIELDS, target_name)
+    status = SeqlockStruct(STATUS_FIELDS, status_name)
+    errors = 0
+
+    def on_laser_error():
+        nonlocal errors
+        errors += 1
+
+    controller = MoveController(on_laser_error, debug_on=debug_on)
+    processed = 0
+    last_target = 0
+    status.write(processed, controller.initialized, controller.controller_is_ready(), controller.is_errored, errors)
+    started.set()
+    try:
+        # остановка проверяется после выполнения пришедших вместе с ней команд, например центрирования лазера
+        while not stop.is_set():
+            wake.wait(STATUS_INTERVAL_SEC)
+            wake.clear()
+            while True:
+                try:
+                    request, x, y, command = commands.get_nowait()
+                except Empty:
+                    break
+                if command == CALIBRATE_LASER_COMMAND:
+                    controller.calibrate_laser()
+                else:
+                    controller.move_laser(x, y, command)
+                processed = max(processed, request)
+            sequence, (request, x, y, capture_time, velocity_x, velocity_y) = target.read()
+            if sequence != last_target:
+                last_target = sequence
+                velocity = None if isnan(velocity_x) else Point(velocity_x, velocity_y)
+                controller.set_new_position(Point(int(x), int(y)), None if isnan(capture_time) else capture_time,
+                                            velocity)
+                processed = max(processed, request)
+            status.write(processed, controller.initialized, controller.controller_is_ready(), controller.is_errored,
+                         errors)
+    finally:
+        controller.stop_thread()
+        target.close()
+        status.close()
+        logger.debug('laser process stopped')
+
+
+class LaserProcess(Initializable):
+    # MoveController в отдельном процессе: обмен с портом и его потоки не делят GIL с трекингом.
+    # Цель слежения передаётся через SeqlockStruct, т.к. важна только последняя, редкие команды - очередью.
+    # Время захвата кадра - perf_counter, его часы общие для всех процессов системы
+    def __init__(self, on_laser_error, debug_on=False, run_immediately=True):
+        Initializable.__init__(self, initialized=True)
+        self.laser_borders = laser_borders()
+        self._on_laser_error = on_laser_error
+        self._target = SeqlockStruct(TARGET_FIELDS)
+        self._status = SeqlockStruct(STATUS_FIELDS)
+        self._commands = SPAWN.Queue()
+        self._messages = SPAWN.Queue()
+        self._wake = SPAWN.Event()
+        self._started = SPAWN.Event()
+        self._stop = SPAWN.Event()
+        self._write_lock = Lock()  # у seqlock один писатель, а позицию задают и трекинг, и калибровка
+        self._requests = 0
+        self._errors_seen = 0
+        self._process = SPAWN.Process(target=laser_process_loop, name='laser', daemon=True,
+                                      args=(settings_snapshot(), self._messages, self._target.name,
+                                            self._status.name, self._commands, self._wake, self._started,
+                                            self._stop, debug_on))
+        if run_immediately:
+            self.start_thread()
+
+    def start_thread(self):
+        self._process.start()
+        if not self._started.wait(STARTUP_TIMEOUT_SEC):
+            logger.warning('laser process did not report its state in time')
+        _, (_, initialized, *_) = self._status.read()
+        self.initialized = initialized
+        self._forward_messages()
+
+    def stop_thread(self):
+        self._stop.set()
+        self._wake.set()
+        if self._process.pid is not None:
+            self._process.join(STOP_TIMEOUT_SEC)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._target.close()
+        self._status.close()
+
+    def _forward_messages(self):
+        while True:
+            try:
+                view_output._view.queue_command(self._messages.get_nowait())
+            except Empty:
+                return
+
+    def _read_status(self):
+        _, (processed, _, ready, errored, errors) = self._status.read()
+        if errors > self._errors_seen:
+            self._errors_seen = errors
+            self._on_laser_error()
+        return processed, ready, errored
+
+    @property
+    def is_errored(self):
+        return self._read_status()[2]
+
+    def _send(self, x, y, command):
+        with self._write_lock:
+            self._requests += 1
+            self._commands.put((self._requests, x, y, command))
+        self._wake.set()
+
+    def set_new_position(self, position: Point, capture_time: float = None, velocity: Point = None):
+        velocity = velocity or (NO_VALUE, NO_VALUE)
+        with self._write_lock:
+            self._requests += 1
+            self._target.write(self._requests, position.x, position.y,
+                               NO_VALUE if capture_time is None else capture_time, *velocity)
+        self._wake.set()
+        self._read_status()
+
+    def calibrate_laser(self):
+        logger.debug('laser calibrated')
+        self._send(0, 0, CALIBRATE_LASER_COMMAND)
+
+    def center_laser(self):
+        logger.debug('laser centered')
+        self.move_laser(0, 0)
+
+    def move_laser(self, x, y, command=COMMAND_MOVE):
+        logger.debug(f'laser moved to {x, y}')
+        self._send(x, y, command)
+
+    def controller_is_ready(self):
+        self._forward_messages()
+        processed, ready, _ = self._read_status()
+        # состояние устаревшее, пока процесс лазера не выполнил последний запрос
+        return ready and processed >= self._requests
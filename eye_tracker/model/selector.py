@@ -1,6 +1,6 @@
 from abc import ABC
 
-from eye_tracker.common.coordinates import Point
+from eye_tracker.common.coordinates import Point, PointSet
 from eye_tracker.common.abstractions import RectBased, Drawable, ProcessBased
 from eye_tracker.common.logger import logger
 from eye_tracker.view.drawing import Processor
@@ -98,11 +98,11 @@ class ObjectSelector(RectBased, Drawable, Selector):
         super().left_button_click(coordinates)
         # BUG: Баг с событиями: если много раз выделять пустой объект (просто кликать по экрану),
         # то очередь событий ломается и может клик сработать несколько раз
-        self._left_top.x, self._left_top.y = coordinates.x, coordinates.y
+        self._left_top = Point(coordinates.x, coordinates.y)
         logger.debug(f'start selecting {coordinates.x, coordinates.y}')
 
     def left_button_down_moved(self, event):
-        self._right_bottom.x, self._right_bottom.y = event.x, event.y
+        self._right_bottom = Point(event.x, event.y)
 
     def left_button_up(self, event):
         logger.debug(f'end selecting {self.name} {event.x, event.y}')
@@ -118,21 +118,21 @@ class ObjectSelector(RectBased, Drawable, Selector):
         self._left_top, self._right_bottom = self._points
         # WARNING: не вызывать здесь self.finish_selecting(), т.к. он вызывается в arrow_press() view_model
 
+    def _move_by(self, step: Point):
+        self._left_top += step
+        self._right_bottom += step
+
     def arrow_up(self):
-        self._left_top.y -= CORRECTIVE_STEP_PIXELS
-        self._right_bottom.y -= CORRECTIVE_STEP_PIXELS
+        self._move_by(Point(0, -CORRECTIVE_STEP_PIXELS))
 
     def arrow_down(self):
-        self._left_top.y += CORRECTIVE_STEP_PIXELS
-        self._right_bottom.y += CORRECTIVE_STEP_PIXELS
+        self._move_by(Point(0, CORRECTIVE_STEP_PIXELS))
 
     def arrow_left(self):
-        self._left_top.x -= CORRECTIVE_STEP_PIXELS
-        self._right_bottom.x -= CORRECTIVE_STEP_PIXELS
+        self._move_by(Point(-CORRECTIVE_STEP_PIXELS, 0))
 
     def arrow_right(self):
-        self._left_top.x += CORRECTIVE_STEP_PIXELS
-        self._right_bottom.x += CORRECTIVE_STEP_PIXELS
+        self._move_by(Point(CORRECTIVE_STEP_PIXELS, 0))
 
     def draw_on_frame(self, frame):
         return Processor.draw_rectangle(frame, self._left_top, self._right_bottom)
@@ -173,9 +173,7 @@ class AreaSelector(Drawable, Selector):
             for point in self._points:
                 frame = Processor.draw_circle(frame, point)
         elif self.is_done:
-            for a, b in zip(self._points[:-1], self._points[1:]):
-                frame = Processor.draw_line(frame, a, b)
-            frame = Processor.draw_line(frame, self._points[-1], self._points[0])
+            frame = Processor.draw_polygon(frame, PointSet(self._points))
 
         for point, name in zip(self._points, POINTS_ORIENTATION):
             frame = Processor.draw_text(frame, name, point)
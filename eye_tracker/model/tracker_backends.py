@@ -0,0 +1,205 @@
+from abc import ABC, abstractmethod
+
+import cv2
+import dlib
+import numpy as np
+
+from eye_tracker.common.logger import logger
+from eye_tracker.view import view_output
+
+DLIB_CORRELATION = 0
+OPENCV_KCF = 1
+OPENCV_MOSSE = 2
+OPENCV_CSRT = 3
+PHASE_CORRELATION = 4
+
+DLIB_FULL_CONFIDENCE_PSR = 20.0  # PSR, начиная с которого dlib трекер считается полностью уверенным
+PHASE_FULL_CONFIDENCE_PEAK = 0.3
+SIMILARITY_MARGIN_DIVISOR = 4  # на какую часть размера объекта рамка OpenCV может отклоняться от образца
+PHASE_MIN_SIDE = 4  # окно Ханна меньшего размера обнуляет почти весь шаблон
+TEMPLATE_LEARNING_RATE = 0.1
+BGR_TO_GRAY = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+EPSILON = 1e-6
+
+
+class TrackerBackendUnavailable(ImportError):
+    ...
+
+
+class TrackerBackend(ABC):
+    # Прямоугольники везде в виде (left, top, right, bottom) в координатах переданного кадра.
+    # confidence нормирована в [0, 1] независимо от алгоритма, чтобы бэкенды были взаимозаменяемы
+    name = ''
+    supports_guess = False  # можно ли передавать позицию в update, т.е. работать в смещающемся окне поиска
+
+    @abstractmethod
+    def start(self, frame, rect):
+        ...
+
+    @abstractmethod
+    def update(self, frame, guess=None) -> float:
+        ...
+
+    @abstractmethod
+    def get_position(self):
+        ...
+
+
+class DlibCorrelationBackend(TrackerBackend):
+    name = 'dlib correlation'
+    supports_guess = True
+
+    def __init__(self):
+        self._tracker = dlib.correlation_tracker()
+
+    def start(self, frame, rect):
+        self._tracker.start_track(frame, dlib.rectangle(*map(int, rect)))
+
+    def update(self, frame, guess=None):
+        if guess is None:
+            psr = self._tracker.update(frame)
+        else:
+            psr = self._tracker.update(frame, dlib.drectangle(*guess))
+        return min(psr / DLIB_FULL_CONFIDENCE_PSR, 1.0)
+
+    def get_position(self):
+        rect = self._tracker.get_position()
+        return rect.left(), rect.top(), rect.right(), rect.bottom()
+
+
+def _opencv_tracker_factory(name):
+    # KCF, MOSSE и CSRT есть только в opencv-contrib-python, причём в разных версиях в разных пространствах имён
+    for namespace in (cv2, getattr(cv2, 'legacy', None)):
+        factory = getattr(namespace, f'Tracker{name}_create', None)
+        if factory is not None:
+            return factory
+    return None
+
+
+class OpenCVBackend(TrackerBackend):
+    # Трекеры OpenCV сообщают только, найден ли объект, поэтому уверенность - нормированная корреляция
+    # найденной области с образцом, снятым при выделении
+    def __init__(self, algorithm: str):
+        self.name = f'opencv {algorithm.lower()}'
+        self._factory = _opencv_tracker_factory(algorithm)
+        if self._factory is None:
+            raise TrackerBackendUnavailable(f'OpenCV tracker {algorithm} requires opencv-contrib-python')
+        self._tracker = None
+        self._template = None
+        self._position = (0, 0, 0, 0)
+
+    def start(self, frame, rect):
+        self._tracker = self._factory()
+        left, top, right, bottom = map(int, rect)
+        self._tracker.init(frame, (left, top, right - left, bottom - top))
+        self._template = frame[top:bottom, left:right].copy()
+        self._position = (left, top, right, bottom)
+
+    def update(self, frame, guess=None):
+        found, (x, y, width, height) = self._tracker.update(frame)
+        if not found:
+            return 0.0
+        self._position = (x, y, x + width, y + height)
+        return self._similarity(frame)
+
+    def _similarity(self, frame):
+        # образец ищется и чуть вокруг рамки, иначе сдвиг рамки на пару пикселей уже обнуляет корреляцию
+        template_height, template_width = self._template.shape[:2]
+        margin = max(template_width, template_height) // SIMILARITY_MARGIN_DIVISOR
+        frame_height, frame_width = frame.shape[:2]
+        left, top, right, bottom = map(int, self._position)
+        patch = frame[max(top - margin, 0):min(bottom + margin, frame_height),
+                      max(left - margin, 0):min(right + margin, frame_width)]
+        if patch.shape[0] < template_height or patch.shape[1] < template_width or not self._template.size:
+            return 0.0
+        score = float(cv2.minMaxLoc(cv2.matchTemplate(patch, self._template, cv2.TM_CCOEFF_NORMED))[1])
+        # у однотонной области корреляция не определена
+        return min(max(score, 0.0), 1.0) if np.isfinite(score) else 0.0
+
+    def get_position(self):
+        return self._position
+
+
+class PhaseCorrelationBackend(TrackerBackend):
+    # Шаблон объекта сравнивается с областью на месте предполагаемой позиции через фазовую корреляцию (БПФ numpy).
+    # Смещение за кадр должно быть меньше половины размера объекта
+    name = 'phase correlation'
+    supports_guess = True
+
+    def __init__(self, learning_rate: float = TEMPLATE_LEARNING_RATE):
+        self._learning_rate = learning_rate
+        self._template_spectrum = None
+        self._template = None
+        self._window = None
+        self._position = (0, 0, 0, 0)
+
+    @staticmethod
+    def _gray(patch):
+        return patch.astype(np.float32) @ BGR_TO_GRAY if patch.ndim == 3 else patch.astype(np.float32)
+
+    def _patch(self, frame, left, top):
+        height, width = self._template.shape
+        patch = np.zeros((height, width), dtype=np.float32)
+        frame_height, frame_width = frame.shape[:2]
+        src_left, src_top = max(left, 0), max(top, 0)
+        src_right, src_bottom = min(left + width, frame_width), min(top + height, frame_height)
+        if src_right > src_left and src_bottom > src_top:
+            patch[src_top - top:src_bottom - top, src_left - left:src_right - left] = \
+                self._gray(frame[src_top:src_bottom, src_left:src_right])
+        patch -= patch.mean()
+        return patch * self._window
+
+    def start(self, frame, rect):
+        left, top, right, bottom = map(int, rect)
+        height, width = bottom - top, right - left
+        if min(height, width) < PHASE_MIN_SIDE:
+            raise ValueError(f'object {width}x{height} is too small for phase correlation, '
+                             f'at least {PHASE_MIN_SIDE} pixels per side are needed')
+        self._window = np.outer(np.hanning(height), np.hanning(width)).astype(np.float32)
+        self._template = np.zeros((height, width), dtype=np.float32)
+        self._template = self._patch(frame, left, top)
+        self._template_spectrum = np.fft.rfft2(self._template)
+        self._position = (left, top, right, bottom)
+
+    def update(self, frame, guess=None):
+        left, top, right, bottom = guess if guess is not None else self._position
+        left, top = int(round(left)), int(round(top))
+        height, width = self._template.shape
+        patch = self._patch(frame, left, top)
+        cross_power = np.conj(self._template_spectrum) * np.fft.rfft2(patch)
+        cross_power /= np.abs(cross_power) + EPSILON
+        correlation = np.fft.irfft2(cross_power, s=(height, width))
+        peak_y, peak_x = np.unravel_index(np.argmax(correlation), correlation.shape)
+        peak = float(correlation[peak_y, peak_x])
+        shift_x = peak_x - width if peak_x > width // 2 else peak_x
+        shift_y = peak_y - height if peak_y > height // 2 else peak_y
+        left, top = left + shift_x, top + shift_y
+        self._position = (left, top, left + width, top + height)
+        confidence = min(peak / PHASE_FULL_CONFIDENCE_PEAK, 1.0)
+        if confidence >= 1.0:
+            # шаблон обновляется только по уверенным кадрам, чтобы не "съезжать" на фон
+            self._template += self._learning_rate * (self._patch(frame, left, top) - self._template)
+            self._template_spectrum = np.fft.rfft2(self._template)
+        return confidence
+
+    def get_position(self):
+        return self._position
+
+
+TRACKER_BACKENDS = {
+    DLIB_CORRELATION: DlibCorrelationBackend,
+    OPENCV_KCF: lambda: OpenCVBackend('KCF'),
+    OPENCV_MOSSE: lambda: OpenCVBackend('MOSSE'),
+    OPENCV_CSRT: lambda: OpenCVBackend('CSRT'),
+    PHASE_CORRELATION: PhaseCorrelationBackend,
+}
+
+
+def create_tracker_backend(kind: int) -> TrackerBackend:
+    try:
+        return TRACKER_BACKENDS[kind]()
+    except TrackerBackendUnavailable as e:
+        logger.exception(e)
+        view_output.show_warning(f'Выбранный настройкой TRACKER_BACKEND алгоритм слежения недоступен: {e}. '
+                                 f'Будет использован алгоритм по умолчанию.')
+        return DlibCorrelationBackend()
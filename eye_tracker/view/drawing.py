@@ -1,15 +1,16 @@
+from threading import Lock
+
 import cv2
 import numpy as np
 from PIL import Image
 
 from eye_tracker.common.coordinates import Point
 from eye_tracker.common.logger import logger
-from eye_tracker.common.settings import settings, private_settings, RESOLUTIONS, DOWNSCALED_WIDTH
-
-SPLIT_PARTS = 4
-# другие значения не работают с 90 градусов поворотом при разрешениях кроме 640
+from eye_tracker.common.settings import private_settings, RESOLUTIONS, DOWNSCALED_WIDTH
 
 FONT_SCALE = 0.8
+ZERO_POINT = Point(0, 0)
+NO_IMAGE = -1
 
 
 class Processor:
@@ -18,6 +19,8 @@ class Processor:
     COLOR_CAUTION = (0, 0, 255)
     THICKNESS = 2
     CURRENT_COLOR = COLOR_NORMAL
+    # разметка поверх кадра изменилась, и её надо перерисовать, даже если сам кадр не менялся
+    _display_dirty = True
 
     @staticmethod
     def frame_to_image(frame):
@@ -33,20 +36,26 @@ class Processor:
         left_top = left_top.to_int()
         right_bottom = right_bottom.to_int()
         # TODO: возможно понадобится более серьезная защита типа проверки на NAN и тд
-        if left_top and right_bottom and left_top != right_bottom and left_top != Point(0, 0):
-            return cv2.rectangle(frame, (*left_top,), (*right_bottom,), cls.CURRENT_COLOR, cls.THICKNESS)
+        if left_top and right_bottom and left_top != right_bottom and left_top != ZERO_POINT:
+            return cv2.rectangle(frame, left_top, right_bottom, cls.CURRENT_COLOR, cls.THICKNESS)
         return frame
 
     @classmethod
     def draw_circle(cls, frame, center: Point):
         center = center.to_int()
-        return cv2.circle(frame, (*center,), radius=cls.THICKNESS, color=cls.CURRENT_COLOR, thickness=cls.THICKNESS)
+        return cv2.circle(frame, center, radius=cls.THICKNESS, color=cls.CURRENT_COLOR, thickness=cls.THICKNESS)
 
     @classmethod
     def draw_line(cls, frame, start: Point, end: Point):
         start = start.to_int()
         end = end.to_int()
-        return cv2.line(frame, (*start,), (*end,), color=cls.CURRENT_COLOR, thickness=cls.THICKNESS)
+        return cv2.line(frame, start, end, color=cls.CURRENT_COLOR, thickness=cls.THICKNESS)
+
+    @classmethod
+    def draw_polygon(cls, frame, points):
+        # замкнутая ломаная одним вызовом OpenCV вместо отрезков по отдельности
+        polygon = np.asarray(points, dtype=np.float64).astype(np.int32).reshape(-1, 1, 2)
+        return cv2.polylines(frame, [polygon], isClosed=True, color=cls.CURRENT_COLOR, thickness=cls.THICKNESS)
 
     @classmethod
     def draw_text(cls, frame, text: str, coords: Point, font_scale: float = FONT_SCALE):
@@ -75,20 +84,65 @@ class Processor:
             return cls.resize_frame_absolute(frame, DOWNSCALED_WIDTH, down_width)
         return cls.resize_frame_absolute(frame, down_width, DOWNSCALED_WIDTH)
 
-    @classmethod
-    def frames_are_same(cls, one, another):
-        if one is None or another is None:
-            return False
-        if one.shape != another.shape:
-            return False
-        one = cls.resize_frame_relative(one, settings.DOWNSCALE_FACTOR)
-        another = cls.resize_frame_relative(another, settings.DOWNSCALE_FACTOR)
-        return all(i.mean() > settings.SAME_FRAMES_THRESHOLD for i in np.split((one == another), SPLIT_PARTS))
-
     @classmethod
     def load_color(cls):
         # TODO: возможно еще добавить выбор цвета предупреждения
         ps = private_settings
         color = (ps.PAINT_COLOR_B, ps.PAINT_COLOR_G, ps.PAINT_COLOR_R)
         cls.COLOR_NORMAL = color
-        cls.CURRENT_COLOR = color
+        cls.set_color(color)
+
+    @classmethod
+    def set_color(cls, color):
+        if color != cls.CURRENT_COLOR:
+            cls.CURRENT_COLOR = color
+            cls.mark_display_dirty()
+
+    @classmethod
+    def mark_display_dirty(cls):
+        cls._display_dirty = True
+
+    @classmethod
+    def take_display_dirty(cls) -> bool:
+        dirty, cls._display_dirty = cls._display_dirty, False
+        return dirty
+
+
+class DisplayBuffer:
+    # Предвыделенные буферы RGBA и постоянные изображения PIL поверх их памяти: cvtColor пишет кадр
+    # сразу в буфер, а PIL не копирует его. RGBA, т.к. только 4-байтные режимы PIL отображает на чужую память,
+    # и тот же режим у PhotoImage, поэтому paste не перекодирует кадр.
+    # Как в FrameRing, буферов три: самый свежий кадр, кадр, который окно забрало через take и вставляет,
+    # и буфер, в который модель пишет следующий кадр. Окно может отстать, но не получит недописанный кадр
+    SIZE = 3
+    __slots__ = ['_buffers', '_images', '_latest', '_showing', '_lock']
+
+    def __init__(self):
+        self._buffers = [None] * DisplayBuffer.SIZE
+        self._images = [None] * DisplayBuffer.SIZE
+        self._latest = NO_IMAGE
+        self._showing = NO_IMAGE
+        self._lock = Lock()
+
+    def convert(self, frame) -> Image.Image:
+        with self._lock:
+            index = next(i for i in range(DisplayBuffer.SIZE) if i not in (self._latest, self._showing))
+        buffer = self._buffers[index]
+        height, width = frame.shape[:2]
+        if buffer is None or buffer.shape[:2] != (height, width):
+            # размер меняется только при повороте изображения
+            buffer = np.empty((height, width, 4), dtype=np.uint8)
+            self._buffers[index] = buffer
+            self._images[index] = Image.frombuffer('RGBA', (width, height), buffer, 'raw', 'RGBA', 0, 1)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=buffer)
+        with self._lock:
+            self._latest = index
+        return self._images[index]
+
+    def take(self, image: Image.Image) -> bool:
+        # окно забирает изображение перед вставкой, False - его уже сменил более свежий кадр
+        with self._lock:
+            if self._latest == NO_IMAGE or self._images[self._latest] is not image:
+                return False
+            self._showing = self._latest
+            return True
@@ -10,6 +10,7 @@ from eye_tracker.view.drawing import Processor
 
 CALIBRATION_MENU_NAME = 'Откалибровать'
 SELECTION_MENU_NAME = 'Выделить объект'
+ADD_OBJECT_MENU_NAME = 'Добавить объект'
 ROTATION_MENU_NAME = 'Повернуть'
 FLIP_MENU_NAME = 'Отразить'
 MANUAL_MENU_NAME = 'Ручное управление'
@@ -38,7 +39,10 @@ class ViewModel:
         self._view = view
 
     def on_image_ready(self, image):
-        self._view._current_image = image
+        self._view.set_current_image(image)
+
+    def take_image(self, image) -> bool:
+        return self._model.screen.take_image(image)
 
     def calibrate_laser(self):
         self._model.calibrate_laser()
@@ -68,14 +72,17 @@ class ViewModel:
     def left_button_click(self, selector, event):
         x, y = self._coordinates_on_video(event)
         selector.left_button_click(Point(x, y))
+        Processor.mark_display_dirty()
 
     def left_button_down_moved(self, selector, event):
         x, y = self._coordinates_on_video(event)
         selector.left_button_down_moved(Point(x, y))
+        Processor.mark_display_dirty()
 
     def left_button_up(self, selector, event):
         x, y = self._coordinates_on_video(event)
         selector.left_button_up(Point(x, y))
+        Processor.mark_display_dirty()
 
     def arrow_press(self, object_selector, event):
         if event.keysym == 'Up':
@@ -89,6 +96,7 @@ class ViewModel:
         elif event.keysym == 'Return':  # (enter)
             object_selector.finish_selecting()
             self._model.state_control.change_state('enter pressed')
+        Processor.mark_display_dirty()
 
     def new_selection(self, name, reselect_while_calibrating=False, additional_callback=None, selector=None):
         # TODO: кроме name параметры нужны только чтобы передать их в new_selection модели
@@ -129,6 +137,9 @@ class ViewModel:
     def cancel_active_process(self):
         self._model.cancel_active_process()
 
+    def add_object(self):
+        self.new_selection(self._model.trackers.next_name())
+
     def progress_bar_set_visibility(self, visible):
         self._view._commands.queue_command(partial(self._view.progress_bar_set_visibility, visible))
 
@@ -205,6 +216,8 @@ class ViewModel:
         if label == 'all':
             for i in SAME_RULES_CHANGEABLE:
                 self.execute_command(partial(self._view._menu.entryconfig, i, state=state))
+            # дополнительные объекты включает модель, когда слежение уже началось
+            self.set_menu_state(ADD_OBJECT_MENU_NAME, 'disabled')
             if state == 'disabled':
                 self.set_menu_state(SELECTION_MENU_NAME, 'disabled')
                 self.set_menu_state(ABORT_MENU_NAME, 'normal')
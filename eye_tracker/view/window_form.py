@@ -15,7 +15,7 @@ from eye_tracker.common.settings import (
 from eye_tracker.model.command_processor import CommandExecutor
 from eye_tracker.view.view_model import (
     CALIBRATION_MENU_NAME, SELECTION_MENU_NAME, ROTATION_MENU_NAME,
-    FLIP_MENU_NAME, MANUAL_MENU_NAME, ABORT_MENU_NAME
+    FLIP_MENU_NAME, MANUAL_MENU_NAME, ABORT_MENU_NAME, ADD_OBJECT_MENU_NAME
 )
 from eye_tracker.view.window_settings import WindowSettings
 from eye_tracker.common.settings import ASSETS_FOLDER, MAX_LASER_RANGE
@@ -30,8 +30,8 @@ class View:
         self._root = tk
         self._view_model = view_model
         self._image_alive_ref = None
-        self._current_image = None
-        self._previous_image = None
+        self._current_image = (0, None)  # (номер кадра, изображение)
+        self._shown_image_number = 0
         self._interval_ms = int(1 / settings.FPS_VIEWED * SECOND_LENGTH)
 
         self._video_frame = Frame(self._root)
@@ -63,6 +63,7 @@ class View:
 
         object_callback = partial(self._view_model.new_selection, OBJECT)
         main_menu.add_command(label=SELECTION_MENU_NAME, command=object_callback)
+        main_menu.add_command(label=ADD_OBJECT_MENU_NAME, command=self._view_model.add_object, state='disabled')
 
         main_menu.add_command(label=ABORT_MENU_NAME, command=self._view_model.cancel_active_process)
 
@@ -170,17 +171,25 @@ class View:
 
     def _processing_loop(self):
         self._planned_task_id = self._root.after(self._interval_ms, self._processing_loop)
-        self.check_show_image(self._current_image)
+        self.check_show_image(*self._current_image)
         self._commands.exec_queued_commands()
 
-    def check_show_image(self, image):
+    def set_current_image(self, image):
+        # модель переиспользует изображения, поэтому новый кадр отличается номером, а не объектом.
+        # Сравнение самих изображений копировало бы оба кадра целиком
+        self._current_image = (self._current_image[0] + 1, image)
+
+    def check_show_image(self, image_number, image):
         # WARNING: Выносить процесс отрисовки в исполнение команд от модели - плохая идея
         #  Так сбиваются тайминги отрисовки и сбросов кадра (image_alive_ref = None становится не None и картинка
         #  не полностью переворачивается. Очень трудновоспроизводимый баг, рандомный
-        if image is None or image == self._previous_image:
+        if image is None or image_number == self._shown_image_number:
+            return
+        if not self._view_model.take_image(image):
+            # кадр уже сменился более свежим, и его буфер может перезаписываться; свежий покажется в следующий раз
             return
 
-        self._previous_image = image
+        self._shown_image_number = image_number
 
         if self._image_alive_ref is not None:
             # Для повышения производительности вставляем в готовый лейбл изображение, не пересоздавая
@@ -6,6 +6,7 @@ import eye_tracker.common.settings
 from eye_tracker.common.logger import logger, turn_logging_on
 from eye_tracker.common.program import save_data, exit_program
 from eye_tracker.common.settings import settings, SelectedArea, private_settings
+from eye_tracker.model.camera_extractor import CameraService
 from eye_tracker.model.domain_services import Orchestrator
 from eye_tracker.view import view_output
 from eye_tracker.view.drawing import Processor
@@ -17,6 +18,23 @@ import sys
 sys.setswitchinterval(1 / (settings.FPS_PROCESSED * 1.5))
 
 
+def create_camera(args):
+    if not args.source:
+        return None
+    # недоступный источник заменяется заглушкой камеры с сообщением пользователю, как и камера
+    return CameraService(args.source, realtime=not args.fast, loop=True)
+
+
+def load_area():
+    try:
+        return SelectedArea.load()
+    except Exception as e:
+        view_output.show_error(
+            message=f'Ошибка загрузки ранее выделенной области \n{e} \nРабота программы будет продолжена')
+        logger.exception(e)
+        SelectedArea.remove()
+
+
 def main(args):
     turn_logging_on(logger)
     eye_tracker.common.settings.ROOT_DIR = Path(__file__).absolute().parent
@@ -38,17 +56,10 @@ def main(args):
                                message=f'{e} \nРабота программы будет продолжена, но возможны сбои в работе.'
                                        f' Рекоммендуется перезагрузка')
         logger.exception(e)
-    area = None
-    try:
-        area = SelectedArea.load()
-    except Exception as e:
-        view_output.show_error(
-            message=f'Ошибка загрузки ранее выделенной области \n{e} \nРабота программы будет продолжена')
-        logger.exception(e)
-        SelectedArea.remove()
+    area = load_area()
     logger.debug('settings loaded')
     try:
-        model_core = Orchestrator(view_model, area=area, debug_on=args.debug)
+        model_core = Orchestrator(view_model, area=area, debug_on=args.debug, camera=create_camera(args))
         view_model.set_model(model_core)
         logger.debug('mainloop started')
         def correctly_destroy_window():
@@ -77,5 +88,9 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Object Tracking Program')
     parser.add_argument('--root_dir', type=str, help='Root directory of the program')
     parser.add_argument('--debug', help='Simulate laser controller connection for debug purpose', action='store_true')
+    parser.add_argument('--source', type=str,
+                        help='Recorded video, directory of images or raw frame dump to use instead of the camera')
+    parser.add_argument('--fast', help='Play the --source as fast as possible instead of its real frame rate',
+                        action='store_true')
     args = parser.parse_args()
     main(args)
@@ -1,5 +1,10 @@
+import pickle
+
+import pytest
+
 from eye_tracker.model.area_controller import AreaController
-from eye_tracker.common.coordinates import Point
+from eye_tracker.common.coordinates import Point, translate_coordinates, get_translation_maxtix_between_resolutions, \
+    get_translation_maxtix, translate_points, PointSet
 from unittest.mock import Mock
 
 
@@ -13,3 +18,41 @@ def test_area_controller(relative_coords, intersected_coords):
         assert controller.calc_laser_coords(coord_set[0]) == coord_set[1]
     for coord_set in intersected_coords:
         assert controller.point_is_out_of_area(coord_set[0], beep_sound_allowed=False) == coord_set[1]
+
+
+def test_area_controller_composed_matrix():
+    controller = AreaController(-100, 100)
+    area = Mock()
+    area.points = [Point(0, 0), Point(100, 0), Point(100, 100), Point(0, 100)]
+    laser_borders = [Point(-100, -100), Point(100, -100), Point(100, 100), Point(-100, 100)]
+    controller.set_area(area, laser_borders)
+    to_screen = get_translation_maxtix_between_resolutions(400, 400, 100, 100)
+    for point in (Point(40, 80), Point(200, 200), Point(360, 20)):
+        screen_point = translate_coordinates(to_screen, point)
+        assert controller.to_laser(point, to_screen) == \
+               (controller.calc_laser_coords(screen_point), controller.point_is_out_of_area(screen_point))
+    laser, out_of_area = controller.to_laser(Point(500, 200), to_screen)
+    assert out_of_area
+
+
+def test_translate_points_matches_single_point_translation():
+    area = [Point(10, 5), Point(90, 15), Point(100, 95), Point(0, 80)]
+    laser_borders = PointSet([Point(-100, -100), Point(100, -100), Point(100, 100), Point(-100, 100)])
+    matrix = get_translation_maxtix(area, laser_borders)
+    points = PointSet([Point(x, y) for x in range(0, 100, 7) for y in range(0, 100, 11)])
+    translated = translate_points(matrix, points)
+    assert isinstance(translated, PointSet) and translated.shape == points.shape
+    assert translated.astype(int).to_points() == [translate_coordinates(matrix, p) for p in points.to_points()]
+
+
+def test_point_is_immutable_tuple_with_axis_comparison():
+    point = Point(3, 4)
+    assert tuple(point) == (3, 4) and str(point) == '(3, 4)'
+    with pytest.raises(AttributeError):
+        point.x = 5
+    # сравнение срабатывает по любой из осей, а не лексикографически
+    assert Point(0, 5) >= Point(1, 1) and Point(0, 5) > Point(1, 1)
+    assert not Point(0, 0) >= 1 and Point(2, 0) >= 1
+    assert Point(0, 5) < Point(1, 1) and 2 * point == point * 2 == Point(6, 8)
+    assert point.moved_at_least(Point(3, 2), 2) and not point.moved_at_least(Point(2, 3), 2)
+    assert pickle.loads(pickle.dumps(point)) == point
@@ -1,4 +1,6 @@
+from time import sleep
 from unittest.mock import Mock, patch
+import numpy as np
 import pytest
 from eye_tracker.common.settings import FLIP_SIDE_NONE, FLIP_SIDE_HORIZONTAL, FLIP_SIDE_VERTICAL
 from eye_tracker.model import camera_extractor
@@ -26,6 +28,15 @@ def test_extractor_invalid_camera(mocked_source_camera):
         assert mock_show_error.call_count == 1
 
 
+def test_extractor_missing_frame_source(tmp_path):
+    mock_show_error = Mock(return_value=None)
+    with patch("eye_tracker.view.view_output.show_error", mock_show_error):
+        extractor = camera_extractor.CameraService(str(tmp_path / 'missing.etraw'), realtime=False, loop=True)
+    assert not extractor.initialized
+    assert isinstance(extractor._camera, camera_extractor.CameraStub)
+    assert mock_show_error.call_count == 1
+
+
 def test_extractor_rotate(black_frame, mocked_source_camera):
     extractor = mocked_source_camera
     with pytest.raises(KeyError):
@@ -51,3 +62,66 @@ def test_extractor_flip(black_frame, mocked_source_camera):
     extractor.set_frame_flip(FLIP_SIDE_HORIZONTAL)
     extractor.set_frame_flip(FLIP_SIDE_VERTICAL)
     extractor.flip_frame(black_frame)
+
+
+def test_frame_ring_returns_latest_frame():
+    ring = camera_extractor.FrameRing()
+    for timestamp in range(5):
+        index, _ = ring.writable_buffer()
+        ring.publish(index, timestamp, float(timestamp))
+    captured = ring.take_latest(last_sequence=0)
+    assert captured.sequence == 5
+    assert captured.image == 4
+    assert ring.take_latest(last_sequence=captured.sequence, timeout=0.01) is None
+
+
+def test_frame_ring_does_not_overwrite_reading_slot():
+    ring = camera_extractor.FrameRing()
+    index, _ = ring.writable_buffer()
+    ring.publish(index, 'read', 0.0)
+    ring.take_latest(last_sequence=0)
+    for _ in range(10):
+        next_index, _ = ring.writable_buffer()
+        assert next_index != index
+        ring.publish(next_index, 'new', 0.0)
+
+
+def test_threaded_extractor(black_frame, mocked_source_camera):
+    extractor = mocked_source_camera
+    patch_extractor(extractor, Mock(return_value=(True, black_frame)))
+    extractor.start_capture()
+    try:
+        first = extractor.extract_captured_frame()
+        second = extractor.extract_captured_frame()
+        assert second.sequence > first.sequence
+        assert second.timestamp >= first.timestamp
+        assert second.image.shape == black_frame.shape
+    finally:
+        extractor.stop_capture()
+    assert not extractor.threaded
+
+
+def test_grabber_backs_off_on_empty_reads():
+    camera = Mock()
+    camera.read = Mock(return_value=(False, None))
+    camera.exhausted = False
+    grabber = camera_extractor.FrameGrabber(camera)
+    sleep(0.3)
+    grabber.stop_thread()
+    # без паузы отключённая камера читалась бы десятки тысяч раз
+    assert camera.read.call_count < 60
+    assert grabber._backoff.delay > camera_extractor.EMPTY_READ_BACKOFF_SEC
+
+
+@pytest.mark.parametrize('degree', [0, 90, 180, 270])
+@pytest.mark.parametrize('side', [FLIP_SIDE_NONE, FLIP_SIDE_HORIZONTAL, FLIP_SIDE_VERTICAL])
+def test_frame_orientation_matches_rotate_and_flip(degree, side):
+    frame = np.random.default_rng(0).integers(0, 255, (6, 8, 3), dtype=np.uint8)
+    extractor = camera_extractor.CameraService(auto_set=False)
+    extractor.set_frame_rotate(degree)
+    extractor.set_frame_flip(side)
+    expected = extractor.flip_frame(extractor.rotate_frame(frame))
+    oriented = extractor.orientation.apply(frame)
+    assert np.array_equal(oriented, expected)
+    x, y, _ = extractor.orientation.matrix(8, 6) @ (5, 2, 1)
+    assert np.array_equal(oriented[int(y), int(x)], frame[2, 5])
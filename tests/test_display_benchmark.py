@@ -0,0 +1,30 @@
+import numpy as np
+
+from benchmarks.display_benchmark import run
+from eye_tracker.view.drawing import DisplayBuffer
+
+
+def test_display_buffer_keeps_taken_image():
+    display_buffer = DisplayBuffer()
+    frame = np.zeros((4, 6, 3), np.uint8)
+    frame[..., 0] = 10
+    frame[..., 2] = 30
+    shown = display_buffer.convert(frame)
+    assert shown.size == (6, 4)
+    assert shown.getpixel((0, 0)) == (30, 0, 10, 255)
+    assert display_buffer.take(shown)
+
+    frame[..., 1] = 20
+    images = [display_buffer.convert(frame) for _ in range(4)]
+    # забранное окном изображение не перезаписывается, сколько бы кадров ни пришло после него
+    assert all(image is not shown for image in images)
+    assert shown.getpixel((5, 3)) == (30, 0, 10, 255)
+    assert images[-1].getpixel((5, 3)) == (30, 20, 10, 255)
+    assert not display_buffer.take(images[-2])
+    assert display_buffer.take(images[-1])
+
+
+def test_display_benchmark():
+    results = run(frame_count=5, width=640)
+    assert results['current']['bytes_per_frame'] < results['legacy']['bytes_per_frame']
+    assert results['current']['us_per_frame'] > 0
@@ -1,9 +1,12 @@
 from unittest.mock import Mock
 from time import sleep
 
+import numpy as np
+
 from eye_tracker.common.settings import settings, OBJECT, AREA, MAX_LASER_RANGE
 from eye_tracker.view.view_model import SELECTION_MENU_NAME
 from eye_tracker.model.domain_services import ErrorHandler
+from eye_tracker.model.camera_extractor import CapturedFrame
 from eye_tracker.common.settings import FLIP_SIDE_NONE, FLIP_SIDE_VERTICAL
 from eye_tracker.common.coordinates import Point
 from eye_tracker.model.move_controller import MoveController, SerialStub
@@ -177,3 +180,85 @@ def test_coordinates_calibrate(fake_model, selected_object_points, black_frame,
         result, _ = fake_model.selecting.check_selected_correctly(AREA)
         laser.stop_thread()
         assert result
+
+
+def test_display_renderer_draws_frames_on_its_own(fake_model):
+    view_model = fake_model._view_model
+    frames = (CapturedFrame(np.full((480, 640, 3), value, np.uint8), value, 0.0) for value in range(40, 250, 40))
+    fake_model.camera.extract_captured_frame = lambda: next(frames)
+    view_model.on_image_ready.reset_mock()
+
+    fake_model._processing_loop()
+    fake_model._processing_loop()
+    assert not view_model.on_image_ready.called
+    fake_model.renderer.render()
+    fake_model.renderer.render()
+    # пока отрисовщик не забрал кадр, следующие не копируются, а без новых кадров и изменений разметки
+    # ничего не перерисовывается
+    assert view_model.on_image_ready.call_count == 1
+    assert fake_model.current_frame[0, 0, 0] == 40
+
+    fake_model._processing_loop()
+    fake_model.renderer.render()
+    assert view_model.on_image_ready.call_count == 2
+    assert fake_model.current_frame[0, 0, 0] == 120
+
+
+def test_display_renderer_draws_tracker_boxes_of_the_shown_frame(fake_model):
+    frames = (CapturedFrame(np.full((480, 640, 3), value, np.uint8), value, 0.0) for value in range(40, 250, 40))
+    fake_model.camera.extract_captured_frame = lambda: next(frames)
+    tracker = fake_model.tracker
+    tracker._center, tracker._half_length_xy = Point(100, 100), Point(20, 20)
+    fake_model.trackers.overlays = lambda: {OBJECT: tracker.overlay()}
+    fake_model.screen.on_screen_selectors[OBJECT] = tracker
+
+    fake_model._processing_loop()
+    tracker._center = Point(300, 300)
+    fake_model.renderer.render()
+    # рамка нарисована там, где объект был на показанном кадре, а не там, где трекер сейчас
+    frame = fake_model.current_frame
+    assert (frame[80, 80:121] != 40).any()
+    assert (frame[280, 280:321] == 40).all()
+
+
+def test_overlay_change_is_shown_on_still_frames(fake_model):
+    view_model = fake_model._view_model
+    random = np.random.default_rng(0)
+    still = np.full((480, 640, 3), 100, np.uint8)
+
+    def noisy_frame():
+        noise = random.normal(0, 4, still.shape)
+        return CapturedFrame(np.clip(still + noise, 0, 255).astype(np.uint8), 0, 0.0)
+
+    def process_and_render(times):
+        for _ in range(times):
+            fake_model._processing_loop()
+            fake_model.renderer.render()
+
+    fake_model.camera.extract_captured_frame = noisy_frame
+    process_and_render(3)
+    shown = view_model.on_image_ready.call_count
+    process_and_render(3)
+    # шум камеры на неподвижной сцене не считается изменением кадра
+    assert view_model.on_image_ready.call_count == shown
+
+    area = Mock()
+    area.draw_on_frame = Mock(side_effect=lambda frame: frame)
+    fake_model.screen.add_selector(area, AREA)
+    process_and_render(1)
+    assert view_model.on_image_ready.call_count == shown + 1
+    assert area.draw_on_frame.called
+
+
+def test_selected_object_is_taken_from_private_frame_copy(fake_model):
+    frames = (CapturedFrame(np.full((480, 640, 3), value, np.uint8), value, 0.0) for value in range(40, 250, 40))
+    fake_model.camera.extract_captured_frame = lambda: next(frames)
+    selector = fake_model.selecting.create_selector(OBJECT)
+    selector._after_selection = Mock()
+    selector.start()
+
+    fake_model._processing_loop()
+    raw_frame = fake_model.raw_frame
+    fake_model.captured_frame.image[:] = 0
+    # кадр камеры может быть перезаписан, а выделение читает свою копию
+    assert raw_frame[0, 0, 0] == 40
@@ -1,8 +1,10 @@
 from unittest.mock import Mock
-from eye_tracker.model.frame_processing import Denoiser, Tracker
-from eye_tracker.common.coordinates import Point
+from eye_tracker.model.frame_processing import Denoiser, Tracker, MotionFilter, ChangeDetector, \
+    FrameContext, TrackerPool, FIRST_SELECTED_POLICY, MOST_CONFIDENT_POLICY, CENTROID_POLICY, REACQUIRE_GROWTH
+from eye_tracker.common.coordinates import Point, translate_coordinates
+from eye_tracker.model.camera_extractor import FrameOrientation
 import numpy as np
-from eye_tracker.common.settings import settings
+from eye_tracker.common.settings import settings, FLIP_SIDE_HORIZONTAL, OBJECT
 
 
 def test_denoiser():
@@ -12,6 +14,22 @@ def test_denoiser():
     denoiser.add(-3)
     assert denoiser.get() == 0
 
+
+def test_motion_filter_has_no_lag():
+    noise = np.random.default_rng(0)
+    velocity = np.array([300, -150, 300, -150])
+    truth = np.array([100.0, 200.0, 130.0, 230.0])
+    average, kalman = Denoiser(truth, 3), MotionFilter(truth, 0.0)
+    for i in range(1, 60):
+        truth = truth + velocity / 30
+        measured = truth + noise.normal(0, 2, 4)
+        average.add(measured, i / 30)
+        kalman.add(measured, i / 30)
+    assert np.abs(average.get() - truth).mean() > 5
+    assert np.abs(kalman.get() - truth).mean() < 2
+    assert np.abs(kalman.predict(0.1) - (truth + velocity * 0.1)).mean() < 3
+
+
 def test_tracker_coordinates_calculation():
     tracker = Tracker()
     tracker.tracker = Mock()
@@ -27,4 +45,178 @@ def test_tracker_coordinates_calculation():
     coords = tracker.get_tracked_position(frame)
     assert coords == Point(58, 58)
     assert tracker.left_top == Point(53, 53)
-    assert tracker.right_bottom == Point(63, 63)
\ No newline at end of file
+    assert tracker.right_bottom == Point(63, 63)
+
+
+def moving_square_frames(count=20, size=24, step=3):
+    background = np.random.default_rng(0).integers(0, 60, (240, 320, 3), dtype=np.uint8)
+    texture = np.random.default_rng(1).integers(150, 255, (size, size, 3), dtype=np.uint8)
+    for i in range(count):
+        frame = background.copy()
+        left, top = 100 + i * step, 80 + i * step // 2
+        frame[top:top + size, left:left + size] = texture
+        yield frame, (left, top, left + size, top + size)
+
+
+def test_roi_tracking_follows_object(monkeypatch):
+    monkeypatch.setattr(settings, 'ROI_TRACKING', 1)
+    monkeypatch.setattr(settings, 'DOWNSCALE_FACTOR', 0.5)
+    frames = moving_square_frames()
+    frame, (left, top, right, bottom) = next(frames)
+    tracker = Tracker(mean_count=1)
+    tracker.start_tracking(frame, Point(left, top), Point(right, bottom), frame.shape[1], frame.shape[0])
+    for frame, (left, top, right, bottom) in frames:
+        tracker.get_tracked_position(frame)
+    assert not tracker._full_frame_search
+    assert abs(tracker.center.x - (left + right) // 2) <= 3
+    assert abs(tracker.center.y - (top + bottom) // 2) <= 3
+
+
+def test_tracker_reacquires_object_after_occlusion(monkeypatch):
+    monkeypatch.setattr(settings, 'ROI_TRACKING', 1)
+    monkeypatch.setattr(settings, 'DOWNSCALE_FACTOR', 0.5)
+    frames = list(moving_square_frames(count=10, size=32))
+    frame, (left, top, right, bottom) = frames[0]
+    tracker = Tracker(mean_count=1)
+    tracker.start_tracking(frame, Point(left, top), Point(right, bottom), frame.shape[1], frame.shape[0])
+    for frame, _ in frames[1:]:
+        tracker.get_tracked_position(frame)
+    assert not tracker.lost
+
+    frozen = tracker.center
+    occluded = frame.copy()
+    occluded[:, 80:220] = 40
+    tracker.get_tracked_position(occluded)
+    assert tracker.lost
+    assert tracker.get_tracked_position(occluded) == frozen
+
+    _, (left, top, right, bottom) = frames[0]
+    reappeared = frames[0][0]
+    for _ in range(4):
+        tracker.get_tracked_position(reappeared)
+    assert not tracker.lost
+    assert abs(tracker.center.x - (left + right) // 2) <= 3
+    assert abs(tracker.center.y - (top + bottom) // 2) <= 3
+
+
+def test_reacquire_window_stops_growing_at_frame_size(monkeypatch):
+    monkeypatch.setattr(settings, 'ROI_TRACKING', 1)
+    monkeypatch.setattr(settings, 'DOWNSCALE_FACTOR', 0.5)
+    frame, (left, top, right, bottom) = next(moving_square_frames(size=32))
+    tracker = Tracker(mean_count=1)
+    tracker.start_tracking(frame, Point(left, top), Point(right, bottom), frame.shape[1], frame.shape[0])
+    whole_frame = (0, 0, frame.shape[1], frame.shape[0])
+
+    def window_at(attempt):
+        growth = REACQUIRE_GROWTH ** attempt
+        return tracker._search_rect(frame.shape, [side * growth for side in tracker._search_size])
+
+    covering = tracker._covering_attempt(frame.shape)
+    assert window_at(covering) == whole_frame
+    assert window_at(covering - 1) != whole_frame
+
+    tracker._lose()
+    tracker._reacquire_attempt = 5000
+    noise = np.random.default_rng(2).integers(0, 60, frame.shape, dtype=np.uint8)
+    assert tracker.get_tracked_position(noise) == tracker.center
+    assert tracker.lost and tracker._reacquire_attempt == 5001
+
+
+def two_squares_frames(count=10, size=28, step=3):
+    random = np.random.default_rng(0)
+    background = random.integers(0, 60, (240, 320, 3), dtype=np.uint8)
+    textures = random.integers(150, 255, (2, size, size, 3), dtype=np.uint8)
+    for i in range(count):
+        frame = background.copy()
+        rects = []
+        for texture, (left, top) in zip(textures, ((40 + i * step, 40), (240 - i * step, 160))):
+            frame[top:top + size, left:left + size] = texture
+            rects.append((left, top, left + size, top + size))
+        yield frame, rects
+
+
+def test_tracker_pool_follows_several_objects(monkeypatch):
+    monkeypatch.setattr(settings, 'ROI_TRACKING', 1)
+    monkeypatch.setattr(settings, 'DOWNSCALE_FACTOR', 0.5)
+    monkeypatch.setattr(settings, 'TRACKING_THREADS', 2)
+    monkeypatch.setattr(settings, 'MAX_TRACKED_OBJECTS', 2)
+    frames = list(two_squares_frames())
+
+    pool = TrackerPool(Tracker(mean_count=1))
+    assert pool.next_name() == f'{OBJECT} 2'
+    pool.add(pool.next_name(), Tracker(mean_count=1, label='2'))
+    frame, rects = frames[0]
+    for name, (left, top, right, bottom) in zip((OBJECT, f'{OBJECT} 2'), rects):
+        pool[name].start_tracking(frame, Point(left, top), Point(right, bottom), frame.shape[1], frame.shape[0])
+    assert not pool.has_room
+    for frame, rects in frames[1:]:
+        pool.update(FrameContext(frame))
+    for name, (left, top, right, bottom) in zip((OBJECT, f'{OBJECT} 2'), rects):
+        assert abs(pool[name].center.x - (left + right) // 2) <= 3
+        assert abs(pool[name].center.y - (top + bottom) // 2) <= 3
+
+    monkeypatch.setattr(settings, 'LASER_TARGET_POLICY', FIRST_SELECTED_POLICY)
+    assert pool.laser_drivers() == [pool[OBJECT]]
+    monkeypatch.setattr(settings, 'LASER_TARGET_POLICY', CENTROID_POLICY)
+    assert pool.laser_drivers() == pool.active
+    pool[OBJECT].confidence, pool[f'{OBJECT} 2'].confidence = 0.5, 0.9
+    monkeypatch.setattr(settings, 'LASER_TARGET_POLICY', MOST_CONFIDENT_POLICY)
+    assert pool.laser_drivers() == [pool[f'{OBJECT} 2']]
+    pool[OBJECT].lost = True
+    monkeypatch.setattr(settings, 'LASER_TARGET_POLICY', FIRST_SELECTED_POLICY)
+    assert pool.laser_drivers() == [pool[f'{OBJECT} 2']]
+
+    pool.remove(f'{OBJECT} 2')
+    assert f'{OBJECT} 2' not in pool
+    pool.remove(OBJECT)
+    assert OBJECT in pool and not pool.in_progress
+    pool.shutdown()
+
+
+def test_frame_context_resizes_once(monkeypatch):
+    monkeypatch.setattr(settings, 'DOWNSCALE_FACTOR', 0.25)
+    context = FrameContext(np.zeros((480, 640, 3), dtype=np.uint8))
+    assert context.tracking is context.tracking
+    assert context.tracking.shape[:2] == (120, 160)
+    assert context.tracking_scale == (0.25, 0.25)
+    assert context.thumbnail is context.thumbnail
+    assert context.thumbnail.ndim == 2
+
+
+def test_change_detector(monkeypatch):
+    monkeypatch.setattr(settings, 'DOWNSCALE_FACTOR', 0.5)
+    noise = np.random.default_rng(0)
+    frame = noise.integers(0, 200, (240, 320, 3), dtype=np.uint8)
+    detector = ChangeDetector()
+    assert detector.changed(FrameContext(frame))
+    assert not detector.changed(FrameContext(frame + noise.integers(0, 2, frame.shape, dtype=np.uint8)))
+    changed = frame.copy()
+    changed[:120, :160] = 255
+    assert detector.changed(FrameContext(changed))
+    assert not detector.changed(FrameContext(changed), region=(100, 80, 140, 110))
+    moved = changed.copy()
+    moved[160:220, 200:280] = 0
+    assert detector.changed(FrameContext(moved), region=(100, 80, 140, 110))
+
+
+def test_sensor_space_tracking_matches_oriented_tracking(monkeypatch):
+    monkeypatch.setattr(settings, 'DOWNSCALE_FACTOR', 0.5)
+    orientation = FrameOrientation(90, FLIP_SIDE_HORIZONTAL)
+    frames = list(moving_square_frames(count=10, size=32))
+    first = frames[0][0]
+    width, height = orientation.output_size(first.shape[1], first.shape[0])
+    left, top, right, bottom = frames[0][1]
+    to_screen = orientation.matrix(first.shape[1], first.shape[0])
+    left_top = translate_coordinates(to_screen, Point(left, top))
+    right_bottom = translate_coordinates(to_screen, Point(right, bottom))
+    left_top, right_bottom = Point(min(left_top.x, right_bottom.x), min(left_top.y, right_bottom.y)), \
+        Point(max(left_top.x, right_bottom.x), max(left_top.y, right_bottom.y))
+
+    oriented, sensor = Tracker(mean_count=1), Tracker(mean_count=1)
+    oriented.start_tracking(orientation.apply(first).copy(), left_top, right_bottom, width, height)
+    sensor.start_tracking(first, left_top, right_bottom, width, height, orientation)
+    for frame, _ in frames[1:]:
+        oriented.get_tracked_position(orientation.apply(frame).copy())
+        sensor.get_tracked_position(frame)
+    assert abs(oriented.center.x - sensor.center.x) <= 2
+    assert abs(oriented.center.y - sensor.center.y) <= 2
@@ -0,0 +1,73 @@
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from eye_tracker.common.settings import FLIP_SIDE_NONE
+from eye_tracker.model.camera_extractor import CameraService
+from eye_tracker.model.frame_sources import (
+    ImageSequenceSource, RawDumpSource, RawDumpWriter, VideoFileSource, open_frame_source, RAW_DUMP_SUFFIX
+)
+
+
+def numbered_frames(count=3):
+    return [np.full((12, 16, 3), i * 10, dtype=np.uint8) for i in range(count)]
+
+
+def test_raw_dump_source(tmp_path):
+    path = tmp_path / f'session{RAW_DUMP_SUFFIX}'
+    with RawDumpWriter(path, fps=50) as writer:
+        for frame in numbered_frames():
+            writer.write(frame)
+    source = open_frame_source(path, realtime=False)
+    assert isinstance(source, RawDumpSource)
+    assert source.fps == 50
+    buffer = np.zeros((12, 16, 3), dtype=np.uint8)
+    values = []
+    while True:
+        ok, frame = source.read(buffer)
+        if not ok:
+            break
+        assert frame is buffer
+        values.append(int(frame[0, 0, 0]))
+    assert values == [0, 10, 20]
+    assert source.exhausted
+
+
+def test_image_sequence_source_loop(tmp_path):
+    for i, frame in enumerate(numbered_frames()):
+        cv2.imwrite(str(tmp_path / f'{i:03}.png'), frame)
+    source = open_frame_source(tmp_path, realtime=False, loop=True)
+    assert isinstance(source, ImageSequenceSource)
+    values = [int(source.read()[1][0, 0, 0]) for _ in range(5)]
+    assert values == [0, 10, 20, 0, 10]
+    assert not source.exhausted
+
+
+def test_video_file_source_realtime(tmp_path):
+    path = str(tmp_path / 'session.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 100, (16, 12))
+    for frame in numbered_frames(4):
+        writer.write(frame)
+    writer.release()
+    source = VideoFileSource(path, realtime=True)
+    started = perf_counter()
+    frames = 0
+    while source.read()[0]:
+        frames += 1
+    assert frames == 4
+    assert perf_counter() - started >= 3 / source.fps
+
+
+def test_camera_service_with_frame_source(tmp_path):
+    path = tmp_path / f'session{RAW_DUMP_SUFFIX}'
+    with RawDumpWriter(path) as writer:
+        writer.write(numbered_frames(1)[0])
+    camera = CameraService(str(path), threaded_capture=False)
+    assert camera.initialized
+    camera.set_frame_rotate(0)
+    camera.set_frame_flip(FLIP_SIDE_NONE)
+    assert camera.extract_frame().shape == (12, 16, 3)
+    assert not camera.source_exhausted
+    camera._camera.read()
+    assert camera.source_exhausted
@@ -0,0 +1,57 @@
+from threading import Thread
+from time import sleep
+
+from eye_tracker.common.instrumentation import Histogram, Profiler
+from eye_tracker.common.settings import settings
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 101):
+        histogram.add(value / 1000)
+    assert histogram.count == 100
+    assert abs(histogram.mean - 0.0505) < 1e-9
+    assert 0.045 <= histogram.percentile(50) <= 0.055
+    assert 0.090 <= histogram.percentile(95) <= 0.1
+    assert histogram.percentile(100) == histogram.max == 0.1
+    histogram.reset()
+    assert histogram.count == 0 and histogram.percentile(50) == 0.0
+
+
+def test_profiler_stage():
+    profiler = Profiler(stage_names=('test',))
+    with profiler.stage('test'):
+        sleep(0.002)
+    summary = profiler.summary_ms()['test']
+    assert summary['count'] == 1
+    assert summary['mean'] >= 2
+    assert profiler.overlay_lines()[0].startswith('test:')
+
+
+def test_profiler_disabled():
+    profiler = Profiler(stage_names=('test',))
+    settings._set_attr_force('INSTRUMENTATION', 0)
+    try:
+        with profiler.stage('test'):
+            pass
+    finally:
+        settings._set_attr_force('INSTRUMENTATION', 1)
+    assert profiler.summary_ms()['test']['count'] == 0
+
+
+def test_histogram_window_keeps_values_added_while_dumping():
+    histogram = Histogram()
+    added = 20000
+
+    def add_values():
+        for _ in range(added):
+            histogram.add(0.001)
+
+    thread = Thread(target=add_values)
+    thread.start()
+    dumped = 0
+    while thread.is_alive():
+        dumped += histogram.summary_ms(reset=True)['count']
+    thread.join()
+    dumped += histogram.summary_ms(reset=True)['count']
+    assert dumped == added
@@ -0,0 +1,33 @@
+from eye_tracker.common.coordinates import Point
+from eye_tracker.model.laser_protocol import LaserProtocol, encode_binary, encode_ascii, FRAME, READY, ERRORED, \
+    COMMAND_MOVE, BINARY_ACCEPTED
+
+
+def test_ascii_replies_survive_partial_reads():
+    protocol = LaserProtocol()
+    assert protocol.feed(b're') == []
+    assert protocol.feed(b'ady\r\nerr') == [(READY, None)]
+    assert protocol.feed(b'or\n') == [(ERRORED, None)]
+    assert protocol.feed(b'garbage\n') == []
+    assert encode_ascii(Point(-10, 25), COMMAND_MOVE) == b'-10;25;1\n'
+
+
+def test_binary_frames_after_negotiation():
+    protocol = LaserProtocol()
+    frames = encode_binary(Point(0, 0), READY, sequence=7) + encode_binary(Point(0, 0), ERRORED, sequence=8)
+    assert protocol.feed(b'binary\n' + frames[:4]) == [(BINARY_ACCEPTED, None)]
+    assert protocol.binary
+    assert protocol.feed(frames[4:]) == [(READY, 7), (ERRORED, 8)]
+
+    message, sequence = protocol.encode(Point(-6000, 6000))
+    assert len(message) == FRAME.size
+    assert FRAME.unpack(message)[1:5] == (COMMAND_MOVE, sequence, -6000, 6000)
+
+
+def test_binary_parser_resynchronizes_after_corruption():
+    protocol = LaserProtocol()
+    protocol.binary = True
+    corrupted = bytearray(encode_binary(Point(3, 4), READY, sequence=1))
+    corrupted[4] ^= 0xFF
+    assert protocol.feed(b'\x00' + bytes(corrupted) + encode_binary(Point(0, 0), READY, sequence=2)) == [(READY, 2)]
+    assert protocol.crc_errors == 1
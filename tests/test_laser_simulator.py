@@ -0,0 +1,51 @@
+from time import sleep, perf_counter
+
+from eye_tracker.common.coordinates import Point
+from eye_tracker.common.settings import settings
+from eye_tracker.model.laser_protocol import LaserProtocol, READY, encode_ascii, COMMAND_MOVE
+from eye_tracker.model.laser_simulator import LaserControllerSimulator
+from eye_tracker.model.move_controller import MoveController
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = perf_counter() + timeout
+    while not predicate() and perf_counter() < deadline:
+        sleep(0.001)
+    return predicate()
+
+
+def test_simulator_timing():
+    simulator = LaserControllerSimulator(baud_rate=9600, speed=10000, binary_protocol=False)
+    protocol = LaserProtocol()
+    assert protocol.feed(simulator.read(16)) == [(READY, None)]
+
+    command = encode_ascii(Point(100, -50), COMMAND_MOVE)
+    written = perf_counter()
+    simulator.write(command)
+    # команда идёт по линии 10 бит на байт, затем лазер едёт 100 единиц со скоростью 10000 в секунду
+    wire_time = len(command) * 10 / 9600
+    assert simulator.position(written + wire_time / 2) == Point(0, 0)
+    assert protocol.feed(simulator.read(16)) == [(READY, None)]
+    assert perf_counter() - written >= wire_time + 100 / 10000
+    assert simulator.position() == Point(100, -50)
+
+
+def test_move_controller_recalibrates_after_simulated_limit_error():
+    settings._set_attr_force('STABLE_POSITION_DURATION', 0.005)
+    simulator = LaserControllerSimulator(limit=1000)
+    laser_errors = []
+    with MoveController(lambda: laser_errors.append(True), serial=simulator, run_immediately=False) as controller:
+        assert wait_for(controller.controller_is_ready)
+        controller.set_new_position(Point(2000, 0))
+        assert wait_for(lambda: controller.is_errored)
+        # обработчик ошибки вызывается читающим потоком уже после смены состояния
+        assert wait_for(lambda: laser_errors) and simulator.errored
+        assert simulator.position() == Point(1000, 0)
+
+        controller.set_new_position(Point(500, 0))
+        controller.calibrate_laser()
+        assert wait_for(controller.controller_is_ready)
+        assert not simulator.errored and simulator.position() == Point(0, 0)
+
+        controller.set_new_position(Point(500, 0))
+        assert wait_for(lambda: simulator.position() == Point(500, 0))
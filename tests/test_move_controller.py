@@ -1,6 +1,8 @@
-from eye_tracker.model.move_controller import MoveController
+from eye_tracker.common.instrumentation import profiler, glass_to_laser, GLASS_TO_LASER
+from eye_tracker.model.move_controller import MoveController, SerialStub, MAX_PREDICTION_LEAD_SEC
 from eye_tracker.common.coordinates import Point
-from time import sleep
+from threading import Event
+from time import sleep, perf_counter
 from eye_tracker.common.settings import settings
 
 
@@ -9,12 +11,15 @@ def test_move_controller():
     with MoveController(on_laser_error=lambda: ..., debug_on=True, run_immediately=False) as controller:
         controller.set_new_position(Point(10, 10))
         controller.set_new_position(Point(100, 100))
-        assert controller._current_position == Point(10, 10)
+        # пока команда не отправлена, побеждает последняя цель
+        assert controller._current_position == Point(100, 100)
+        assert controller._next_command_point[0] == Point(100, 100)
 
         sleep(0.006)
         controller.set_new_position(Point(200, 200))
         assert controller._current_position == Point(200, 200)
 
+
 def test_move_controller_errored():
     settings._set_attr_force('STABLE_POSITION_DURATION', 0.0005)
     with MoveController(on_laser_error=lambda: ..., debug_on=True, run_immediately=False) as controller:
@@ -22,7 +27,85 @@ def test_move_controller_errored():
         controller.set_new_position(Point(10, 10))
         assert controller._current_position == Point(10, 10)
         controller._serial.generate_error()
+        deadline = perf_counter() + 1
+        while not controller.is_errored and perf_counter() < deadline:
+            sleep(0.001)
 
         controller.set_new_position(Point(200, 200))
         controller.set_new_position(Point(100, 100))
         assert controller._current_position == Point(10, 10)
+
+
+def test_glass_to_laser_latency():
+    stage = profiler.stage(GLASS_TO_LASER)
+    stage.reset()
+    exceeded = glass_to_laser.exceeded_count
+    settings._set_attr_force('LATENCY_BUDGET_MS', 5)
+    controller = MoveController(on_laser_error=lambda: ..., debug_on=True, run_immediately=False)
+    controller._move_laser(Point(1, 1), capture_time=perf_counter() - 0.01)
+    controller._move_laser(Point(2, 2))
+    assert stage.total.count == 1
+    assert stage.total.max >= 0.01
+    assert glass_to_laser.exceeded_count == exceeded + 1
+
+
+def test_move_controller_sends_command_as_soon_as_ready(monkeypatch):
+    monkeypatch.setattr(SerialStub, 'READY_INTERVAL', 0.02)
+    settings._set_attr_force('STABLE_POSITION_DURATION', 0.005)
+    with MoveController(on_laser_error=lambda: ..., debug_on=True, run_immediately=False) as controller:
+        written = Event()
+        stub_write = controller._serial.write
+        controller._serial.write = lambda data: (stub_write(data), written.set())
+        while not controller.controller_is_ready():
+            sleep(0.001)
+        sent_at = perf_counter()
+        controller.set_new_position(Point(10, 10))
+        assert written.wait(1)
+        # команда уходит по истечении STABLE_POSITION_DURATION, а не на следующем такте опроса порта
+        assert perf_counter() - sent_at < 0.05
+        assert not controller.is_ready
+
+
+def test_move_controller_negotiates_binary_protocol():
+    settings._set_attr_force('LASER_BINARY_PROTOCOL', 1)
+    try:
+        with MoveController(on_laser_error=lambda: ..., debug_on=True, run_immediately=False) as controller:
+            deadline = perf_counter() + 1
+            while not controller._protocol.binary and perf_counter() < deadline:
+                sleep(0.001)
+            assert controller._protocol.binary
+    finally:
+        settings._set_attr_force('LASER_BINARY_PROTOCOL', 0)
+
+
+def test_move_controller_pipelines_acknowledged_commands():
+    settings._set_attr_force('LASER_BINARY_PROTOCOL', 1)
+    settings._set_attr_force('LASER_COMMANDS_IN_FLIGHT', 4)
+    settings._set_attr_force('STABLE_POSITION_DURATION', 0.5)
+    try:
+        with MoveController(on_laser_error=lambda: ..., debug_on=True, run_immediately=False) as controller:
+            written = []
+            stub_write = controller._serial.write
+            controller._serial.write = lambda data: (stub_write(data), written.append(data))
+            deadline = perf_counter() + 1
+            while not controller._protocol.binary and perf_counter() < deadline:
+                sleep(0.001)
+            for x in range(1, 6):
+                controller.set_new_position(Point(x, x))
+                sleep(0.01)
+            # без окна вторая команда ждала бы ready и STABLE_POSITION_DURATION
+            assert len(written) >= 3
+            assert not controller._in_flight
+    finally:
+        settings._set_attr_force('LASER_BINARY_PROTOCOL', 0)
+
+
+def test_move_controller_extrapolates_target_at_dispatch():
+    captured = perf_counter() - 0.1
+    predicted = MoveController._extrapolate(Point(100, -100), captured, Point(1000, 500))
+    assert abs(predicted.x - 200) <= 2 and abs(predicted.y + 50) <= 1
+    assert MoveController._extrapolate(Point(100, 100), None, Point(1000, 0)) == Point(100, 100)
+    # упреждение ограничено и не выводит лазер за пределы диапазона
+    far = MoveController._extrapolate(Point(0, 0), perf_counter() - 10, Point(1000, 0))
+    assert far.x <= 1000 * MAX_PREDICTION_LEAD_SEC
+    assert MoveController._extrapolate(Point(5990, 0), captured, Point(1000, 0)) == Point(5990, 0)
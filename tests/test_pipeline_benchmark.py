@@ -0,0 +1,22 @@
+from eye_tracker.common.instrumentation import TRACKER_UPDATE
+from benchmarks.pipeline_benchmark import make_reference_clip, run, compare, print_report
+from eye_tracker.model.frame_sources import RAW_DUMP_SUFFIX
+
+
+def test_pipeline_benchmark(tmp_path):
+    clip = make_reference_clip(tmp_path / f'clip{RAW_DUMP_SUFFIX}', 320, 240, frames=12)
+    results = run([clip])
+    clip_result = results['clips'][0]
+    assert clip_result['frames'] > 0
+    assert clip_result['latency_ms']['p99'] >= clip_result['latency_ms']['p50']
+    assert clip_result['stages_ms'][TRACKER_UPDATE]['count'] > 0
+    assert len(compare(results, results)) == 1
+
+
+def test_pipeline_benchmark_reports_empty_run(capsys):
+    empty = {'clip': 'empty', 'resolution': [320, 240], 'backend': 'csrt', 'frames': 0, 'fps': 0.0,
+             'cpu_percent': 0.0, 'latency_ms': {'count': 0}, 'stages_ms': {}}
+    results = {'clips': [empty]}
+    print_report(results)
+    assert 'no frames processed' in capsys.readouterr().out
+    assert compare(results, results) == ['empty [csrt]: fps 0.0 -> 0.0 (n/a), p95 None -> None ms (n/a)']
@@ -0,0 +1,7 @@
+from benchmarks.point_benchmark import run
+
+
+def test_point_benchmark():
+    results = run(frames=200)
+    assert results['current']['points_per_frame'] < results['legacy']['points_per_frame']
+    assert results['current']['us_per_frame'] > 0
@@ -0,0 +1,90 @@
+from time import sleep, perf_counter
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+
+from eye_tracker.common.coordinates import Point
+from eye_tracker.common.process_helpers import SeqlockStruct, SharedFrameRing
+from eye_tracker.common.settings import private_settings, FLIP_SIDE_NONE
+from eye_tracker.model.frame_sources import RawDumpWriter
+from eye_tracker.model.process_pipeline import LaserProcess, create_process_camera, CaptureProcess
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = perf_counter() + timeout
+    while not predicate() and perf_counter() < deadline:
+        sleep(0.005)
+    return predicate()
+
+
+@pytest.fixture
+def upright_camera():
+    # поворот и отражение могли остаться от других тестов, а процесс захвата получает их вместе с настройками
+    rotation, flip_side = private_settings.ROTATION_ANGLE, private_settings.FLIP_SIDE
+    private_settings._set_attr_force('ROTATION_ANGLE', 0)
+    private_settings._set_attr_force('FLIP_SIDE', FLIP_SIDE_NONE)
+    yield
+    private_settings._set_attr_force('ROTATION_ANGLE', rotation)
+    private_settings._set_attr_force('FLIP_SIDE', flip_side)
+
+
+def test_seqlock_struct_is_shared_by_name():
+    writer = SeqlockStruct('Qd?')
+    reader = SeqlockStruct('Qd?', writer.name)
+    assert reader.read() == (0, (0, 0.0, False))
+    writer.write(7, 1.5, True)
+    writer.write(8, 2.5, False)
+    assert reader.read() == (2, (8, 2.5, False))
+    reader.close()
+    writer.close()
+
+
+def test_shared_frame_ring_returns_latest_frame():
+    writer = SharedFrameRing((4, 6, 3), slots=3)
+    reader = SharedFrameRing((4, 6, 3), slots=3, name=writer.name)
+    out = np.empty((4, 6, 3), np.uint8)
+    assert reader.read_latest(out) is None
+    for value in range(1, 6):
+        writer.write(np.full((4, 6, 3), value, np.uint8), value / 10)
+    assert reader.read_latest(out) == (5, 0.5)
+    assert (out == 5).all()
+    reader.close()
+    writer.close()
+
+
+def test_capture_process_delivers_frames(tmp_path, upright_camera):
+    path = tmp_path / 'clip.etraw'
+    with RawDumpWriter(path) as writer:
+        for value in range(30):
+            writer.write(np.full((48, 64, 3), value, np.uint8))
+    camera = create_process_camera(str(path))
+    try:
+        assert isinstance(camera._grabber, CaptureProcess)
+        first = camera.extract_captured_frame()
+        second = camera.extract_captured_frame()
+        assert first.image.shape == (48, 64, 3)
+        assert second.sequence > first.sequence
+        assert second.timestamp >= first.timestamp
+    finally:
+        camera.stop_capture()
+
+
+def test_laser_process_executes_requests():
+    laser_errors = []
+    with patch('eye_tracker.view.view_output._view', Mock()) as view:
+        laser = LaserProcess(lambda: laser_errors.append(True), debug_on=True)
+        try:
+            assert laser.initialized
+            # предупреждение о режиме отладки показывает родительский процесс
+            assert wait_for(lambda: view.queue_command.called or laser.controller_is_ready())
+            laser.calibrate_laser()
+            laser.set_new_position(Point(100, -100), capture_time=perf_counter(), velocity=Point(10, 0))
+            # контроллер-заглушка отвечает ready только через несколько секунд, поэтому проверяется,
+            # что процесс лазера принял оба запроса и пока не готов к следующей команде
+            assert not laser.controller_is_ready()
+            assert wait_for(lambda: laser._read_status()[0] == 2)
+            assert not laser.controller_is_ready()
+            assert not laser.is_errored and not laser_errors
+        finally:
+            laser.stop_thread()
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from eye_tracker.model.tracker_backends import DlibCorrelationBackend, PhaseCorrelationBackend, OpenCVBackend, \
+    TrackerBackendUnavailable, create_tracker_backend, DLIB_CORRELATION, OPENCV_MOSSE, PHASE_CORRELATION, \
+    PHASE_MIN_SIDE
+from tests.test_frame_processing import moving_square_frames
+
+
+@pytest.mark.parametrize('backend', [DlibCorrelationBackend, PhaseCorrelationBackend])
+def test_backend_follows_object(backend):
+    frames = moving_square_frames(size=32)
+    frame, rect = next(frames)
+    tracker = backend()
+    tracker.start(frame, rect)
+    for frame, rect in frames:
+        confidence = tracker.update(frame, tracker.get_position())
+    left, top, right, bottom = tracker.get_position()
+    assert 0 <= confidence <= 1
+    assert abs(left - rect[0]) <= 3 and abs(top - rect[1]) <= 3
+
+
+def test_phase_correlation_loses_object():
+    frames = moving_square_frames(size=32)
+    frame, rect = next(frames)
+    tracker = PhaseCorrelationBackend()
+    tracker.start(frame, rect)
+    assert tracker.update(frame[::-1, ::-1].copy()) < 0.5
+
+
+@pytest.mark.parametrize('side', [0, 1, PHASE_MIN_SIDE - 1])
+def test_phase_correlation_rejects_tiny_object(side):
+    frame, _ = next(moving_square_frames())
+    with pytest.raises(ValueError):
+        PhaseCorrelationBackend().start(frame, (100, 80, 100 + side, 80 + side))
+
+
+def test_opencv_confidence_is_graded():
+    try:
+        tracker = OpenCVBackend('CSRT')
+    except TrackerBackendUnavailable:
+        pytest.skip('opencv-contrib-python is not installed')
+    frames = list(moving_square_frames(size=32))
+    frame, rect = frames[0]
+    tracker.start(frame, rect)
+    confidence = tracker.update(frames[1][0])
+    assert 0.5 < confidence <= 1
+    dimmed = (frames[2][0] * 0.5 + np.random.default_rng(3).integers(0, 80, frame.shape)).astype(np.uint8)
+    assert tracker.update(dimmed) < confidence
+
+
+def test_create_tracker_backend():
+    assert isinstance(create_tracker_backend(DLIB_CORRELATION), DlibCorrelationBackend)
+    assert isinstance(create_tracker_backend(PHASE_CORRELATION), PhaseCorrelationBackend)
+    # без opencv-contrib выбирается dlib
+    assert isinstance(create_tracker_backend(OPENCV_MOSSE), (OpenCVBackend, DlibCorrelationBackend))
+
+
+def test_unknown_opencv_tracker_is_unavailable():
+    with pytest.raises(TrackerBackendUnavailable):
+        OpenCVBackend('Unknown')